@@ -3,9 +3,9 @@ from .models import Media, Book, Movie, Review, Favorite, UserProfile
 
 @admin.register(Media)
 class MediaAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'media_type', 'genre', 'created_at')
+    list_display = ('id', 'title', 'media_type', 'genre', 'avg_rating', 'review_count', 'created_at')
     list_filter = ('media_type', 'genre')
-    search_fields = ('title', 'genre')
+    search_fields = ('title', 'genre', 'external_id')
     ordering = ('title',)
     
     actions = ['delete_selected']
@@ -0,0 +1,68 @@
+"""
+On-disk NumPy artifacts built offline by management commands.
+
+Artifacts are written atomically and loaded at most once per worker
+process; a newer file on disk (a rebuild) is picked up on the next access.
+
+Reports meant for people (JSON) are written next to them the same way.
+"""
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def artifact_path(name):
+    return Path(settings.ARTIFACT_DIR) / f'{name}.npz'
+
+
+def _write_atomic(path, write):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=path.suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def save_artifact(name, **arrays):
+    return _write_atomic(artifact_path(name), lambda f: np.savez(f, **arrays))
+
+
+def save_report(name, data):
+    """Write ``data`` as indented JSON to ``<ARTIFACT_DIR>/<name>.json``"""
+    path = Path(settings.ARTIFACT_DIR) / f'{name}.json'
+    return _write_atomic(path, lambda f: f.write(json.dumps(data, indent=2, default=str).encode()))
+
+
+def load_artifact(name):
+    """Return the artifact's arrays as a dict, or None if it hasn't been built"""
+    path = artifact_path(name)
+    try:
+        # With the path, so a changed ARTIFACT_DIR never serves another directory's arrays
+        version = (str(path), path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+    cached = _loaded.get(name)
+    if cached and cached[0] == version:
+        return cached[1]
+    with _lock:
+        cached = _loaded.get(name)
+        if cached and cached[0] == version:
+            return cached[1]
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+        _loaded[name] = (version, arrays)
+        return arrays
@@ -0,0 +1,339 @@
+"""
+In-memory typeahead index over media titles, authors and directors.
+
+Terms live in one sorted list with a parallel array of media ids, so a
+prefix lookup is two bisects. Small ranges are ranked on the fly; prefixes
+that cover more than ``scan_limit`` terms are answered from top-k lists
+precomputed bottom-up at build time, which keeps every lookup well under a
+millisecond on catalogs of millions of titles. Adds, removals and popularity
+changes update those lists in place.
+
+The index lives in each process. Signals keep it current for writes made in
+that process; writes from other workers and management commands are caught
+up at most every AUTOCOMPLETE_SYNC_INTERVAL seconds, by re-reading the media
+whose ``updated_at`` moved since the last sync (review writes, edits and
+bulk loads all bump it). A media count that no longer matches the index
+means rows were deleted elsewhere, and the index is rebuilt.
+"""
+import heapq
+import re
+import sys
+import threading
+import time
+import logging
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import Book, Media, Movie
+
+logger = logging.getLogger(__name__)
+
+NON_WORD_RE = re.compile(r'[^0-9a-z]+')
+# Re-read this far before the last sync, for transactions that committed after
+# it with an earlier updated_at and for clock skew between hosts
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+def terms_for(title, person, max_suffixes=3):
+    """Return the index keys for one media: the full title and name plus later word starts"""
+    terms = set()
+    for text in (title, person):
+        words = normalize(text).split()
+        for start in range(min(len(words), max_suffixes + 1)):
+            terms.add(' '.join(words[start:]))
+    terms.discard('')
+    return terms
+
+
+class PrefixIndex:
+    scan_limit = 512
+    max_k = 50
+    # Hot lists keep this many entries beyond max_k, so entries dropping out of
+    # them (removals, falling popularity) only rarely force a recompute
+    slack = 50
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._ids = array('q')
+        self._media = {}
+        self._hot = {}
+        # Prefixes whose hot list leaves out some media of its range
+        self._partial = set()
+
+    def __len__(self):
+        return len(self._media)
+
+    def build(self, entries):
+        """Replace the index with ``entries`` of (id, title, media_type, person, popularity)"""
+        pairs = []
+        media = {}
+        for media_id, title, media_type, person, popularity in entries:
+            media[media_id] = (title, media_type, person, popularity)
+            pairs.extend((sys.intern(term), media_id) for term in terms_for(title, person))
+        pairs.sort()
+
+        keys = [key for key, _ in pairs]
+        ids = array('q', (media_id for _, media_id in pairs))
+        with self._lock:
+            self._keys, self._ids, self._media, self._hot, self._partial = keys, ids, media, {}, set()
+            self._precompute_hot()
+
+    def _precompute_hot(self, prefix='', lo=0, hi=None):
+        """Memoize hot lists for every prefix too wide to rank on the fly; returns (ranked, partial)"""
+        if hi is None:
+            hi = len(self._keys)
+        if hi - lo <= self.scan_limit:
+            return self._top(self._candidates(lo, hi))
+
+        # The top of a range is always within the union of its children's tops
+        candidates = {}
+        partial = False
+        depth = len(prefix)
+        position = lo
+        while position < hi:
+            key = self._keys[position]
+            if len(key) == depth:
+                media_id = self._ids[position]
+                candidates[media_id] = self._media[media_id][3]
+                position += 1
+                continue
+            child = key[:depth + 1]
+            end = bisect_left(self._keys, child + '\x7f', position, hi)
+            ranked, child_partial = self._precompute_hot(child, position, end)
+            partial = partial or child_partial
+            for popularity, negated in ranked:
+                candidates[-negated] = popularity
+            position = end
+
+        ranked, truncated = self._top(candidates)
+        if prefix:
+            self._store_hot(prefix, ranked, partial or truncated)
+        return ranked, partial or truncated
+
+    def _range(self, prefix):
+        return bisect_left(self._keys, prefix), bisect_left(self._keys, prefix + '\x7f')
+
+    def _candidates(self, lo, hi):
+        best = {}
+        media = self._media
+        for position in range(lo, hi):
+            media_id = self._ids[position]
+            best[media_id] = media[media_id][3]
+        return best
+
+    def _top(self, candidates, k=None):
+        """The ``k`` (default max_k + slack) best of {media_id: popularity}, and whether any were cut"""
+        k = k or self.max_k + self.slack
+        ranked = heapq.nlargest(k, ((popularity, -media_id) for media_id, popularity in candidates.items()))
+        return ranked, len(candidates) > k
+
+    def _store_hot(self, prefix, ranked, partial):
+        self._hot[prefix] = ranked
+        if partial:
+            self._partial.add(prefix)
+        else:
+            self._partial.discard(prefix)
+
+    def _update_hot(self, terms, old=None, new=None):
+        """
+        Move one media's (popularity, -id) entry from ``old`` to ``new`` (None
+        meaning absent) in the hot lists of every prefix of ``terms``. A partial
+        list only ever leaves out entries ranked below its last one, so ``new``
+        joins it when it ranks at least that high.
+        """
+        prefixes = {term[:length] for term in terms for length in range(1, len(term) + 1)}
+        capacity = self.max_k + self.slack
+        for prefix in prefixes:
+            ranked = self._hot.get(prefix)
+            if ranked is None:
+                continue
+            partial = prefix in self._partial
+            if old is not None and old in ranked:
+                ranked.remove(old)
+            if new is not None and (not partial or (ranked and new >= ranked[-1])):
+                ranked.append(new)
+                ranked.sort(reverse=True)
+                if len(ranked) > capacity:
+                    del ranked[capacity:]
+                    self._partial.add(prefix)
+            elif partial and len(ranked) < self.max_k:
+                # Out of slack: recomputed on its next lookup
+                del self._hot[prefix]
+                self._partial.discard(prefix)
+
+    def add(self, media_id, title, media_type, person, popularity):
+        with self._lock:
+            self.remove(media_id)
+            self._media[media_id] = (title, media_type, person, popularity)
+            terms = terms_for(title, person)
+            for term in terms:
+                term = sys.intern(term)
+                position = bisect_right(self._keys, term)
+                self._keys.insert(position, term)
+                self._ids.insert(position, media_id)
+            self._update_hot(terms, new=(popularity, -media_id))
+
+    def remove(self, media_id):
+        with self._lock:
+            entry = self._media.pop(media_id, None)
+            if entry is None:
+                return
+            title, _, person, popularity = entry
+            terms = terms_for(title, person)
+            for term in terms:
+                lo = bisect_left(self._keys, term)
+                hi = bisect_right(self._keys, term)
+                for position in range(lo, hi):
+                    if self._ids[position] == media_id:
+                        del self._keys[position]
+                        del self._ids[position]
+                        break
+            self._update_hot(terms, old=(popularity, -media_id))
+
+    def set_popularity(self, media_id, popularity):
+        """Rerank an indexed media in place"""
+        with self._lock:
+            entry = self._media.get(media_id)
+            if entry is None or entry[3] == popularity:
+                return
+            title, media_type, person, old_popularity = entry
+            self._media[media_id] = (title, media_type, person, popularity)
+            self._update_hot(terms_for(title, person), old=(old_popularity, -media_id),
+                             new=(popularity, -media_id))
+
+    def lookup(self, query, k=10):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        k = min(k, self.max_k)
+        with self._lock:
+            ranked = self._hot.get(prefix)
+            if ranked is None:
+                lo, hi = self._range(prefix)
+                if hi - lo > self.scan_limit:
+                    ranked, partial = self._top(self._candidates(lo, hi))
+                    self._store_hot(prefix, ranked, partial)
+                else:
+                    ranked, _ = self._top(self._candidates(lo, hi), k)
+            results = []
+            for popularity, negated in ranked[:k]:
+                title, media_type, person, _ = self._media[-negated]
+                results.append({
+                    'id': -negated,
+                    'title': title,
+                    'media_type': media_type,
+                    'creator': person,
+                    'popularity': popularity,
+                })
+            return results
+
+    def memory_usage(self):
+        """Approximate bytes held by the index structures"""
+        with self._lock:
+            total = sys.getsizeof(self._keys) + sys.getsizeof(self._ids)
+            total += sum(sys.getsizeof(key) for key in set(self._keys))
+            total += sys.getsizeof(self._media)
+            for entry in self._media.values():
+                total += sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry)
+            total += sys.getsizeof(self._hot)
+            for prefix, ranked in self._hot.items():
+                total += sys.getsizeof(prefix) + sys.getsizeof(ranked) + len(ranked) * 64
+            return total
+
+
+def catalog_entries(since=None):
+    """Yield index entries for every book and movie, or only those updated since ``since``"""
+    for model, person_field in ((Book, 'author'), (Movie, 'director')):
+        rows = model.objects.all() if since is None else model.objects.filter(updated_at__gte=since)
+        rows = rows.values_list('pk', 'title', 'media_type', person_field, 'review_count')
+        yield from rows.iterator(chunk_size=5000)
+
+
+_index = None
+_index_lock = threading.Lock()
+_synced_at = None
+_checked = 0.0
+
+
+def _build():
+    global _index, _synced_at, _checked
+    started = timezone.now()
+    index = PrefixIndex()
+    index.build(catalog_entries())
+    _index, _synced_at, _checked = index, started, time.monotonic()
+
+
+def _catch_up():
+    """Fold in what other processes wrote since the last sync; requests keep using the index meanwhile"""
+    global _synced_at, _checked
+    if not _index_lock.acquire(blocking=False):
+        return
+    try:
+        _checked = time.monotonic()
+        started = timezone.now()
+        for entry in list(catalog_entries(since=_synced_at - SYNC_OVERLAP)):
+            _index.add(*entry)
+        if Media.objects.count() != len(_index):
+            _build()
+        else:
+            _synced_at = started
+    except DatabaseError:
+        logger.warning('Autocomplete index not caught up; retrying after the next interval', exc_info=True)
+    finally:
+        _index_lock.release()
+
+
+def get_autocomplete_index():
+    """Return the process-wide index, building it on first use and catching it up with the database"""
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _build()
+    elif time.monotonic() - _checked >= settings.AUTOCOMPLETE_SYNC_INTERVAL:
+        _catch_up()
+    return _index
+
+
+def warm_autocomplete_index():
+    """Build the index at server startup so the first keystroke doesn't pay for it"""
+    try:
+        get_autocomplete_index()
+    except DatabaseError:
+        logger.warning('Autocomplete index not built at startup; it will be built on first use')
+
+
+def index_media(media):
+    """Fold a saved Book or Movie into the index if it has been built"""
+    if _index is None:
+        return
+    person = getattr(media, 'author', None) or getattr(media, 'director', '')
+    _index.add(media.pk, media.title, media.media_type, person, media.review_count)
+
+
+def unindex_media(media_id):
+    if _index is not None:
+        _index.remove(media_id)
+
+
+def refresh_popularity(*media_ids):
+    """Rerank ``media_ids`` by their review counts once the current transaction commits"""
+    if _index is None:
+        return
+
+    def refresh():
+        index = _index
+        for media_id, review_count in Media.objects.filter(pk__in=media_ids).values_list('pk', 'review_count'):
+            index.set_popularity(media_id, review_count)
+    transaction.on_commit(refresh)
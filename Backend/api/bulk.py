@@ -0,0 +1,91 @@
+"""
+Batched inserts of Books and Movies across the Media multi-table inheritance.
+
+QuerySet.bulk_create refuses multi-table inherited models, so each batch is
+inserted as one bulk insert of Media parent rows followed by one multi-row
+insert of the Book/Movie child rows, inside a transaction per batch.
+
+No post_save signals fire for these rows. Instead ``media_bulk_created`` is
+sent once per batch, inside the batch's transaction, and its receiver in
+api.signals does the genre linking and index upkeep in bulk. A receiver
+that fails rolls its batch back, so a batch is never stored without them.
+"""
+from django.db import connections, router, transaction
+from django.dispatch import Signal
+
+from .models import Media
+
+# sender: Book or Movie; instances: the batch just inserted, with primary keys set
+media_bulk_created = Signal()
+
+PARENT_FIELDS = [field for field in Media._meta.concrete_fields if not field.primary_key]
+
+
+def _insert_parents(batch, using):
+    parents = [Media(**{field.attname: getattr(media, field.attname) for field in PARENT_FIELDS}) for media in batch]
+    if connections[using].features.can_return_rows_from_bulk_insert:
+        Media.objects.using(using).bulk_create(parents)
+    else:
+        # MySQL can't return ids from a bulk insert, so keyed rows are read back by their
+        # external ID and keyless ones (only ever dummy data) are saved one at a time
+        keyed = [parent for parent in parents if parent.external_id]
+        Media.objects.using(using).bulk_create(keyed)
+        ids = dict(Media.objects.using(using).filter(external_id__in=[parent.external_id for parent in keyed])
+                   .values_list('external_id', 'pk'))
+        for parent in parents:
+            if parent.external_id:
+                parent.pk = ids[parent.external_id]
+            else:
+                parent.save(using=using)
+
+    for media, parent in zip(batch, parents):
+        for field in PARENT_FIELDS:
+            setattr(media, field.attname, getattr(parent, field.attname))
+        media.id = media.media_ptr_id = parent.pk
+        media._state.adding = False
+        media._state.db = using
+
+
+def bulk_insert_rows(model, field_names, rows, using=None):
+    """
+    Insert tuples of values for ``field_names`` with one executemany.
+
+    Nothing is added or overridden along the way: no signals, defaults or
+    auto_now timestamps, so callers can write exactly the values they have.
+    """
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    fields = [model._meta.get_field(name) for name in field_names]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    prepared = [[field.get_db_prep_save(value, connection) for field, value in zip(fields, row)] for row in rows]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, prepared)
+
+
+def _insert_children(model, batch, using):
+    names = [field.attname for field in model._meta.local_concrete_fields]
+    bulk_insert_rows(model, names, [[getattr(media, name) for name in names] for media in batch], using)
+
+
+def bulk_create_media(model, instances, batch_size=1000):
+    """
+    Insert unsaved Book or Movie instances ``batch_size`` at a time and
+    return them with primary keys set.
+    """
+    instances = list(instances)
+    using = router.db_for_write(model)
+    media_type = model._meta.model_name
+    for start in range(0, len(instances), batch_size):
+        batch = instances[start:start + batch_size]
+        for media in batch:
+            media.media_type = media_type
+        with transaction.atomic(using=using):
+            _insert_parents(batch, using)
+            _insert_children(model, batch, using)
+            media_bulk_created.send(sender=model, instances=batch)
+    return instances
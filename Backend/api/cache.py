@@ -0,0 +1,105 @@
+"""
+Event-invalidated caching for the catalog summary views.
+
+Each entry is stored under a versioned key, and the Book/Movie/Review
+signals bump the version of every entry that depends on the changed model.
+The bump runs once the write's transaction commits, so a request that read
+the old rows while the write was in flight caches them under the old
+version, which is never read again.
+
+On a shared cache (REDIS_URL) the timeout is only a garbage-collection
+bound for superseded versions. The local-memory fallback is per process,
+so writes from management commands or other workers never reach it; there
+CATALOG_CACHE_TIMEOUT is short and bounds how stale an entry can get.
+
+GLOBAL_RATING is the exception: one review barely moves the mean of all of
+them, so it isn't invalidated by review writes and expires after
+GLOBAL_RATING_TIMEOUT instead of costing a full-table sum after every one.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'catalog'
+
+LATEST_BOOKS = 'latest_books'
+LATEST_MOVIES = 'latest_movies'
+POPULAR_RECOMMENDATIONS = 'recommendations:popular'
+FACETS = 'facets:all'
+BOOK_FACETS = 'facets:book'
+MOVIE_FACETS = 'facets:movie'
+GLOBAL_RATING = 'ratings:global_mean'
+
+GLOBAL_RATING_TIMEOUT = 60 * 60
+
+ENTRIES = [LATEST_BOOKS, LATEST_MOVIES, POPULAR_RECOMMENDATIONS, FACETS, BOOK_FACETS, MOVIE_FACETS, GLOBAL_RATING]
+
+DEPENDENCIES = {
+    'book': [LATEST_BOOKS, POPULAR_RECOMMENDATIONS, FACETS, BOOK_FACETS],
+    'movie': [LATEST_MOVIES, POPULAR_RECOMMENDATIONS, FACETS, MOVIE_FACETS],
+    'review': [
+        LATEST_BOOKS, LATEST_MOVIES, POPULAR_RECOMMENDATIONS, FACETS, BOOK_FACETS, MOVIE_FACETS,
+    ],
+}
+
+_MISSING = object()
+
+
+def _version_key(name):
+    return f'{KEY_PREFIX}:version:{name}'
+
+
+def _stat_key(name, kind):
+    return f'{KEY_PREFIX}:stats:{name}:{kind}'
+
+
+def _increment(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def cached(name, compute, timeout=None):
+    """Return the cached value of ``name``, computing and storing it on a miss"""
+    version = cache.get(_version_key(name), 0)
+    key = f'{KEY_PREFIX}:{name}:v{version}'
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _increment(_stat_key(name, 'hits'))
+        return value
+
+    _increment(_stat_key(name, 'misses'))
+    value = compute()
+    cache.set(key, value, timeout=settings.CATALOG_CACHE_TIMEOUT if timeout is None else timeout)
+    return value
+
+
+def invalidate(*names):
+    """Bump the versions of ``names`` once the current transaction commits (right away outside one)"""
+    def bump():
+        for name in names:
+            _increment(_version_key(name))
+    transaction.on_commit(bump)
+
+
+def invalidate_for(model_name):
+    """Invalidate every entry that depends on ``model_name`` ('book', 'movie' or 'review')"""
+    invalidate(*DEPENDENCIES[model_name])
+
+
+def stats():
+    keys = [_stat_key(name, kind) for name in ENTRIES for kind in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    report = {}
+    for name in ENTRIES:
+        hits = values.get(_stat_key(name, 'hits'), 0)
+        misses = values.get(_stat_key(name, 'misses'), 0)
+        total = hits + misses
+        report[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else None,
+        }
+    return report
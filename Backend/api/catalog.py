@@ -0,0 +1,250 @@
+"""
+Loading fetched catalog records into Book and Movie rows.
+
+Records are upserted on ``Media.external_id`` ("tmdb:603",
+"gbooks:zyTCAlFPjgYC"), so a refresh updates rows in place instead of
+matching on titles that are neither unique nor stable. A row loaded before
+it had an external ID is matched by title once and adopts the record's ID.
+Unchanged records are not written at all, which keeps the post_save
+reindexing off the rows a refresh didn't touch.
+
+Exact keys can't tell that two IDs are editions or re-releases of the same
+work, so ``duplicate_report`` runs the MinHash/LSH pass in api.dedupe over
+a media type and writes the near-duplicate groups out for review.
+"""
+import time
+import zlib
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from api.artifacts import save_report
+from api.bulk import PARENT_FIELDS, bulk_create_media
+from api.dedupe import find_duplicates
+from api.models import Book, Media, Movie
+from api.search import PERSON_FIELDS
+
+SOURCES = {'book': 'gbooks', 'movie': 'tmdb'}
+
+
+def external_id(media_type, value):
+    if value in (None, ''):
+        return None
+    return f'{SOURCES[media_type]}:{value}'
+
+
+def known_external_ids(media_type):
+    """Return the source IDs (without prefix) of every stored row of a media type"""
+    prefix = f'{SOURCES[media_type]}:'
+    stored = Media.objects.filter(external_id__startswith=prefix).values_list('external_id', flat=True)
+    return {value[len(prefix):] for value in stored.iterator()}
+
+
+def book_fields(record):
+    if not record.get('title') or not record.get('author'):
+        return None
+    return {
+        'title': record['title'],
+        'author': record['author'],
+        'publication_year': record.get('publication_year') or 2000,
+        'genre': record.get('genre', 'Fiction'),
+        'summary': record.get('summary', 'No summary available.'),
+        'image_url': book_image(record.get('image_links')),
+    }
+
+
+def book_image(image_links):
+    """The largest cover Google Books listed for a volume, or ''"""
+    for size in ('extraLarge', 'large', 'medium', 'small', 'thumbnail', 'smallThumbnail'):
+        if (image_links or {}).get(size):
+            return image_links[size][:500]
+    return ''
+
+
+def movie_fields(record):
+    if not record.get('title') or not record.get('director'):
+        return None
+    return {
+        'title': record['title'],
+        'director': record['director'],
+        'release_year': record.get('release_year') or 2000,
+        'genre': record.get('genre', 'Drama'),
+        'summary': record.get('summary', 'No summary available.'),
+        'image_url': f'{settings.TMDB_IMAGE_URL}{record["poster_path"]}'[:500] if record.get('poster_path') else '',
+    }
+
+
+RECORD_TYPES = {
+    'book': (Book, 'google_books_id', book_fields),
+    'movie': (Movie, 'tmdb_id', movie_fields),
+}
+YEAR_FIELDS = {'book': 'publication_year', 'movie': 'release_year'}
+
+
+def shard_of(media_type, record, shards):
+    """
+    Stable shard number for a record: by its source ID, or by title when it
+    has none, so every copy of a record lands in the same shard and parallel
+    loaders never race each other on the same key.
+    """
+    key = record.get(RECORD_TYPES[media_type][1]) or record.get('title') or ''
+    return zlib.crc32(str(key).encode()) % shards
+
+
+class CatalogLoader:
+    """
+    Upsert a stream of records of one media type, a batch at a time::
+
+        loader = CatalogLoader('movie')
+        for record in read_records(path):
+            loader.add(record)
+        loader.finish()
+
+    Each batch looks up which of its keys are already stored with one
+    query, so memory depends on the batch size and not on the size of the
+    file or the table. New records are bulk-inserted; the rest are
+    compared and only written when something changed.
+
+    ``outcomes`` counts created/updated/unchanged/skipped/failed records and
+    ``changed_ids`` holds the pks that were created or updated.
+    """
+
+    def __init__(self, media_type, batch_size=1000):
+        self.media_type = media_type
+        self.model, self.id_key, self.to_fields = RECORD_TYPES[media_type]
+        self.person = PERSON_FIELDS[media_type]
+        self.batch_size = batch_size
+        self.outcomes = Counter()
+        self.changed_ids = array('q')
+        self.keyed = {}
+        self.unkeyed = {}
+        self.started = time.perf_counter()
+
+    def add(self, record):
+        """Queue one record; returns 'skipped' for invalid records and 'queued' otherwise"""
+        fields = self.to_fields(record)
+        if fields is None:
+            self.outcomes['skipped'] += 1
+            return 'skipped'
+        key = external_id(self.media_type, record.get(self.id_key))
+
+        # A record repeated within a batch is loaded once, the last copy winning
+        queue, name = (self.unkeyed, (fields['title'], fields[self.person])) if key is None else (self.keyed, key)
+        if name in queue:
+            self.outcomes['unchanged'] += 1
+        queue[name] = fields
+
+        if len(self.keyed) + len(self.unkeyed) >= self.batch_size:
+            self.flush()
+        return 'queued'
+
+    def flush(self):
+        keyed, self.keyed = self.keyed, {}
+        unkeyed, self.unkeyed = self.unkeyed, {}
+        objects = self.model.objects
+
+        existing = {row.external_id: row for row in objects.filter(external_id__in=list(keyed))}
+        missing = [key for key in keyed if key not in existing]
+        if missing:
+            # A row loaded before external IDs is matched by title once and adopts the record's ID
+            titles = {keyed[key]['title'] for key in missing}
+            adoptable = {}
+            for row in objects.filter(external_id__isnull=True, title__in=titles):
+                adoptable.setdefault(row.title, row)
+            for key in missing:
+                row = adoptable.pop(keyed[key]['title'], None)
+                if row is not None:
+                    existing[key] = row
+
+        new = [self.model(external_id=key, **keyed[key]) for key in keyed if key not in existing]
+        if unkeyed:
+            # Records without an ID match on title and person, so different works sharing a
+            # title are both kept; they never overwrite
+            titles = {title for title, _ in unkeyed}
+            taken = set(objects.filter(title__in=titles).values_list('title', self.person)) & set(unkeyed)
+            self.outcomes['unchanged'] += len(taken)
+            new.extend(self.model(**fields) for name, fields in unkeyed.items() if name not in taken)
+        if new:
+            self.insert(new)
+
+        for key, row in existing.items():
+            self.update(row, dict(keyed[key], external_id=key))
+
+    def update(self, row, fields):
+        changed = [name for name, value in fields.items() if getattr(row, name) != value]
+        if not changed:
+            self.outcomes['unchanged'] += 1
+            return
+        for name in changed:
+            setattr(row, name, fields[name])
+        row.save(update_fields=changed + ['updated_at'])
+        self.outcomes['updated'] += 1
+        self.changed_ids.append(row.pk)
+
+    def insert(self, instances):
+        try:
+            bulk_create_media(self.model, instances, batch_size=self.batch_size)
+        except DatabaseError:
+            if len(instances) == 1:
+                self.insert_failed(instances[0])
+                return
+            # One bad row shouldn't cost the whole batch; retry it row by row to isolate it
+            for media in instances:
+                self.insert([media])
+            return
+        self.outcomes['created'] += len(instances)
+        self.changed_ids.extend(media.pk for media in instances)
+
+    def insert_failed(self, media):
+        """
+        A row rejected by the unique external ID was stored by someone else
+        since the batch was looked up, so it is updated instead.
+        """
+        row = self.model.objects.filter(external_id=media.external_id).first() if media.external_id else None
+        if row is None:
+            self.outcomes['failed'] += 1
+            return
+        # Every field a record can set; the rating aggregates and timestamps stay the row's own
+        fields = {field.attname: getattr(media, field.attname)
+                  for field in [*PARENT_FIELDS, *self.model._meta.local_concrete_fields]
+                  if field.editable and not field.primary_key}
+        self.update(row, fields)
+
+    def finish(self):
+        self.flush()
+        return self.outcomes
+
+    @property
+    def processed(self):
+        return sum(self.outcomes.values()) + len(self.keyed) + len(self.unkeyed)
+
+    def rate(self):
+        """Records processed per second so far"""
+        elapsed = time.perf_counter() - self.started
+        return self.processed / elapsed if elapsed else 0
+
+
+def duplicate_report(media_type, focus_ids=None, threshold=0.8):
+    """
+    Find near-duplicate groups of a media type and save them as the
+    ``duplicates_<media_type>`` report; returns (groups, report path).
+
+    With ``focus_ids`` (say, the rows a load just created) the whole
+    catalog is still scanned, but only groups involving those ids are kept.
+    """
+    model = RECORD_TYPES[media_type][0]
+    entries = model.objects.values_list(
+        'pk', 'title', PERSON_FIELDS[media_type], YEAR_FIELDS[media_type], 'review_count',
+    ).iterator(chunk_size=5000)
+    groups = find_duplicates(entries, threshold=threshold, focus_ids=focus_ids)
+    path = save_report(f'duplicates_{media_type}', {
+        'media_type': media_type,
+        'threshold': threshold,
+        'groups': [
+            {'canonical': group[0]['id'], 'duplicates': [member['id'] for member in group[1:]], 'members': group}
+            for group in groups
+        ],
+    })
+    return groups, path
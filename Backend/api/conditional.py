@@ -0,0 +1,68 @@
+"""
+Cheap HTTP validators for collection endpoints.
+
+The ETag of a collection is derived from a single ``MAX(updated_at),
+COUNT(*)`` aggregate over the filtered queryset, so a client revalidating
+an unchanged collection gets its 304 without anything being serialized.
+
+Collections get no Last-Modified: a delete doesn't move ``MAX(updated_at)``
+and HTTP dates only have whole seconds, so If-Modified-Since alone would
+answer 304 for collections that did change. Only the ETag, which also
+covers the row count, can produce a 304.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+
+class Validators:
+    def __init__(self, etag):
+        self.etag = etag
+
+
+def validators_for(queryset, request, field='updated_at'):
+    """Aggregate ``queryset`` once and turn the result into an ETag"""
+    stats = queryset.order_by().aggregate(latest=Max(field), count=Count('pk'))
+    latest = stats['latest']
+    fingerprint = '|'.join([
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+        str(stats['count']),
+        latest.isoformat() if latest else '',
+    ])
+    return Validators(f'"{hashlib.md5(fingerprint.encode()).hexdigest()}"')
+
+
+def not_modified(request, validators):
+    """Return a 304 response if the request's preconditions still hold, else None"""
+    response = get_conditional_response(request, etag=validators.etag)
+    if response is not None:
+        apply_validators(response, validators)
+    return response
+
+
+def apply_validators(response, validators):
+    response['ETag'] = validators.etag
+    # Let clients keep the body but always revalidate before reusing it
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+class ConditionalListMixin:
+    """ListModelMixin.list that answers unchanged collections with 304 Not Modified"""
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        validators = validators_for(queryset, request)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        else:
+            response = Response(self.get_serializer(queryset, many=True).data)
+        return apply_validators(response, validators)
@@ -0,0 +1,242 @@
+"""
+Near-duplicate detection for catalog titles with MinHash and LSH.
+
+Titles are normalized (accents, case, punctuation, bracketed notes and
+trailing edition wording such as "2nd Revised Edition" are dropped) and cut
+into character trigrams. Each title gets a MinHash signature of ``num_perm``
+hashes, which is split into ``bands`` bands of ``rows`` hashes (16 bands of
+6 by default); titles that
+share any band land in the same bucket and become candidate pairs. That
+finds similar titles in roughly linear time instead of comparing every
+pair, and a title pair with trigram Jaccard similarity ``s`` becomes a
+candidate with probability ``1 - (1 - s**rows)**bands`` (0.99 at 0.8,
+about 0.22 at 0.5 with the defaults).
+
+Candidates are then checked exactly: the trigram Jaccard similarity must
+reach ``threshold``, the two must share a person (same surname and a
+compatible first initial, so distinct works with the same title stay
+apart) and must carry the same sequel numbers (so "Rocky II" is not a
+duplicate of "Rocky III").
+
+Only NumPy and the standard library are used, so the fetch scripts can
+share the normalization without setting up Django.
+"""
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+NON_WORD_RE = re.compile(r'[^0-9a-z]+')
+BRACKETED_RE = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+# Only a qualified edition word ending the title, so "Ed Wood", "The Cut" and "Final Cut" keep their words
+EDITION_RE = re.compile(
+    r'(?:^| )(?:(?:\d+(?:st|nd|rd|th)|first|second|third|new|revised|updated|expanded|anniversary|deluxe|special|'
+    r'collector s|illustrated|annotated|abridged|unabridged|complete|definitive|director s|extended|remastered|'
+    r'theatrical|uncut|international|classic) )+(?:edition|ed|version|cut)$'
+)
+# 'The Hobbit' and library-style 'Hobbit, The' both lose their article
+ARTICLE_RE = re.compile(r'^(?:the|a|an)(?: |$)| (?:the|a|an)$')
+PEOPLE_SPLIT_RE = re.compile(r',|;|&|\band\b')
+SEQUEL_RE = re.compile(r'^(?:\d+|[ivx]{1,4})$')
+
+# Mersenne prime 2**31 - 1 keeps a * x + b inside int64 for 32-bit x
+PRIME = (1 << 31) - 1
+
+
+def _ascii_words(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+def normalize_title(title):
+    """'The Hobbit (75th Anniversary Edition)' -> 'hobbit'"""
+    text = _ascii_words(BRACKETED_RE.sub(' ', title or ''))
+    normalized = ARTICLE_RE.sub('', EDITION_RE.sub('', text))
+    # A title that is nothing but those words ("The Director's Cut", "(Untitled)") keeps them
+    return normalized or ARTICLE_RE.sub('', text) or _ascii_words(title)
+
+
+def normalize_person(people):
+    """'J.R.R. Tolkien, Christopher Tolkien' -> 'christopher tolkien|j r r tolkien'"""
+    names = (' '.join(_ascii_words(name).split()) for name in PEOPLE_SPLIT_RE.split(people or ''))
+    return '|'.join(sorted(name for name in names if name))
+
+
+def _names(person):
+    """(surname, first initial or '') for each name in a normalize_person() string"""
+    names = set()
+    for name in person.split('|'):
+        words = name.split()
+        if words:
+            names.add((words[-1], words[0][0] if len(words) > 1 else ''))
+    return names
+
+
+def people_match(a, b):
+    """True if a name on each side shares the surname and, where both have one, the first initial"""
+    return any(
+        surname == other and (not initial or not other_initial or initial == other_initial)
+        for surname, initial in _names(a) for other, other_initial in _names(b)
+    )
+
+
+def sequel_numbers(title):
+    return {word for word in title.split() if SEQUEL_RE.match(word)}
+
+
+def shingles(title, size=3):
+    padded = f' {title} '
+    return {padded[start:start + size] for start in range(max(1, len(padded) - size + 1))}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    MinHash signatures from universal hashes ``(a * x + b) mod PRIME`` over
+    the CRC32 of each shingle, computed a chunk of titles at a time.
+    """
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, PRIME, num_perm, dtype=np.int64)[:, None]
+        self.b = rng.integers(0, PRIME, num_perm, dtype=np.int64)[:, None]
+
+    def signatures(self, shingle_sets, chunk_size=2000):
+        """Return a uint32 [len(shingle_sets), num_perm] array; every set must be non-empty"""
+        result = np.empty((len(shingle_sets), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(shingle_sets), chunk_size):
+            chunk = shingle_sets[start:start + chunk_size]
+            lengths = np.fromiter((len(values) for values in chunk), dtype=np.int64, count=len(chunk))
+            hashes = np.fromiter(
+                (zlib.crc32(value.encode()) for values in chunk for value in values),
+                dtype=np.int64, count=int(lengths.sum()),
+            ) % PRIME
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            permuted = (self.a * hashes + self.b) % PRIME
+            result[start:start + len(chunk)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        return result
+
+
+def _bucket_pairs(order, starts, sizes, size):
+    """All pairs inside the buckets of exactly ``size`` members, as two index arrays"""
+    members = order[starts[sizes == size][:, None] + np.arange(size)]
+    first, second = np.triu_indices(size, 1)
+    return members[:, first].ravel(), members[:, second].ravel()
+
+
+def candidate_pairs(signatures, bands=16, max_bucket=500, split_keys=None):
+    """
+    Return an int64 [pairs, 2] array of the index pairs (i < j) that share
+    at least one LSH band.
+
+    A bucket bigger than ``max_bucket`` (say, fifty "Hamlet"s) is split by
+    ``split_keys[i]`` first, and sub-buckets still too big are skipped, so
+    one very common title can't turn the pass quadratic.
+    """
+    count, num_perm = signatures.shape
+    rows = num_perm // bands
+    multipliers = np.random.default_rng(0).integers(1, 1 << 63, rows, dtype=np.uint64) | np.uint64(1)
+    found = []
+    for band in range(bands):
+        values = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = (values * multipliers).sum(axis=1, dtype=np.uint64)
+        order = np.argsort(keys, kind='stable')
+        starts = np.flatnonzero(np.r_[True, keys[order][1:] != keys[order][:-1]])
+        sizes = np.diff(np.r_[starts, count])
+        for size in np.unique(sizes[(sizes > 1) & (sizes <= max_bucket)]).tolist():
+            found.append(_bucket_pairs(order, starts, sizes, size))
+        for start, size in zip(starts[sizes > max_bucket].tolist(), sizes[sizes > max_bucket].tolist()):
+            groups = {}
+            for index in order[start:start + size].tolist():
+                groups.setdefault(split_keys[index] if split_keys is not None else None, []).append(index)
+            for group in groups.values():
+                if 1 < len(group) <= max_bucket:
+                    group = np.array(group)
+                    found.append(_bucket_pairs(group, np.array([0]), np.array([len(group)]), len(group)))
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    first = np.concatenate([pair[0] for pair in found]).astype(np.int64)
+    second = np.concatenate([pair[1] for pair in found]).astype(np.int64)
+    codes = np.unique(np.minimum(first, second) * count + np.maximum(first, second))
+    return np.stack([codes // count, codes % count], axis=1)
+
+
+def _find(parents, index):
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def find_duplicates(entries, threshold=0.8, focus_ids=None, num_perm=96, bands=16, max_bucket=500):
+    """
+    Group near-duplicate catalog entries.
+
+    ``entries`` yields (id, title, person, year, popularity) tuples. Returns
+    a list of groups, biggest first; each is a list of member dicts with the
+    canonical entry (most popular, then lowest id) first. With
+    ``focus_ids`` only groups containing one of those ids are returned.
+    """
+    ids, titles, people, rows = [], [], [], []
+    for entry in entries:
+        title = normalize_title(entry[1])
+        if title:
+            ids.append(entry[0])
+            titles.append(title)
+            people.append(normalize_person(entry[2]))
+            rows.append(entry)
+    if len(ids) < 2:
+        return []
+
+    title_shingles = [shingles(title) for title in titles]
+    signatures = MinHasher(num_perm).signatures(title_shingles)
+    first_surnames = [min(_names(person), default=('', ''))[0] for person in people]
+    pairs = candidate_pairs(signatures, bands, max_bucket, first_surnames)
+    if focus_ids is not None:
+        focus = np.isin(np.array(ids), np.fromiter(set(focus_ids), dtype=np.int64))
+        pairs = pairs[focus[pairs[:, 0]] | focus[pairs[:, 1]]]
+    # The share of equal MinHashes estimates the Jaccard similarity, which
+    # drops most weak candidates before the exact comparison
+    estimates = np.concatenate([
+        (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).mean(axis=1)
+        for chunk in np.array_split(pairs, max(1, len(pairs) // 100000))
+    ]) if len(pairs) else np.empty(0)
+    pairs = pairs[estimates >= threshold - 0.15]
+
+    parents = list(range(len(ids)))
+    similarity = {}
+    for first, second in pairs.tolist():
+        score = jaccard(title_shingles[first], title_shingles[second])
+        if score < threshold or not people_match(people[first], people[second]):
+            continue
+        if sequel_numbers(titles[first]) != sequel_numbers(titles[second]):
+            continue
+        similarity[first] = max(similarity.get(first, 0), score)
+        similarity[second] = max(similarity.get(second, 0), score)
+        parents[_find(parents, first)] = _find(parents, second)
+
+    groups = {}
+    for index in similarity:
+        groups.setdefault(_find(parents, index), []).append(index)
+    report = []
+    for members in groups.values():
+        members.sort(key=lambda index: (-(rows[index][4] or 0), ids[index]))
+        report.append([
+            {
+                'id': ids[index],
+                'title': rows[index][1],
+                'person': rows[index][2],
+                'year': rows[index][3],
+                'similarity': round(similarity[index], 3),
+            }
+            for index in members
+        ])
+    report.sort(key=lambda group: (-len(group), group[0]['id']))
+    return report
@@ -0,0 +1,53 @@
+"""
+Catalog facet counts (genre, decade, rating bucket) computed in one round
+trip as a UNION ALL of three grouped queries.
+"""
+from django.db.models import CharField, Count, F, IntegerField, Value
+from django.db.models.functions import Cast, Coalesce, Floor
+
+from .models import Media
+
+UNRATED = 'unrated'
+
+
+def facet_counts(media_type=None):
+    media = Media.objects.all()
+    links = Media.genres.through.objects.all()
+    if media_type:
+        media = media.filter(media_type=media_type)
+        links = links.filter(media__media_type=media_type)
+
+    genres = links.order_by().values(
+        facet=Value('genre', output_field=CharField()),
+        key=F('genre__name'),
+    ).annotate(count=Count('media_id'))
+
+    year = Coalesce('book__publication_year', 'movie__release_year')
+    decades = media.order_by().annotate(
+        decade=Cast(Floor(year / Value(10)) * 10, IntegerField()),
+    ).values(
+        facet=Value('decade', output_field=CharField()),
+        key=Cast('decade', CharField()),
+    ).annotate(count=Count('id'))
+
+    ratings = media.order_by().annotate(
+        bucket=Cast(Floor('avg_rating'), IntegerField()),
+    ).values(
+        facet=Value('rating', output_field=CharField()),
+        key=Coalesce(Cast('bucket', CharField()), Value(UNRATED, output_field=CharField())),
+    ).annotate(count=Count('id'))
+
+    report = {'genres': [], 'decades': [], 'ratings': []}
+    for row in genres.union(decades, ratings, all=True):
+        if row['facet'] == 'genre':
+            report['genres'].append({'name': row['key'], 'count': row['count']})
+        elif row['facet'] == 'decade':
+            if row['key'] is not None:
+                report['decades'].append({'decade': int(row['key']), 'count': row['count']})
+        else:
+            report['ratings'].append({'bucket': row['key'], 'count': row['count']})
+
+    report['genres'].sort(key=lambda item: (-item['count'], item['name']))
+    report['decades'].sort(key=lambda item: item['decade'])
+    report['ratings'].sort(key=lambda item: (item['bucket'] == UNRATED, item['bucket']))
+    return report
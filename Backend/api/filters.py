@@ -0,0 +1,66 @@
+import django_filters
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Case, IntegerField, When
+from django.utils.text import slugify
+from rest_framework import filters
+
+from .models import Book, Media, Movie
+from .search import get_search_backend
+
+MEDIA_TYPES = dict(Media.MEDIA_TYPES)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that asks the configured search backend for ranked ids
+    instead of OR-ing icontains lookups across the joined Media tables.
+
+    Results come back in relevance order unless an explicit ordering is
+    requested, paginated or not. Only the SEARCH_RESULT_LIMIT best matches
+    are returned, so a broad query never pages past that many results.
+    The plain SearchFilter behaviour is kept as a fallback for when the
+    search backend itself fails.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        model_name = queryset.model._meta.model_name
+        media_type = model_name if model_name in MEDIA_TYPES else None
+        try:
+            ids = get_search_backend().search(' '.join(terms), media_type=media_type,
+                                              limit=settings.SEARCH_RESULT_LIMIT)
+        except DatabaseError:
+            return super().filter_queryset(request, queryset, view)
+
+        if not ids:
+            return queryset.none()
+        rank = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+                    output_field=IntegerField())
+        return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+class CatalogFilterSet(django_filters.FilterSet):
+    """Filters catalog rows through the normalized genre index"""
+    genre = django_filters.CharFilter(method='filter_genre', label='Genre (comma-separated, all must match)')
+
+    def filter_genre(self, queryset, name, value):
+        for slug in {slugify(part) for part in value.split(',')}:
+            if slug:
+                queryset = queryset.filter(genres__slug=slug)
+        return queryset
+
+
+class BookFilter(CatalogFilterSet):
+    class Meta:
+        model = Book
+        fields = ['genre', 'publication_year']
+
+
+class MovieFilter(CatalogFilterSet):
+    class Meta:
+        model = Movie
+        fields = ['genre', 'release_year']
@@ -0,0 +1,55 @@
+"""
+Normalization of the free-text, comma-joined Media.genre strings into
+indexed Genre rows linked through Media.genres.
+"""
+from django.utils.text import slugify
+
+from .models import Genre, Media
+
+MAX_LENGTH = Genre._meta.get_field('name').max_length
+
+
+def split_genres(text):
+    """Return {slug: display name} for every distinct genre in a comma-joined string"""
+    genres = {}
+    for part in (text or '').split(','):
+        name = ' '.join(part.split())[:MAX_LENGTH]
+        slug = slugify(name)[:MAX_LENGTH]
+        if slug:
+            genres.setdefault(slug, name)
+    return genres
+
+
+def resolve_genres(names_by_slug):
+    """Return {slug: Genre}, creating the genres that don't exist yet"""
+    genres = {genre.slug: genre for genre in Genre.objects.filter(slug__in=list(names_by_slug))}
+    missing = [Genre(name=name, slug=slug) for slug, name in names_by_slug.items() if slug not in genres]
+    if missing:
+        Genre.objects.bulk_create(missing, ignore_conflicts=True)
+        genres.update((genre.slug, genre) for genre in Genre.objects.filter(slug__in=[g.slug for g in missing]))
+    return genres
+
+
+def sync_media_genres(media):
+    """Point media.genres at the genres named in media.genre"""
+    media.genres.set(resolve_genres(split_genres(media.genre)).values())
+
+
+def link_genres(rows, batch_size=1000):
+    """Link many (media_id, genre string) pairs at once, for loaders that bypass save()"""
+    rows = list(rows)
+    names = {}
+    for _, text in rows:
+        names.update(split_genres(text))
+    genres = resolve_genres(names)
+
+    Through = Media.genres.through
+    links = {
+        (media_id, genres[slug].pk)
+        for media_id, text in rows
+        for slug in split_genres(text)
+    }
+    Through.objects.bulk_create(
+        [Through(media_id=media_id, genre_id=genre_id) for media_id, genre_id in links],
+        batch_size=batch_size, ignore_conflicts=True,
+    )
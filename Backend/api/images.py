@@ -0,0 +1,250 @@
+"""
+Cover and poster proxy backed by a size-bounded disk cache.
+
+An image is fetched from its source once and stored as the ``original``
+variant; resized variants are made from that file, never refetched. Files
+live under IMAGE_CACHE_DIR, named by a hash of (source URL, size), so a
+changed source URL is simply a new entry. Every read bumps the file's
+mtime, and once the cache grows past IMAGE_CACHE_MAX_BYTES the least
+recently used files are deleted until it is back under 90% of the limit.
+
+Concurrent misses for the same entry are collapsed: the first request
+fetches or resizes while the others wait for its result. The in-flight
+table is per process; processes only share the files, so with N workers an
+image is fetched at most N times.
+
+Resizing needs Pillow. Without it every size is served as the original.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import requests
+from django.conf import settings
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Target widths, as on TMDB's w154/w342/w780 posters
+SIZES = {
+    'small': 154,
+    'medium': 342,
+    'large': 780,
+    'original': None,
+}
+DEFAULT_SIZE = 'medium'
+
+MAGIC_NUMBERS = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+
+class ImageUnavailable(Exception):
+    """The source image couldn't be fetched or decoded"""
+
+
+def content_type(data):
+    for magic, mime_type in MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return mime_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+class DiskLRUCache:
+    """Bytes on disk by key, evicting the least recently read once over ``max_bytes``"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Running estimate, corrected by the directory scan of every eviction
+        self._size = None
+
+    def path(self, key):
+        return self.directory / key[:2] / key
+
+    @staticmethod
+    def _touch(path):
+        # Explicit nanoseconds: the kernel's own timestamps are only as fine as its
+        # clock tick, which would leave entries used within a few ms in arbitrary order
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._touch(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            self._touch(tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        if not self.directory.is_dir():
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime_ns, stat.st_size, entry.path
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+
+class SingleFlight:
+    """Run one call per key at a time; callers arriving meanwhile get that call's result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if leader:
+            try:
+                future.set_result(function())
+            except BaseException as error:
+                future.set_exception(error)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+        return future.result()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_flights = SingleFlight()
+
+
+def get_image_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskLRUCache(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_BYTES)
+    return _cache
+
+
+def served_size(size):
+    """Without Pillow there is nothing to resize with, so every size is the original"""
+    return size if Image is not None else 'original'
+
+
+def cache_key(url, size):
+    return hashlib.sha256(f'{url}|{served_size(size)}'.encode()).hexdigest()
+
+
+def etag_for(url, size):
+    # Entries are never rewritten in place, so the key identifies the bytes
+    return f'"{cache_key(url, size)[:32]}"'
+
+
+def fetch_source(url):
+    if not url.startswith(('http://', 'https://')):
+        raise ImageUnavailable(f'Unsupported image URL {url!r}')
+    try:
+        with requests.get(url, stream=True, timeout=settings.IMAGE_FETCH_TIMEOUT) as response:
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > settings.IMAGE_MAX_SOURCE_BYTES:
+                    raise ImageUnavailable(f'{url} is larger than {settings.IMAGE_MAX_SOURCE_BYTES} bytes')
+    except requests.RequestException as e:
+        raise ImageUnavailable(f'Fetching {url} failed: {e}') from e
+    if content_type(data) is None:
+        raise ImageUnavailable(f'{url} is not a PNG, JPEG, GIF or WebP image')
+    return bytes(data)
+
+
+def resize(data, width):
+    """Scale an image down to ``width`` as a JPEG; images already that narrow are kept as they are"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width <= width:
+                return data
+            height = max(1, round(image.height * width / image.width))
+            resized = image.convert('RGB').resize((width, height), Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImageUnavailable(f'Could not decode the image: {e}') from e
+    output = io.BytesIO()
+    resized.save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def _load(url, size, key):
+    cache = get_image_cache()
+    # A caller that finished just before this one took the lead may have stored it
+    data = cache.get(key)
+    if data is not None:
+        return data
+    if SIZES[size] is None:
+        data = fetch_source(url)
+    else:
+        data = resize(get_image(url, 'original')[0], SIZES[size])
+    cache.put(key, data)
+    return data
+
+
+def get_image(url, size=DEFAULT_SIZE):
+    """Return (bytes, content type) of the image at ``url`` in one of SIZES, fetching it on a miss"""
+    size = served_size(size)
+    key = cache_key(url, size)
+    data = get_image_cache().get(key)
+    if data is None:
+        data = _flights.do(key, lambda: _load(url, size, key))
+    return data, content_type(data)
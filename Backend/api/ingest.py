@@ -0,0 +1,141 @@
+"""
+Newline-delimited JSON record files exchanged between the fetch scripts and
+populate_database.
+
+One JSON object per line, so records can be written as they arrive and read
+back one at a time; peak memory stays flat however large the catalog gets.
+Paths ending in ``.gz`` are gzip-compressed. Plain ``.json`` array files
+written by older versions of the fetch scripts are still readable, and are
+parsed incrementally too rather than loaded whole.
+
+This module only uses the standard library so the fetch scripts can import
+it without setting up Django.
+"""
+import gzip
+import json
+import os
+
+GZIP_MAGIC = b'\x1f\x8b'
+WHITESPACE = ' \t\n\r'
+
+
+class RecordWriter:
+    """
+    Write records to ``path`` one line at a time.
+
+    Lines go to ``<path>.partial`` and the file is moved into place on a clean
+    close, so an interrupted run never leaves a truncated file where
+    populate_database would pick it up::
+
+        with RecordWriter('movies.ndjson.gz') as writer:
+            writer.write({'title': ...})
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.partial = self.path + '.partial'
+        self.count = 0
+        self.file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        opener = gzip.open if self.path.endswith('.gz') else open
+        self.file = opener(self.partial, 'wt', encoding='utf-8')
+        return self
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.file.write('\n')
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.partial, self.path)
+        else:
+            os.unlink(self.partial)
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """
+    Yield the elements of the top-level JSON array in text file ``f`` one at
+    a time, holding only the current chunk and element in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if buffer[pos:pos + 1] != '[':
+        raise ValueError('Expected a JSON array')
+    pos += 1
+    skip_whitespace()
+    if buffer[pos:pos + 1] == ']':
+        return
+    while True:
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if not eof and (end == len(buffer) or buffer[end] not in ',]' + WHITESPACE):
+            # A number cut off at the chunk boundary ("1." of "1.5") can still decode
+            fill()
+            continue
+        yield value
+        pos = end
+        skip_whitespace()
+        separator = buffer[pos:pos + 1]
+        pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f'Expected "," or "]" in JSON array, got {separator or "end of file"!r}')
+        skip_whitespace()
+
+
+def read_records(path):
+    """Yield the records in an NDJSON file (optionally gzipped) or a legacy JSON array file"""
+    path = str(path)
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    opener = gzip.open if compressed else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        if path.endswith('.json') or path.endswith('.json.gz'):
+            yield from iter_json_array(f)
+            return
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f'{path}, line {line_number}: {e}') from None
+
+
+def find_records(directory, name):
+    """Return the newest-format data file for ``name`` in ``directory``, or None"""
+    for suffix in ('.ndjson.gz', '.ndjson', '.json'):
+        path = os.path.join(directory, name + suffix)
+        if os.path.exists(path):
+            return path
+    return None
@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.autocomplete import PrefixIndex, catalog_entries
+
+WORDS = [
+    'the', 'of', 'night', 'shadow', 'king', 'last', 'city', 'war', 'love', 'dark', 'house', 'river',
+    'star', 'dream', 'secret', 'garden', 'storm', 'empire', 'silent', 'blood', 'winter', 'fire',
+    'girl', 'man', 'return', 'lost', 'golden', 'road', 'island', 'moon', 'ghost', 'glass', 'iron',
+    'song', 'heart', 'kingdom', 'summer', 'ocean', 'wolf', 'crown', 'memory', 'north', 'hidden',
+]
+NAMES = [
+    'smith', 'garcia', 'nguyen', 'okafor', 'tanaka', 'muller', 'rossi', 'kowalski', 'silva', 'haddad',
+    'anna', 'james', 'maria', 'li', 'omar', 'sofia', 'noah', 'elena', 'david', 'yuki',
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure build time, memory footprint and lookup latency of the autocomplete index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=0,
+                            help='Build from this many synthetic titles instead of the database')
+        parser.add_argument('--queries', type=int, default=10000, help='Number of timed lookups')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def synthetic_entries(self, size, rng):
+        for media_id in range(1, size + 1):
+            title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+            person = f'{rng.choice(NAMES)} {rng.choice(NAMES)}'
+            popularity = int(rng.paretovariate(1.2))
+            yield media_id, f'{title} {media_id}', rng.choice(('book', 'movie')), person, popularity
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        size = options['size']
+        entries = self.synthetic_entries(size, rng) if size else catalog_entries()
+
+        index = PrefixIndex()
+        started = time.perf_counter()
+        index.build(entries)
+        build_seconds = time.perf_counter() - started
+        memory = index.memory_usage()
+
+        vocabulary = WORDS + NAMES
+        prefixes = [rng.choice(vocabulary)[:rng.randint(1, 6)] for _ in range(options['queries'])]
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.lookup(prefix)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+
+        def percentile(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {len(index)} media in {build_seconds:.2f}s'))
+        self.stdout.write(f'Memory: {memory / 1024 / 1024:.1f} MiB ({memory / max(len(index), 1):.0f} bytes/media)')
+        self.stdout.write(
+            f'Lookup latency: p50={percentile(0.5):.3f}ms p99={percentile(0.99):.3f}ms max={timings[-1] * 1000:.3f}ms'
+        )
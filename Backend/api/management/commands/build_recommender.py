@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.recommender import build_from_reviews, build_item_similarities, rating_matrix, score_candidates
+
+
+class Command(BaseCommand):
+    help = 'Build the item-item similarity artifact used for personalized recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=50, help='Similar items kept per item')
+        parser.add_argument('--benchmark', type=int, metavar='REVIEWS', default=0,
+                            help='Instead of building from the database, time a build over this many '
+                                 'synthetic reviews and measure per-request scoring latency')
+        parser.add_argument('--users', type=int, default=100000, help='Synthetic users for --benchmark')
+        parser.add_argument('--items', type=int, default=50000, help='Synthetic media for --benchmark')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark(options)
+            return
+
+        self.stdout.write(self.style.SUCCESS('Building item similarities from reviews...'))
+        started = time.perf_counter()
+        items, reviews = build_from_reviews(k=options['neighbors'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Built similarities for {items} media from {reviews} reviews in {elapsed:.2f}s'
+        ))
+
+    def benchmark(self, options):
+        rng = np.random.default_rng(options['seed'])
+        reviews, users, items = options['benchmark'], options['users'], options['items']
+
+        # Zipf-like popularity so a few titles collect most of the reviews
+        popularity = 1.0 / np.arange(1, items + 1) ** 0.8
+        popularity /= popularity.sum()
+        user_ids = rng.integers(0, users, reviews)
+        media_ids = rng.choice(items, size=reviews, p=popularity)
+        ratings = rng.integers(1, 6, reviews)
+
+        started = time.perf_counter()
+        matrix, index = rating_matrix(user_ids, media_ids, ratings)
+        neighbors, scores = build_item_similarities(matrix, k=options['neighbors'])
+        build_seconds = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {matrix.shape[1]} x {options["neighbors"]} neighbours from {matrix.nnz} ratings '
+            f'({matrix.shape[0]} users) in {build_seconds:.2f}s'
+        ))
+        size = index.nbytes + neighbors.nbytes + scores.nbytes
+        self.stdout.write(f'Artifact size: {size / 1024 / 1024:.1f} MiB')
+
+        artifact = {'media_ids': index, 'neighbors': neighbors, 'scores': scores}
+        matrix = matrix.tocsr()
+        timings = []
+        for user in rng.integers(0, matrix.shape[0], 1000):
+            row = matrix[user]
+            started = time.perf_counter()
+            score_candidates(artifact, index[row.indices], row.data)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(
+            f'Scoring latency: p50={timings[len(timings) // 2] * 1000:.3f}ms '
+            f'p99={timings[int(len(timings) * 0.99)] * 1000:.3f}ms'
+        )
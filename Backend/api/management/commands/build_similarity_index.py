@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.similarity import build_index, build_similarity_index, features_for, nearest
+
+
+class Command(BaseCommand):
+    help = 'Build the content-similarity artifact behind /api/media/<id>/similar/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=20, help='Similar media kept per media')
+        parser.add_argument('--benchmark', type=int, metavar='MEDIA', default=0,
+                            help='Instead of building from the database, time a build over this many '
+                                 'synthetic media and measure query latency')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark(options)
+            return
+
+        self.stdout.write(self.style.SUCCESS('Building content similarity index...'))
+        started = time.perf_counter()
+        count = build_similarity_index(k=options['neighbors'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} media in {elapsed:.2f}s'))
+
+    def benchmark(self, options):
+        rng = random.Random(options['seed'])
+        vocabulary = [f'word{i}' for i in range(20000)]
+        genres = ['Fiction', 'Science Fiction', 'Fantasy', 'Mystery', 'Thriller', 'Romance',
+                  'Drama', 'Comedy', 'Horror', 'Documentary', 'Biography', 'Animation']
+
+        started = time.perf_counter()
+        documents = [
+            (media_id, features_for(
+                ' '.join(rng.choices(vocabulary, k=3)),
+                ', '.join(rng.sample(genres, 2)),
+                ' '.join(rng.choices(vocabulary, k=60)),
+            ))
+            for media_id in range(1, options['benchmark'] + 1)
+        ]
+        self.stdout.write(f'Generated {len(documents)} documents in {time.perf_counter() - started:.2f}s')
+
+        started = time.perf_counter()
+        artifact = build_index(documents, k=options['neighbors'])
+        build_seconds = time.perf_counter() - started
+        size = sum(array.nbytes for array in artifact.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {artifact["embeddings"].shape} embeddings and neighbours in {build_seconds:.2f}s '
+            f'({size / 1024 / 1024:.1f} MiB)'
+        ))
+
+        # Latency of the slow path: a media missing from the index compared against every row
+        timings = []
+        for media_id in rng.sample(range(len(documents)), min(200, len(documents))):
+            query = artifact['embeddings'][media_id:media_id + 1]
+            started = time.perf_counter()
+            nearest(query, artifact['embeddings'], artifact['media_ids'], 10)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(
+            f'Brute-force query latency: p50={timings[len(timings) // 2] * 1000:.3f}ms '
+            f'p99={timings[int(len(timings) * 0.99)] * 1000:.3f}ms'
+        )
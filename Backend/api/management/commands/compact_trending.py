@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.trending import compact
+
+
+class Command(BaseCommand):
+    help = 'Fold recent review and favorite buckets into decayed trending scores and prune old buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-days', type=int, default=settings.TRENDING_WINDOW_DAYS,
+                            help='Days of buckets that count towards a score')
+        parser.add_argument('--half-life', type=float, default=settings.TRENDING_HALF_LIFE_DAYS,
+                            help='Days after which an event counts half')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Compacting trending buckets...'))
+        started = time.perf_counter()
+        scored, pruned = compact(window_days=options['window_days'], half_life_days=options['half_life'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {scored} trending media and pruned {pruned} expired buckets in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.catalog import duplicate_report
+
+
+class Command(BaseCommand):
+    help = 'Scan the catalog for near-duplicate titles (editions, re-releases) and write a merge report per media type'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--media-type', choices=['book', 'movie'], action='append',
+                            help='Only scan this media type (repeatable; default: both)')
+        parser.add_argument('--threshold', type=float, default=0.8,
+                            help='Minimum trigram Jaccard similarity of normalized titles')
+        parser.add_argument('--show', type=int, default=10, help='Print this many of the largest groups')
+
+    def handle(self, *args, **options):
+        for media_type in options['media_type'] or ['book', 'movie']:
+            groups, path = duplicate_report(media_type, threshold=options['threshold'])
+            duplicates = sum(len(group) - 1 for group in groups)
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(groups)} groups of near-duplicate {media_type}s ({duplicates} rows would merge); report: {path}'
+            ))
+            for group in groups[:options['show']]:
+                canonical, rest = group[0], group[1:]
+                self.stdout.write(f'  #{canonical["id"]} {canonical["title"]} ({canonical["person"]}, {canonical["year"]})')
+                for member in rest:
+                    self.stdout.write(
+                        f'    <- #{member["id"]} {member["title"]} ({member["person"]}, {member["year"]}) '
+                        f'similarity {member["similarity"]:.2f}'
+                    )
@@ -0,0 +1,281 @@
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone as tz
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from api import trending
+from api.bulk import bulk_create_media, bulk_insert_rows
+from api.models import Book, Favorite, Media, Movie, Review
+from api.parallel import worker_pool
+from api.popularity import rebuild_popularity
+from api.ratings import rebuild_rating_aggregates
+
+GENRES = {
+    'book': ['Fiction', 'Science Fiction', 'Fantasy', 'Mystery', 'Thriller', 'Romance', 'Historical Fiction',
+             'Biography', 'Self-Help', 'Business', 'History', 'Science', 'Poetry', 'Horror', 'Young Adult'],
+    'movie': ['Action', 'Comedy', 'Drama', 'Science Fiction', 'Horror', 'Romance', 'Thriller', 'Animation',
+              'Documentary', 'Fantasy', 'Crime', 'Adventure', 'Family', 'War', 'Western'],
+}
+YEARS = {'book': (1850, 2024), 'movie': (1930, 2024)}
+# Mixed into every chunk's seed so each kind of row draws from its own stream
+STREAMS = {'book': 1, 'movie': 2, 'review': 3, 'favorite': 4}
+REVIEW_PHRASES = 2000
+
+_cache = {}
+
+
+def _rng(seed, stream, chunk):
+    """A generator that depends only on the seed and the chunk, never on which worker runs it"""
+    return np.random.default_rng([seed, STREAMS[stream], chunk])
+
+
+def _faker(rng):
+    fake = Faker()
+    fake.seed_instance(int(rng.integers(2 ** 32)))
+    return fake
+
+
+def _catalog_model(seed, media_count, skew):
+    """Per-process popularity CDF, rank order and per-media quality, computed once per worker"""
+    key = (seed, media_count, skew)
+    if key not in _cache:
+        rng = np.random.default_rng([seed, 0])
+        weights = 1.0 / np.arange(1, media_count + 1) ** skew
+        cdf = np.cumsum(weights)
+        cdf /= cdf[-1]
+        # Popularity rank is shuffled so the most reviewed media aren't just the lowest ids
+        order = rng.permutation(media_count)
+        quality = np.clip(rng.normal(3.6, 0.7, media_count), 1, 5)
+        fake = _faker(rng)
+        phrases = [fake.sentence(nb_words=12) for _ in range(REVIEW_PHRASES)]
+        _cache.clear()
+        _cache[key] = cdf, order, quality, phrases
+    return _cache[key]
+
+
+def _pick_media(rng, cdf, order, count):
+    """``count`` distinct media indexes, drawn with Zipf-skewed popularity"""
+    picked = set()
+    for _ in range(8):
+        if len(picked) >= count:
+            break
+        picked.update(order[np.searchsorted(cdf, rng.random(count - len(picked)))].tolist())
+    if len(picked) < count:
+        # Heavy users of a small catalog would otherwise keep re-drawing the same hits
+        rest = np.setdiff1d(np.arange(len(order)), np.fromiter(picked, dtype=np.int64))
+        picked.update(rng.choice(rest, count - len(picked), replace=False).tolist())
+    return sorted(picked)[:count]
+
+
+def generate_media(media_type, seed, start, count):
+    """Return (title, person, year, genre, summary) tuples for media ``start`` .. ``start + count``"""
+    rng = _rng(seed, media_type, start)
+    fake = _faker(rng)
+    genres = GENRES[media_type]
+    low, high = YEARS[media_type]
+    rows = []
+    for _ in range(count):
+        picked = rng.choice(len(genres), size=int(rng.integers(1, 4)), replace=False)
+        rows.append((
+            fake.catch_phrase()[:255],
+            fake.name(),
+            int(rng.integers(low, high + 1)),
+            ', '.join(genres[index] for index in sorted(picked)),
+            fake.paragraph(nb_sentences=5),
+        ))
+    return rows
+
+
+def generate_reviews(seed, start, count, media_count, mean, skew, days, now):
+    """Return (user index, media index, rating, text, created_at timestamp) tuples for users ``start`` .. ``start + count``"""
+    cdf, order, quality, phrases = _catalog_model(seed, media_count, skew)
+    rng = _rng(seed, 'review', start)
+    # Geometric counts: most users write a few reviews, a long tail writes many
+    counts = np.minimum(rng.geometric(1 / mean, size=count) if mean >= 1 else rng.binomial(1, mean, size=count),
+                        media_count)
+    rows = []
+    for offset, reviews in enumerate(counts.tolist()):
+        if not reviews:
+            continue
+        media = _pick_media(rng, cdf, order, reviews)
+        ratings = np.clip(np.rint(quality[media] + rng.normal(0, 0.9, len(media))), 1, 5).astype(int).tolist()
+        ages = rng.exponential(days / 4, len(media)).clip(0, days) * 86400
+        texts = rng.integers(len(phrases), size=len(media)).tolist()
+        for media_index, rating, age, text in zip(media, ratings, ages.tolist(), texts):
+            rows.append((start + offset, media_index, rating, phrases[text], now - age))
+    return rows
+
+
+def generate_favorites(seed, start, count, media_count, mean, skew, days, now):
+    """Return (user index, media index, list type, date_added timestamp) tuples for users ``start`` .. ``start + count``"""
+    cdf, order, _, _ = _catalog_model(seed, media_count, skew)
+    rng = _rng(seed, 'favorite', start)
+    counts = np.minimum(rng.poisson(mean, size=count), media_count)
+    rows = []
+    for offset, favorites in enumerate(counts.tolist()):
+        if not favorites:
+            continue
+        media = _pick_media(rng, cdf, order, favorites)
+        wishlist = (rng.random(len(media)) < 0.3).tolist()
+        ages = rng.exponential(days / 4, len(media)).clip(0, days) * 86400
+        for media_index, is_wishlist, age in zip(media, wishlist, ages.tolist()):
+            rows.append((start + offset, media_index, 'wishlist' if is_wishlist else 'favorite', now - age))
+    return rows
+
+
+def _chunks(total, size):
+    return [(start, min(size, total - start)) for start in range(0, total, size)]
+
+
+class Command(BaseCommand):
+    help = ('Generate a reproducible synthetic catalog with users, Zipf-skewed reviews and favorites '
+            'for load testing, generated across worker processes and bulk inserted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--movies', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--reviews', type=int, default=10000, help='Approximate number of reviews')
+        parser.add_argument('--favorites', type=int, default=2000, help='Approximate number of favorites')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent of media popularity (0 = uniform, higher = a few hits get most reviews)')
+        parser.add_argument('--days', type=int, default=365, help='Spread review and favorite dates over this many days')
+        parser.add_argument('--seed', type=int, default=42, help='The same seed always generates the same data')
+        parser.add_argument('--password', default='loadtest', help='Password of every generated user')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Generator processes; 1 generates in this process')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows (or users) generated per task')
+
+    def handle(self, *args, **options):
+        self.seed = options['seed']
+        self.prefix = f'load{self.seed}'
+        if Media.objects.filter(external_id__startswith=f'{self.prefix}:').exists():
+            raise CommandError(f'Load data for seed {self.seed} already exists; use another --seed or a fresh database')
+
+        self.workers = max(1, options['workers'])
+        self.chunk_size = options['chunk_size']
+        self.pool = None
+        if self.workers > 1:
+            # Workers only generate; every write goes through this process's connection
+            self.pool = worker_pool(self.workers)
+
+        started = time.perf_counter()
+        try:
+            media_ids = self.create_media('book', Book, options['books'])
+            media_ids += self.create_media('movie', Movie, options['movies'])
+            user_ids = self.create_users(options['users'], options['password'], options['days'])
+            if media_ids and user_ids:
+                self.create_activity(media_ids, user_ids, options)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+
+        self.step('Rebuilding rating aggregates, popularity and trending...')
+        rebuild_rating_aggregates()
+        rebuild_popularity()
+        trending.rebuild_buckets()
+        trending.compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated load data for seed {self.seed} in {time.perf_counter() - started:.1f}s. '
+            'Run build_recommender and build_similarity_index to cover the new catalog.'
+        ))
+
+    def step(self, message):
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def generate(self, function, tasks):
+        """Yield each task's rows in task order while up to ``workers`` tasks run ahead"""
+        if self.pool is None:
+            for task in tasks:
+                yield function(*task)
+            return
+        pending = deque()
+        for task in tasks:
+            pending.append(self.pool.submit(function, *task))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def report(self, what, rows, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'  {rows} {what} in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)')
+
+    def create_media(self, media_type, model, total):
+        """Generate and bulk insert ``total`` media; returns their pks in generation order"""
+        if not total:
+            return []
+        self.step(f'Generating {total} {media_type}s...')
+        started = time.perf_counter()
+        person = 'author' if media_type == 'book' else 'director'
+        year = 'publication_year' if media_type == 'book' else 'release_year'
+        ids = []
+        tasks = [(media_type, self.seed, start, count) for start, count in _chunks(total, self.chunk_size)]
+        for (_, _, start, _), rows in zip(tasks, self.generate(generate_media, tasks)):
+            instances = [
+                model(external_id=f'{self.prefix}:{media_type}{start + offset}', title=title, genre=genre,
+                      summary=summary, **{person: name, year: released})
+                for offset, (title, name, released, genre, summary) in enumerate(rows)
+            ]
+            ids.extend(media.pk for media in bulk_create_media(model, instances))
+        self.report(f'{media_type}s', total, started)
+        return ids
+
+    def create_users(self, total, password, days):
+        if not total:
+            return []
+        self.step(f'Creating {total} users...')
+        started = time.perf_counter()
+        # Hashing once and sharing it keeps this fast while every user can still log in
+        password = make_password(password)
+        now = timezone.now()
+        rng = np.random.default_rng([self.seed, 5])
+        joined = rng.uniform(days, days * 2, total).tolist()
+        usernames = [f'{self.prefix}_{index}' for index in range(total)]
+        for start, count in _chunks(total, self.chunk_size):
+            User.objects.bulk_create([
+                User(username=usernames[index], email=f'{usernames[index]}@example.com', password=password,
+                     date_joined=now - timedelta(days=joined[index]))
+                for index in range(start, start + count)
+            ])
+        # Read back by username, since not every backend returns ids from a bulk insert
+        by_name = dict(User.objects.filter(username__startswith=f'{self.prefix}_').values_list('username', 'pk'))
+        self.report('users', total, started)
+        return [by_name[username] for username in usernames]
+
+    def create_activity(self, media_ids, user_ids, options):
+        now = timezone.now()
+        for kind, model, fields, function, total in [
+            ('reviews', Review, ['user', 'media', 'rating', 'review_text', 'created_at', 'updated_at'],
+             generate_reviews, options['reviews']),
+            ('favorites', Favorite, ['user', 'media', 'list_type', 'date_added'],
+             generate_favorites, options['favorites']),
+        ]:
+            if not total:
+                continue
+            self.step(f'Generating about {total} {kind}...')
+            started = time.perf_counter()
+            mean = total / len(user_ids)
+            tasks = [
+                (self.seed, start, count, len(media_ids), mean, options['skew'], options['days'], now.timestamp())
+                for start, count in _chunks(len(user_ids), max(1, int(self.chunk_size / max(mean, 1))))
+            ]
+            written = 0
+            for rows in self.generate(function, tasks):
+                values = []
+                for user_index, media_index, *rest, timestamp in rows:
+                    when = datetime.fromtimestamp(timestamp, tz=tz.utc)
+                    stamps = [when, when] if model is Review else [when]
+                    values.append([user_ids[user_index], media_ids[media_index], *rest, *stamps])
+                with transaction.atomic():
+                    bulk_insert_rows(model, fields, values)
+                written += len(values)
+            self.report(kind, written, started)
@@ -1,16 +1,67 @@
 import os
-import json
+import time
+from array import array
+from collections import Counter
+from itertools import islice
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from api.bulk import bulk_create_media
+from api.catalog import CatalogLoader, duplicate_report, shard_of
+from api.ingest import find_records, read_records
+from api.parallel import worker_pool
 from api.models import Book, Movie
+from api.similarity import update_similarity_index
 from faker import Faker
 from django.conf import settings
 from pathlib import Path
 
+
+def _records(path, offset, limit):
+    return islice(read_records(path), offset, None if limit is None else offset + limit)
+
+
+def _load_shard(media_type, path, shard, shards, offset, limit, batch_size):
+    """Load the records of one shard on this worker's own connection; returns (outcomes, changed ids)"""
+    loader = CatalogLoader(media_type, batch_size=batch_size)
+    try:
+        for record in _records(path, offset, limit):
+            if shard_of(media_type, record, shards) == shard:
+                try:
+                    loader.add(record)
+                except Exception:
+                    loader.outcomes['failed'] += 1
+        return loader.finish(), loader.changed_ids
+    finally:
+        connections.close_all()
+
+
 class Command(BaseCommand):
-    help = 'Populate the database with books and movies from JSON files'
+    help = 'Populate the database with books and movies from the NDJSON (or legacy JSON) files the fetch scripts write'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', help='Books file (default: newest of scripts/data/books.ndjson[.gz]/.json)')
+        parser.add_argument('--movies', help='Movies file (default: newest of scripts/data/movies.ndjson[.gz]/.json)')
+        parser.add_argument('--offset', type=int, default=0, help='Skip this many records at the start of each file')
+        parser.add_argument('--limit', type=int, help='Load at most this many records from each file')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records written per transaction')
+        parser.add_argument('--progress', type=int, default=10000, help='Report progress every N records (0 = off)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Load each file as this many shards in parallel processes, each with its own '
+                                 'database connection (records are then counted, not reported one by one)')
+        parser.add_argument('--benchmark', type=int, nargs='?', const=5000, metavar='N',
+                            help='First load N records (default 5000) in this process and roll them back, '
+                                 'to compare the real load against a single-process baseline')
+        parser.add_argument('--skip-dedupe', action='store_true',
+                            help='Don\'t check loaded rows for near-duplicates of the rest of the catalog')
+
+    def data_path(self, path, name):
+        return path or find_records(os.path.join(settings.BASE_DIR, 'scripts', 'data'), name)
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting database population...'))
+        # Only ids are kept per record, packed, so a huge file doesn't grow memory much
+        self.changed_ids = array('q')
+        self.options = options
 
         book_count = Book.objects.count()
         movie_count = Movie.objects.count()
@@ -23,111 +74,139 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS('Creating additional dummy movies...'))
             self.create_dummy_movies(50 - movie_count)
 
-        self.populate_books()
-        self.populate_movies()
+        self.populate_books(self.data_path(options['books'], 'books'))
+        self.populate_movies(self.data_path(options['movies'], 'movies'))
+        self.update_similarity_index()
 
         self.stdout.write(self.style.SUCCESS('Database population completed!'))
 
-    def populate_books(self):
+    def populate_books(self, books_path):
         try:
-            books_path = os.path.join(settings.BASE_DIR, "scripts", "data", "books.json")
+            if books_path is None:
+                raise FileNotFoundError
             self.stdout.write(self.style.SUCCESS(f'Looking for books at: {books_path}'))
-            with open(books_path, "r") as f:
-                books_data = json.load(f)
-
-            count = 0
-            skipped = 0
-            for i, book_data in enumerate(books_data):
-                try:
-                    if not book_data.get('title') or not book_data.get('author'):
-                        self.stdout.write(self.style.WARNING(f'Skipping book at index {i}: Missing title or author'))
-                        skipped += 1
-                        continue
-
-                    publication_year = book_data.get('publication_year') or 2000
-
-                    book, created = Book.objects.get_or_create(
-                        title=book_data.get('title'),
-                        defaults={
-                            'author': book_data.get('author'),
-                            'publication_year': publication_year,
-                            'genre': book_data.get('genre', 'Fiction'),
-                            'summary': book_data.get('summary', 'No summary available.'),
-                            'media_type': 'book'
-                        }
-                    )
-
-                    if created:
-                        count += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'Error processing book at index {i}: {str(e)}'))
-                    skipped += 1
-
-            self.stdout.write(self.style.SUCCESS(f'Added {count} new books to database (skipped {skipped} books)'))
+            outcomes, rate = self.load('book', books_path, 'Missing title or author')
+            self.stdout.write(self.style.SUCCESS(
+                f'Added {outcomes["created"]} new books to database, updated {outcomes["updated"]} '
+                f'(skipped {outcomes["skipped"] + outcomes["failed"]} books, {rate:.0f} rows/s)'
+            ))
 
         except FileNotFoundError:
             self.stdout.write(self.style.WARNING('Books data file not found. Run fetch_books.py first.'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error populating books: {str(e)}'))
 
-    def populate_movies(self):
+    def populate_movies(self, movies_path):
         try:
-            movies_path = os.path.join(settings.BASE_DIR, "scripts", "data", "movies.json")
+            if movies_path is None:
+                raise FileNotFoundError
             self.stdout.write(self.style.SUCCESS(f'Looking for movies at: {movies_path}'))
-            with open(movies_path, "r") as f:
-                movies_data = json.load(f)
-
-            count = 0
-            skipped = 0
-            for i, movie_data in enumerate(movies_data):
-                try:
-                    if not movie_data.get('title') or not movie_data.get('director'):
-                        self.stdout.write(self.style.WARNING(f'Skipping movie at index {i}: Missing title or director'))
-                        skipped += 1
-                        continue
-
-                    release_year = movie_data.get('release_year') or 2000
-
-                    movie, created = Movie.objects.get_or_create(
-                        title=movie_data.get('title'),
-                        defaults={
-                            'director': movie_data.get('director'),
-                            'release_year': release_year,
-                            'genre': movie_data.get('genre', 'Drama'),
-                            'summary': movie_data.get('summary', 'No summary available.'),
-                            'media_type': 'movie'
-                        }
-                    )
-
-                    if created:
-                        count += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'Error processing movie at index {i}: {str(e)}'))
-                    skipped += 1
-
-            self.stdout.write(self.style.SUCCESS(f'Added {count} new movies to database'))
+            outcomes, rate = self.load('movie', movies_path, 'Missing title or director')
+            self.stdout.write(self.style.SUCCESS(
+                f'Added {outcomes["created"]} new movies to database, updated {outcomes["updated"]} '
+                f'({rate:.0f} rows/s)'
+            ))
 
         except FileNotFoundError:
             self.stdout.write(self.style.WARNING('Movies data file not found. Run fetch_movies.py first.'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error populating movies: {str(e)}'))
 
+    def load(self, media_type, path, missing):
+        """Stream a records file through a batched loader; returns (outcomes, rows per second)"""
+        baseline = self.baseline(media_type, path) if self.options['benchmark'] else None
+        loaded_from = len(self.changed_ids)
+        if self.options['workers'] > 1:
+            outcomes, rate = self.load_parallel(media_type, path)
+        else:
+            outcomes, rate = self.load_serial(media_type, path, missing)
+        if baseline:
+            self.stdout.write(self.style.SUCCESS(
+                f'  {rate:.0f} rows/s with {self.options["workers"]} worker(s), '
+                f'{rate / baseline:.1f}x the single-process baseline of {baseline:.0f} rows/s'
+            ))
+        if not self.options['skip_dedupe'] and len(self.changed_ids) > loaded_from:
+            self.report_duplicates(media_type, self.changed_ids[loaded_from:])
+        return outcomes, rate
+
+    def report_duplicates(self, media_type, ids):
+        groups, path = duplicate_report(media_type, focus_ids=ids)
+        if groups:
+            self.stdout.write(self.style.WARNING(
+                f'  {len(groups)} groups of near-duplicate {media_type}s involve loaded rows; see {path}'
+            ))
+
+    def baseline(self, media_type, path):
+        """Rows per second of a single-process load of the first records, which is rolled back"""
+        loader = CatalogLoader(media_type, batch_size=self.options['batch_size'])
+        with transaction.atomic():
+            for record in _records(path, self.options['offset'], self.options['benchmark']):
+                loader.add(record)
+            loader.finish()
+            rate = loader.rate()
+            transaction.set_rollback(True)
+        return rate
+
+    def load_parallel(self, media_type, path):
+        workers, batch_size = self.options['workers'], self.options['batch_size']
+        offset, limit = self.options['offset'], self.options['limit']
+        self.stdout.write(f'  Loading {media_type}s as {workers} shards in parallel...')
+        started = time.perf_counter()
+        outcomes = Counter()
+        with worker_pool(workers) as pool:
+            futures = [pool.submit(_load_shard, media_type, path, shard, workers, offset, limit, batch_size)
+                       for shard in range(workers)]
+            for future in futures:
+                shard_outcomes, changed_ids = future.result()
+                outcomes.update(shard_outcomes)
+                self.changed_ids.extend(changed_ids)
+        elapsed = time.perf_counter() - started
+        return outcomes, sum(outcomes.values()) / elapsed if elapsed else 0
+
+    def load_serial(self, media_type, path, missing):
+        loader = CatalogLoader(media_type, batch_size=self.options['batch_size'])
+        offset, limit, progress = self.options['offset'], self.options['limit'], self.options['progress']
+        # Records are parsed one at a time, so memory stays flat however big the file is
+        records = _records(path, offset, limit)
+        for i, record in enumerate(records, offset):
+            try:
+                if loader.add(record) == 'skipped':
+                    self.stdout.write(self.style.WARNING(f'Skipping {media_type} at index {i}: {missing}'))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error processing {media_type} at index {i}: {str(e)}'))
+                loader.outcomes['failed'] += 1
+            if progress and (i + 1 - offset) % progress == 0:
+                self.stdout.write(f'  {i + 1 - offset} {media_type}s processed ({loader.rate():.0f} rows/s)')
+        outcomes = loader.finish()
+        self.changed_ids.extend(loader.changed_ids)
+        return outcomes, loader.rate()
+
+    def update_similarity_index(self):
+        if not self.changed_ids:
+            return
+        updated = update_similarity_index(self.changed_ids)
+        if updated is None:
+            self.stdout.write(self.style.WARNING('No similarity index yet; run build_similarity_index to create one.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Added {updated} media to the similarity index'))
+
     def create_dummy_books(self, count):
         fake = Faker()
 
         genres = ['Fiction', 'Science Fiction', 'Fantasy', 'Mystery', 'Thriller', 
                   'Romance', 'Historical Fiction', 'Biography', 'Self-Help', 'Business']
 
-        for i in range(count):
-            year = fake.random_int(min=1900, max=2023)
-            Book.objects.create(
+        books = [
+            Book(
                 title=fake.catch_phrase(),
                 author=fake.name(),
-                publication_year=year,
+                publication_year=fake.random_int(min=1900, max=2023),
                 genre=fake.random_element(genres),
                 summary=fake.paragraph(nb_sentences=5),
-                media_type='book'
             )
+            for i in range(count)
+        ]
+        self.changed_ids.extend(book.pk for book in bulk_create_media(Book, books))
 
     def create_dummy_movies(self, count):
         fake = Faker()
@@ -135,13 +214,14 @@ class Command(BaseCommand):
         genres = ['Action', 'Comedy', 'Drama', 'Science Fiction', 'Horror', 
                   'Romance', 'Thriller', 'Animation', 'Documentary', 'Fantasy']
 
-        for i in range(count):
-            year = fake.random_int(min=1950, max=2023)
-            Movie.objects.create(
+        movies = [
+            Movie(
                 title=fake.catch_phrase(),
                 director=fake.name(),
-                release_year=year,
+                release_year=fake.random_int(min=1950, max=2023),
                 genre=fake.random_element(genres),
                 summary=fake.paragraph(nb_sentences=5),
-                media_type='movie'
-            ) 
+            )
+            for i in range(count)
+        ]
+        self.changed_ids.extend(movie.pk for movie in bulk_create_media(Movie, movies))
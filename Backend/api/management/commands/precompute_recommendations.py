@@ -0,0 +1,72 @@
+import os
+import time
+from concurrent.futures import as_completed
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import Favorite, Review
+from api.parallel import worker_pool
+from api.recommender import recommendations_for_users, store_recommendations
+
+
+def _compute(user_ids, limit):
+    return recommendations_for_users(user_ids, limit=limit)
+
+
+class Command(BaseCommand):
+    help = 'Precompute personalized recommendations for active users across a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes; 1 computes in this process')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users handed to a worker at a time')
+        parser.add_argument('--limit', type=int, default=10, help='Recommendations stored per user')
+        parser.add_argument('--active-days', type=int, default=0,
+                            help='Only users who reviewed or favorited something within this many days '
+                                 '(default: every user with a review)')
+
+    def active_users(self, active_days):
+        users = User.objects.filter(reviews__isnull=False)
+        if active_days:
+            # last_login isn't kept up to date for token logins, so activity is what counts
+            since = timezone.now() - timedelta(days=active_days)
+            users = users.filter(
+                Q(pk__in=Review.objects.filter(updated_at__gte=since).values('user'))
+                | Q(pk__in=Favorite.objects.filter(date_added__gte=since).values('user'))
+            )
+        return list(users.order_by('pk').values_list('pk', flat=True).distinct())
+
+    def handle(self, *args, **options):
+        user_ids = self.active_users(options['active_days'])
+        batch_size = options['batch_size']
+        batches = [user_ids[start:start + batch_size] for start in range(0, len(user_ids), batch_size)]
+        workers = max(1, min(options['workers'], len(batches)))
+        self.stdout.write(self.style.SUCCESS(
+            f'Precomputing recommendations for {len(user_ids)} users with {workers} worker(s)...'
+        ))
+
+        started = time.perf_counter()
+        done = 0
+        if workers == 1:
+            for batch in batches:
+                store_recommendations(_compute(batch, options['limit']))
+                done += len(batch)
+        else:
+            with worker_pool(workers) as pool:
+                futures = [pool.submit(_compute, batch, options['limit']) for batch in batches]
+                for future in as_completed(futures):
+                    results = future.result()
+                    store_recommendations(results)
+                    done += len(results)
+                    if len(batches) > 1:
+                        self.stdout.write(f'  {done}/{len(user_ids)} users')
+
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored recommendations for {done} users in {elapsed:.2f}s ({rate:.0f} users/s)'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rating_sum, review_count and avg_rating aggregates of every media row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per bulk update')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Rebuilding rating aggregates...'))
+        rebuilt = rebuild_rating_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {rebuilt} rated media'))
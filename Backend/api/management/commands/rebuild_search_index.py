@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over all books and movies'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilding search index with {type(backend).__name__}...'))
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
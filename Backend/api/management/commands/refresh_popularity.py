@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = 'Rescore the popularity leaderboard against the current catalog-wide mean rating'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per bulk insert')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Refreshing popularity leaderboard...'))
+        started = time.perf_counter()
+        scored = rebuild_popularity(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Scored {scored} media in {elapsed:.2f}s'))
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:10
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Media = apps.get_model('api', 'Media')
+    Review = apps.get_model('api', 'Review')
+    totals = Review.objects.order_by().values('media_id').annotate(total=Sum('rating'), count=Count('id'))
+    for row in totals.iterator():
+        Media.objects.filter(pk=row['media_id']).update(
+            rating_sum=row['total'],
+            review_count=row['count'],
+            avg_rating=row['total'] / row['count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='avg_rating',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_media_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'media_ptr'], name='api_book_author_ffe90d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['publication_year', 'media_ptr'], name='api_book_publica_708756_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['title', 'id'], name='api_media_title_6a7ef4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['release_year', 'media_ptr'], name='api_movie_release_4095ea_idx'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.utils
+
+
+MYSQL_FORWARD = [
+    "ALTER TABLE api_searchdocument ADD FULLTEXT INDEX api_searchdoc_title_ft (title)",
+    "ALTER TABLE api_searchdocument ADD FULLTEXT INDEX api_searchdoc_text_ft (title, body)",
+]
+
+MYSQL_BACKWARD = [
+    "ALTER TABLE api_searchdocument DROP INDEX api_searchdoc_text_ft",
+    "ALTER TABLE api_searchdocument DROP INDEX api_searchdoc_title_ft",
+]
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE api_searchdocument_fts USING fts5(
+        title, body, content='api_searchdocument', content_rowid='media_id'
+    )""",
+    """CREATE TRIGGER api_searchdocument_fts_ai AFTER INSERT ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.media_id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER api_searchdocument_fts_ad AFTER DELETE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.media_id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER api_searchdocument_fts_au AFTER UPDATE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.media_id, old.title, old.body);
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.media_id, new.title, new.body);
+    END""",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS api_searchdocument_fts_au",
+    "DROP TRIGGER IF EXISTS api_searchdocument_fts_ad",
+    "DROP TRIGGER IF EXISTS api_searchdocument_fts_ai",
+    "DROP TABLE IF EXISTS api_searchdocument_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_native_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        _run(schema_editor, MYSQL_FORWARD)
+    elif vendor == 'sqlite':
+        try:
+            _run(schema_editor, SQLITE_FORWARD)
+        except django.db.utils.OperationalError:
+            # SQLite built without FTS5; the in-process index takes over
+            pass
+
+
+def drop_native_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        _run(schema_editor, MYSQL_BACKWARD)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+
+
+def backfill_search_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('api', 'SearchDocument')
+    sources = [
+        ('book', apps.get_model('api', 'Book'), 'author'),
+        ('movie', apps.get_model('api', 'Movie'), 'director'),
+    ]
+    for media_type, model, person_field in sources:
+        batch = []
+        for row in model.objects.values_list('pk', 'title', person_field, 'genre', 'summary').iterator():
+            pk, title, person, genre, summary = row
+            batch.append(SearchDocument(
+                media_id=pk, media_type=media_type, title=title,
+                body='\n'.join([person, genre, summary]),
+            ))
+            if len(batch) >= 1000:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_catalog_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('media', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='api.media')),
+                ('media_type', models.CharField(choices=[('book', 'Book'), ('movie', 'Movie')], max_length=5)),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(create_native_index, drop_native_index),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
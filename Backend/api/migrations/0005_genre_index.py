@@ -0,0 +1,54 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:16
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def backfill_genres(apps, schema_editor):
+    Genre = apps.get_model('api', 'Genre')
+    Media = apps.get_model('api', 'Media')
+    Through = Media.genres.through
+
+    names = {}
+    links = []
+    for media_id, text in Media.objects.values_list('id', 'genre').iterator():
+        for part in (text or '').split(','):
+            name = ' '.join(part.split())[:100]
+            slug = slugify(name)[:100]
+            if slug:
+                names.setdefault(slug, name)
+                links.append((media_id, slug))
+
+    Genre.objects.bulk_create([Genre(name=name, slug=slug) for slug, name in names.items()], ignore_conflicts=True)
+    genre_ids = dict(Genre.objects.values_list('slug', 'id'))
+    Through.objects.bulk_create(
+        [Through(media_id=media_id, genre_id=genre_ids[slug]) for media_id, slug in set(links)],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='genres',
+            field=models.ManyToManyField(blank=True, related_name='media', to='api.genre'),
+        ),
+        migrations.RunPython(backfill_genres, migrations.RunPython.noop),
+    ]
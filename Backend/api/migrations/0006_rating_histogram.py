@@ -0,0 +1,38 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:18
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def backfill_histograms(apps, schema_editor):
+    RatingHistogram = apps.get_model('api', 'RatingHistogram')
+    Review = apps.get_model('api', 'Review')
+    histograms = {}
+    rows = Review.objects.order_by().values('media_id', 'rating').annotate(count=Count('id'))
+    for row in rows.iterator():
+        histogram = histograms.setdefault(row['media_id'], RatingHistogram(media_id=row['media_id']))
+        setattr(histogram, f"stars_{row['rating']}", row['count'])
+    RatingHistogram.objects.bulk_create(histograms.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_genre_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingHistogram',
+            fields=[
+                ('media', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_histogram', serialize=False, to='api.media')),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def backfill_popularity(apps, schema_editor):
+    Media = apps.get_model('api', 'Media')
+    PopularityScore = apps.get_model('api', 'PopularityScore')
+    totals = Media.objects.aggregate(total=Sum('rating_sum'), count=Sum('review_count'))
+    if not totals['count']:
+        return
+    prior_mean = totals['total'] / totals['count']
+    prior_weight = settings.RATING_PRIOR_WEIGHT
+
+    genre_ids = {}
+    for media_id, genre_id in Media.genres.through.objects.values_list('media_id', 'genre_id').iterator():
+        genre_ids.setdefault(media_id, []).append(genre_id)
+
+    batch = []
+    rows = Media.objects.filter(review_count__gt=0).values_list('pk', 'media_type', 'rating_sum', 'review_count')
+    for media_id, media_type, rating_sum, review_count in rows.iterator():
+        score = (prior_weight * prior_mean + rating_sum) / (prior_weight + review_count)
+        for genre_id in [None, *genre_ids.get(media_id, [])]:
+            batch.append(PopularityScore(media_id=media_id, media_type=media_type, genre_id=genre_id,
+                                         score=score, review_count=review_count))
+    PopularityScore.objects.bulk_create(batch, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_type', models.CharField(choices=[('book', 'Book'), ('movie', 'Movie')], max_length=5)),
+                ('score', models.FloatField()),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('genre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='popularity_scores', to='api.genre')),
+                ('media', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity_scores', to='api.media')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['media_type', 'genre', '-score', '-review_count', 'media'], name='api_popularity_rank')],
+                'unique_together': {('media', 'genre')},
+            },
+        ),
+        migrations.RunPython(backfill_popularity, migrations.RunPython.noop),
+    ]
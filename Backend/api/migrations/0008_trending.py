@@ -0,0 +1,67 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:27
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def backfill_buckets(apps, schema_editor):
+    TrendingBucket = apps.get_model('api', 'TrendingBucket')
+    since = timezone.now() - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    buckets = {}
+    sources = [
+        (apps.get_model('api', 'Review'), 'created_at', settings.TRENDING_EVENT_WEIGHTS['review']),
+        (apps.get_model('api', 'Favorite'), 'date_added', settings.TRENDING_EVENT_WEIGHTS['favorite']),
+    ]
+    for model, field, weight in sources:
+        rows = (model.objects.filter(**{f'{field}__gte': since})
+                .annotate(day=TruncDate(field)).order_by()
+                .values('media_id', 'day').annotate(count=Count('id')))
+        for row in rows.iterator():
+            key = (row['media_id'], row['day'])
+            buckets[key] = buckets.get(key, 0) + row['count'] * weight
+    TrendingBucket.objects.bulk_create(
+        [TrendingBucket(media_id=media_id, day=day, events=events) for (media_id, day), events in buckets.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_popularity_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('media', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending_score', serialize=False, to='api.media')),
+                ('media_type', models.CharField(choices=[('book', 'Book'), ('movie', 'Movie')], max_length=5)),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['media_type', '-score', 'media'], name='api_trending_rank')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('media', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_buckets', to='api.media')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='api_trendin_day_8872c3_idx')],
+                'unique_together': {('media', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_buckets, migrations.RunPython.noop),
+    ]
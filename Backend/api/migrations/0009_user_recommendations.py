@@ -0,0 +1,25 @@
+# Generated by Django 4.2.10 on 2026-10-18 16:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('api', '0008_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('media_ids', models.TextField(blank=True)),
+                ('source', models.CharField(max_length=20)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
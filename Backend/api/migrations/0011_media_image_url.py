@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_catalog_external_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='image_url',
+            field=models.URLField(blank=True, default='', max_length=500),
+        ),
+    ]
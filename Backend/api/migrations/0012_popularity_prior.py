@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_media_image_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:45
+
+from django.db import migrations, models
+from django.db.models import Min
+import django.db.models.functions.comparison
+
+
+def drop_duplicate_overall_rows(apps, schema_editor):
+    PopularityScore = apps.get_model('api', 'PopularityScore')
+    overall = PopularityScore.objects.filter(genre__isnull=True)
+    keep = overall.values('media').annotate(first=Min('id')).values('first')
+    overall.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_popularity_prior'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_overall_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='popularityscore',
+            constraint=models.UniqueConstraint(models.F('media'), django.db.models.functions.comparison.Coalesce('genre', models.Value(0)), name='api_popularity_unique'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='popularityscore',
+            unique_together=set(),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_popularity_unique_overall'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['updated_at'], name='api_media_updated_033120_idx'),
+        ),
+    ]
@@ -1,23 +1,58 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+class Genre(models.Model):
+    """Normalized genre shared by books and movies"""
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=100, unique=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
 class Media(models.Model):
     """Base model for Books and Movies"""
     MEDIA_TYPES = (
         ('book', 'Book'),
         ('movie', 'Movie'),
     )
+    AGGREGATE_FIELDS = ('rating_sum', 'review_count', 'avg_rating')
     
     title = models.CharField(max_length=255)
+    # "<source>:<id>" of the catalog record this row was loaded from, e.g. "tmdb:603"
+    external_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
     genre = models.CharField(max_length=100)
+    genres = models.ManyToManyField(Genre, related_name='media', blank=True)
     summary = models.TextField()
+    # Cover or poster at the source; clients get it through the image proxy, never directly
+    image_url = models.URLField(max_length=500, blank=True, default='')
     media_type = models.CharField(max_length=5, choices=MEDIA_TYPES)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    avg_rating = models.FloatField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name_plural = "Media"
+        indexes = [
+            models.Index(fields=['title', 'id']),
+            # Catch-up of the per-process autocomplete indexes
+            models.Index(fields=['updated_at']),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # The rating aggregates are owned by review writes; a stale instance must not overwrite them
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.AGGREGATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.title} ({self.media_type})"
@@ -27,6 +62,12 @@ class Book(Media):
     author = models.CharField(max_length=255)
     publication_year = models.PositiveIntegerField()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', 'media_ptr']),
+            models.Index(fields=['publication_year', 'media_ptr']),
+        ]
+    
     def save(self, *args, **kwargs):
         self.media_type = 'book'
         super().save(*args, **kwargs)
@@ -39,6 +80,11 @@ class Movie(Media):
     director = models.CharField(max_length=255)
     release_year = models.PositiveIntegerField()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['release_year', 'media_ptr']),
+        ]
+    
     def save(self, *args, **kwargs):
         self.media_type = 'movie'
         super().save(*args, **kwargs)
@@ -46,6 +92,16 @@ class Movie(Media):
     def __str__(self):
         return f"{self.title} ({self.release_year})"
 
+class SearchDocument(models.Model):
+    """Flattened, full-text indexed copy of a Book or Movie"""
+    media = models.OneToOneField(Media, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    media_type = models.CharField(max_length=5, choices=Media.MEDIA_TYPES)
+    title = models.CharField(max_length=255)
+    body = models.TextField()
+    
+    def __str__(self):
+        return f"Search document for {self.title}"
+
 class Review(models.Model):
     """Review model for both books and movies"""
     RATING_CHOICES = [(i, i) for i in range(1, 6)]  # 1-5 star rating
@@ -61,9 +117,113 @@ class Review(models.Model):
         unique_together = ('user', 'media')
         ordering = ['-created_at']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the rating aggregates currently account for
+        instance._loaded_rating = instance.__dict__.get('rating')
+        instance._loaded_media_id = instance.__dict__.get('media_id')
+        return instance
+    
     def __str__(self):
         return f"{self.user.username}'s review of {self.media.title}"
 
+class RatingHistogram(models.Model):
+    """Per-media star counts, maintained incrementally on review writes"""
+    media = models.OneToOneField(Media, on_delete=models.CASCADE, primary_key=True, related_name='rating_histogram')
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    
+    def counts(self):
+        return [getattr(self, f'stars_{rating}') for rating in range(1, 6)]
+    
+    def __str__(self):
+        return f"Rating histogram for media {self.media_id}"
+
+class PopularityScore(models.Model):
+    """Bayesian-average leaderboard entry of a media, overall (no genre) and per genre"""
+    media = models.ForeignKey(Media, on_delete=models.CASCADE, related_name='popularity_scores')
+    media_type = models.CharField(max_length=5, choices=Media.MEDIA_TYPES)
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, null=True, blank=True, related_name='popularity_scores')
+    score = models.FloatField()
+    review_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            # Not unique_together: NULLs never compare equal, so overall (no genre) rows would go unguarded.
+            # 0 is no genre id; MySQL has no partial indexes but does have functional ones
+            models.UniqueConstraint(models.F('media'), Coalesce('genre', models.Value(0)),
+                                    name='api_popularity_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['media_type', 'genre', '-score', '-review_count', 'media'], name='api_popularity_rank'),
+        ]
+    
+    def __str__(self):
+        return f"Popularity of media {self.media_id}: {self.score:.3f}"
+
+class PopularityPrior(models.Model):
+    """Catalog-wide mean rating the current PopularityScore rows were scored against (a single row)"""
+    mean = models.FloatField(null=True, blank=True)
+    computed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Popularity prior {self.mean} from {self.computed_at}"
+
+class TrendingBucket(models.Model):
+    """Weighted review and favorite events of a media on one day"""
+    media = models.ForeignKey(Media, on_delete=models.CASCADE, related_name='trending_buckets')
+    day = models.DateField()
+    events = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('media', 'day')
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.events} events for media {self.media_id} on {self.day}"
+
+class TrendingScore(models.Model):
+    """Time-decayed trending score of a media, rewritten by each compaction"""
+    media = models.OneToOneField(Media, on_delete=models.CASCADE, primary_key=True, related_name='trending_score')
+    media_type = models.CharField(max_length=5, choices=Media.MEDIA_TYPES)
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['media_type', '-score', 'media'], name='api_trending_rank'),
+        ]
+    
+    def __str__(self):
+        return f"Trending score of media {self.media_id}: {self.score:.3f}"
+
+class UserRecommendation(models.Model):
+    """Precomputed personalized recommendations of one user"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='recommendation')
+    media_ids = models.TextField(blank=True)  # comma-joined, best first
+    source = models.CharField(max_length=20)
+    computed_at = models.DateTimeField()
+    
+    def ids(self):
+        return [int(media_id) for media_id in self.media_ids.split(',') if media_id]
+    
+    def __str__(self):
+        return f"Recommendations for {self.user_id}"
+
+class CatalogSync(models.Model):
+    """Watermark of the last completed incremental sync from an external catalog"""
+    source = models.CharField(max_length=20, unique=True)
+    synced_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.source} synced at {self.synced_at}"
+
 class Favorite(models.Model):
     """User favorites/wishlist model"""
     LIST_TYPES = (
@@ -0,0 +1,181 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset pagination over (ordering field, pk).
+
+    A request only gets paginated when it carries a ``cursor`` or
+    ``page_size`` query parameter, so clients that expect the whole
+    catalog as a plain list keep working. Pages are fetched with a
+    ``WHERE (field, pk) > (last field, last pk)`` seek instead of an OFFSET,
+    which keeps the cost of a page constant however deep the client goes.
+
+    Search results (querysets annotated with ``search_rank`` by
+    FullTextSearchFilter) are paged in relevance order unless an explicit
+    ordering is requested.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = api_settings.ORDERING_PARAM
+    page_size = 20
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, view, queryset)
+
+        cursor = self.decode_cursor(request, queryset)
+        reverse = bool(cursor and cursor['r'])
+
+        queryset = queryset.order_by(*self.order_by(reverse))
+        if self.field != 'pk':
+            # Annotated so the cursor value is loaded even under a sparse fieldset
+            queryset = queryset.annotate(keyset_value=F(self.field))
+        if cursor:
+            queryset = queryset.filter(self.seek_filter(cursor['v'], cursor['p'], reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        if reverse:
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request, view, queryset=None):
+        """Return the (field, descending) pair to seek on, honouring OrderingFilter"""
+        allowed = getattr(view, 'ordering_fields', None) or []
+        param = request.query_params.get(self.ordering_query_param, '')
+        for term in param.split(','):
+            term = term.strip()
+            name = term.lstrip('-')
+            if name in allowed and name != '__all__':
+                return name, term.startswith('-')
+        if queryset is not None and 'search_rank' in queryset.query.annotations:
+            return 'search_rank', False
+        return 'pk', False
+
+    def order_by(self, reverse):
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        if self.field == 'pk':
+            return [f'{prefix}pk']
+        return [f'{prefix}{self.field}', f'{prefix}pk']
+
+    def seek_filter(self, value, pk, reverse):
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        if self.field == 'pk':
+            return Q(**{f'pk__{lookup}': pk})
+        return Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'pk__{lookup}': pk})
+
+    def encode_cursor(self, obj, reverse):
+        payload = {
+            'o': self.ordering_key(),
+            'v': obj.keyset_value if self.field != 'pk' else None,
+            'p': obj.pk,
+            'r': 1 if reverse else 0,
+        }
+        token = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, queryset):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(token.encode()))
+            cursor = {'o': payload['o'], 'v': payload['v'], 'p': payload['p'], 'r': payload['r']}
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor['o'] != self.ordering_key():
+            # The cursor was minted for a different sort order
+            raise NotFound(self.invalid_cursor_message)
+        # A tampered cursor must fail here, not as a 500 from the seek filter
+        if type(cursor['p']) is not int or type(cursor['r']) is not int or cursor['r'] not in (0, 1):
+            raise NotFound(self.invalid_cursor_message)
+        cursor['v'] = self.cursor_value(queryset, cursor['v'])
+        return cursor
+
+    def cursor_value(self, queryset, value):
+        if self.field == 'pk':
+            return None
+        if self.field == 'search_rank':
+            if type(value) is not int:
+                raise NotFound(self.invalid_cursor_message)
+            return value
+        try:
+            value = queryset.model._meta.get_field(self.field).to_python(value)
+        except (ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value
+
+    def ordering_key(self):
+        return f"{'-' if self.descending else ''}{self.field}"
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,25 @@
+"""
+Process pools for management commands that fan work out across CPUs.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections
+
+
+def _init_worker():
+    # Needed under the spawn start method; a forked worker inherits the set-up apps
+    import django
+    django.setup()
+
+
+def worker_pool(workers):
+    """
+    Return a ProcessPoolExecutor of ``workers`` processes, forked where the
+    platform can. This process's database connections are closed first, so
+    workers open their own instead of sharing its sockets.
+    """
+    connections.close_all()
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
@@ -0,0 +1,105 @@
+"""
+Materialized popularity leaderboard.
+
+Every reviewed media has one PopularityScore row per genre plus one with no
+genre, holding its Bayesian-average rating. Top-N reads for a type (and
+optionally a genre) are then a single seek on ``api_popularity_rank``.
+
+Review writes rescore the affected media in place. The catalog-wide prior
+mean is held fixed between full refreshes (``manage.py refresh_popularity``)
+so that one review never has to rescore every row. Each refresh stores its
+prior in the PopularityPrior row alongside the scores, so every process
+rescores against the prior the rest of the leaderboard was built with.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Book, Media, Movie, PopularityPrior, PopularityScore
+from .ratings import bayesian_average, global_mean_rating
+
+MODELS = {
+    'book': Book,
+    'movie': Movie,
+}
+
+
+def prior_mean():
+    """The prior of the last refresh; before the first one, the current mean becomes it"""
+    prior, _ = PopularityPrior.objects.get_or_create(pk=1, defaults={'mean': global_mean_rating})
+    return prior.mean
+
+
+def _entries(media_id, media_type, genre_ids, score, review_count):
+    return [
+        PopularityScore(media_id=media_id, media_type=media_type, genre_id=genre_id,
+                        score=score, review_count=review_count)
+        for genre_id in [None, *genre_ids]
+    ]
+
+
+def refresh_media(media_id, create=True):
+    """
+    Rescore one media from its rating aggregates. Rows are only created when
+    ``create`` is set, so review deletions cascading from a media delete
+    never resurrect rows for it.
+    """
+    row = Media.objects.filter(pk=media_id).values('media_type', 'rating_sum', 'review_count').first()
+    if row is None or not row['review_count']:
+        PopularityScore.objects.filter(media_id=media_id).delete()
+        return
+
+    score = bayesian_average(row['rating_sum'], row['review_count'], prior_mean())
+    updated = PopularityScore.objects.filter(media_id=media_id).update(score=score, review_count=row['review_count'])
+    if not updated and create:
+        genre_ids = Media.genres.through.objects.filter(media_id=media_id).values_list('genre_id', flat=True)
+        PopularityScore.objects.bulk_create(
+            _entries(media_id, row['media_type'], genre_ids, score, row['review_count']),
+            ignore_conflicts=True,
+        )
+
+
+def resync_media(media):
+    """Recreate the rows of a saved media, whose genres may have changed"""
+    with transaction.atomic():
+        PopularityScore.objects.filter(media_id=media.pk).delete()
+        refresh_media(media.pk)
+
+
+def rebuild_popularity(batch_size=1000):
+    """Rescore every media against a freshly computed prior; returns the number of media scored"""
+    prior = global_mean_rating()
+
+    genre_ids = {}
+    links = Media.genres.through.objects.filter(media__review_count__gt=0).values_list('media_id', 'genre_id')
+    for media_id, genre_id in links.iterator(chunk_size=5000):
+        genre_ids.setdefault(media_id, []).append(genre_id)
+
+    scored = 0
+    rows = Media.objects.filter(review_count__gt=0).values_list('pk', 'media_type', 'rating_sum', 'review_count')
+    with transaction.atomic():
+        PopularityPrior.objects.update_or_create(pk=1, defaults={'mean': prior, 'computed_at': timezone.now()})
+        PopularityScore.objects.all().delete()
+        batch = []
+        for media_id, media_type, rating_sum, review_count in rows.iterator(chunk_size=5000):
+            score = bayesian_average(rating_sum, review_count, prior)
+            batch.extend(_entries(media_id, media_type, genre_ids.get(media_id, []), score, review_count))
+            scored += 1
+            if len(batch) >= batch_size:
+                PopularityScore.objects.bulk_create(batch)
+                batch = []
+        PopularityScore.objects.bulk_create(batch)
+    return scored
+
+
+def top_media(media_type, genre_id=None, limit=10):
+    """Return the ``limit`` highest scored books or movies, optionally within one genre"""
+    lookups = {'popularity_scores__media_type': media_type}
+    if genre_id is None:
+        lookups['popularity_scores__genre__isnull'] = True
+    else:
+        lookups['popularity_scores__genre_id'] = genre_id
+    return (MODELS[media_type].objects
+            .filter(**lookups)
+            .annotate(popularity=F('popularity_scores__score'))
+            .order_by('-popularity', '-popularity_scores__review_count', 'pk')[:limit])
@@ -0,0 +1,156 @@
+"""
+Maintenance of the denormalized rating aggregates stored on Media and of
+the per-media RatingHistogram rows.
+
+Every review write is turned into an (old rating, new rating) change that is
+applied with F() expressions, so concurrent writers never read-modify-write
+the aggregates in Python.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from . import cache
+from .models import Media, RatingHistogram, Review
+
+
+def _avg_expression():
+    return Case(
+        When(review_count__gt=0, then=Cast(F('rating_sum'), FloatField()) / F('review_count')),
+        default=None,
+        output_field=FloatField(),
+    )
+
+
+def apply_review_change(media_id, old_rating=None, new_rating=None):
+    """Move one review's contribution from ``old_rating`` to ``new_rating`` (None meaning absent)"""
+    if old_rating == new_rating:
+        return
+    rating_delta = (new_rating or 0) - (old_rating or 0)
+    count_delta = (new_rating is not None) - (old_rating is not None)
+
+    with transaction.atomic():
+        # Two statements on purpose: MySQL evaluates SET clauses left to right
+        # against the already updated row while other backends use the old one.
+        Media.objects.filter(pk=media_id).update(
+            rating_sum=F('rating_sum') + rating_delta,
+            review_count=F('review_count') + count_delta,
+        )
+        # Bumping updated_at keeps catalog ETags in step with the rendered average
+        Media.objects.filter(pk=media_id).update(avg_rating=_avg_expression(), updated_at=timezone.now())
+
+        changes = {}
+        if old_rating is not None:
+            changes[f'stars_{old_rating}'] = F(f'stars_{old_rating}') - 1
+        if new_rating is not None:
+            changes[f'stars_{new_rating}'] = F(f'stars_{new_rating}') + 1
+        updated = RatingHistogram.objects.filter(media_id=media_id).update(**changes)
+        if not updated and new_rating is not None:
+            # First review of this media; deletions never create a row
+            RatingHistogram.objects.get_or_create(media_id=media_id)
+            RatingHistogram.objects.filter(media_id=media_id).update(
+                **{f'stars_{new_rating}': F(f'stars_{new_rating}') + 1}
+            )
+
+
+def _loaded(review, name, current):
+    value = getattr(review, f'_loaded_{name}', None)
+    return current if value is None else value
+
+
+def review_saved(review, created):
+    """Fold a created or updated review into the aggregates"""
+    if created:
+        apply_review_change(review.media_id, new_rating=review.rating)
+        return
+
+    old_media_id = _loaded(review, 'media_id', review.media_id)
+    old_rating = _loaded(review, 'rating', review.rating)
+    if old_media_id != review.media_id:
+        apply_review_change(old_media_id, old_rating=old_rating)
+        apply_review_change(review.media_id, new_rating=review.rating)
+    else:
+        apply_review_change(review.media_id, old_rating=old_rating, new_rating=review.rating)
+
+
+def review_deleted(review):
+    """Remove a deleted review from the aggregates"""
+    apply_review_change(
+        _loaded(review, 'media_id', review.media_id),
+        old_rating=_loaded(review, 'rating', review.rating),
+    )
+
+
+def rebuild_rating_aggregates(batch_size=1000):
+    """Recompute the aggregates and histograms of every media row from the review table"""
+    totals = Review.objects.order_by().values('media_id').annotate(total=Sum('rating'), count=Count('id'))
+
+    rebuilt = 0
+    # Bumping updated_at keeps catalog ETags in step with the rewritten averages
+    now = timezone.now()
+    fields = ['rating_sum', 'review_count', 'avg_rating', 'updated_at']
+    with transaction.atomic():
+        Media.objects.exclude(review_count=0, rating_sum=0).update(
+            rating_sum=0, review_count=0, avg_rating=None, updated_at=now,
+        )
+        batch = []
+        for row in totals.iterator():
+            batch.append(Media(
+                pk=row['media_id'],
+                rating_sum=row['total'],
+                review_count=row['count'],
+                avg_rating=row['total'] / row['count'],
+                updated_at=now,
+            ))
+            if len(batch) >= batch_size:
+                Media.objects.bulk_update(batch, fields)
+                rebuilt += len(batch)
+                batch = []
+        if batch:
+            Media.objects.bulk_update(batch, fields)
+            rebuilt += len(batch)
+
+        RatingHistogram.objects.all().delete()
+        histograms = {}
+        rows = Review.objects.order_by().values('media_id', 'rating').annotate(count=Count('id'))
+        for row in rows.iterator():
+            histogram = histograms.setdefault(row['media_id'], RatingHistogram(media_id=row['media_id']))
+            setattr(histogram, f"stars_{row['rating']}", row['count'])
+        RatingHistogram.objects.bulk_create(histograms.values(), batch_size=batch_size)
+        # Everything a review write invalidates, plus the global mean review writes leave to its TTL
+        cache.invalidate_for('review')
+        cache.invalidate(cache.GLOBAL_RATING)
+
+    return rebuilt
+
+
+def global_mean_rating():
+    """Mean rating across every review, read from the per-media aggregates"""
+    totals = Media.objects.aggregate(total=Sum('rating_sum'), count=Sum('review_count'))
+    if not totals['count']:
+        return None
+    return totals['total'] / totals['count']
+
+
+def bayesian_average(rating_sum, review_count, prior_mean, prior_weight=None):
+    """Shrink a media's mean toward the catalog mean until it has enough reviews"""
+    if prior_weight is None:
+        prior_weight = settings.RATING_PRIOR_WEIGHT
+    if prior_mean is None:
+        return rating_sum / review_count if review_count else None
+    return (prior_weight * prior_mean + rating_sum) / (prior_weight + review_count)
+
+
+def histogram_stats(histogram, prior_mean):
+    """Summarize a RatingHistogram (or None, for a media without reviews)"""
+    counts = histogram.counts() if histogram else [0] * 5
+    count = sum(counts)
+    total = sum(rating * n for rating, n in zip(range(1, 6), counts))
+    return {
+        'histogram': {str(rating): n for rating, n in zip(range(1, 6), counts)},
+        'count': count,
+        'mean': total / count if count else None,
+        'bayesian_mean': bayesian_average(total, count, prior_mean),
+    }
@@ -0,0 +1,184 @@
+"""
+Item-item collaborative filtering over the review table.
+
+``build_item_similarities`` turns a sparse user x media rating matrix into
+the top-k most similar media of every media (adjusted cosine), which is
+saved as a compact artifact of three arrays:
+
+* ``media_ids``: sorted media ids, one per matrix column
+* ``neighbors``: int32 [items, k] column indices of the neighbours, -1 padded
+* ``scores``: float32 [items, k] similarities matching ``neighbors``
+
+Serving a user then only touches the neighbour rows of what they rated.
+Users with no usable neighbours fall back to a genre match. Both can be
+precomputed for every active user into UserRecommendation rows
+(``manage.py precompute_recommendations``).
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .artifacts import load_artifact, save_artifact
+from .models import Media, Review, UserRecommendation
+
+ARTIFACT_NAME = 'item_similarity'
+
+SOURCE_ITEM_ITEM = 'item-item'
+SOURCE_GENRE = 'genre'
+
+
+def rating_matrix(user_ids, media_ids, ratings):
+    """Build a CSR user x item matrix from parallel arrays, returning it with the item id index"""
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    media_ids = np.asarray(media_ids, dtype=np.int64)
+    ratings = np.asarray(ratings, dtype=np.float32)
+
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    items, item_index = np.unique(media_ids, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (ratings, (user_index, item_index)), shape=(len(users), len(items)), dtype=np.float32,
+    )
+    return matrix, items
+
+
+def build_item_similarities(matrix, k=50, batch_size=2048, min_similarity=0.0):
+    """Return (neighbors, scores) holding the top-k adjusted-cosine neighbours of every item"""
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    n_items = matrix.shape[1]
+
+    # Adjusted cosine: remove each user's mean so generous raters don't dominate
+    counts = np.diff(matrix.indptr)
+    means = np.divide(np.asarray(matrix.sum(axis=1)).ravel(), counts,
+                      out=np.zeros(matrix.shape[0], dtype=np.float32), where=counts > 0)
+    centered = matrix.copy()
+    centered.data -= np.repeat(means, counts).astype(np.float32)
+
+    columns = centered.tocsc()
+    norms = np.sqrt(np.asarray(columns.multiply(columns).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = sparse.csc_matrix(columns @ sparse.diags(1.0 / norms).astype(np.float32))
+    transposed = normalized.T.tocsr()
+
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, k), dtype=np.float32)
+    for start in range(0, n_items, batch_size):
+        stop = min(start + batch_size, n_items)
+        block = (transposed[start:stop] @ normalized).tocsr()
+        for offset in range(stop - start):
+            row_start, row_end = block.indptr[offset], block.indptr[offset + 1]
+            candidates = block.indices[row_start:row_end]
+            values = block.data[row_start:row_end]
+            keep = (values > min_similarity) & (candidates != start + offset)
+            candidates, values = candidates[keep], values[keep]
+            if len(values) > k:
+                top = np.argpartition(-values, k - 1)[:k]
+                candidates, values = candidates[top], values[top]
+            order = np.argsort(-values, kind='stable')
+            neighbors[start + offset, :len(order)] = candidates[order]
+            scores[start + offset, :len(order)] = values[order]
+    return neighbors, scores
+
+
+def build_from_reviews(k=50):
+    """Build and save the similarity artifact from every review; returns (items, reviews)"""
+    rows = np.array(list(Review.objects.order_by().values_list('user_id', 'media_id', 'rating').iterator()),
+                    dtype=np.int64).reshape(-1, 3)
+    matrix, media_ids = rating_matrix(rows[:, 0], rows[:, 1], rows[:, 2])
+    neighbors, scores = build_item_similarities(matrix, k=k)
+    save_artifact(ARTIFACT_NAME, media_ids=media_ids, neighbors=neighbors, scores=scores)
+    return len(media_ids), len(rows)
+
+
+def score_candidates(artifact, rated_ids, ratings, limit=10):
+    """Rank unseen media for someone who gave ``ratings`` to ``rated_ids``"""
+    media_ids = artifact['media_ids']
+    rated_ids = np.asarray(rated_ids, dtype=np.int64)
+    ratings = np.asarray(ratings, dtype=np.float32)
+
+    positions = np.searchsorted(media_ids, rated_ids)
+    positions = np.clip(positions, 0, len(media_ids) - 1)
+    known = media_ids[positions] == rated_ids
+    if not known.any():
+        return []
+    positions, ratings = positions[known], ratings[known]
+
+    weights = ratings - ratings.mean()
+    if not weights.any():
+        weights = ratings / 5.0
+
+    candidates = artifact['neighbors'][positions].ravel()
+    contributions = (artifact['scores'][positions] * weights[:, None]).ravel()
+    valid = candidates >= 0
+    candidates, contributions = candidates[valid], contributions[valid]
+    if not len(candidates):
+        return []
+
+    unique, inverse = np.unique(candidates, return_inverse=True)
+    totals = np.bincount(inverse, weights=contributions)
+    unseen = ~np.isin(unique, positions)
+    unique, totals = unique[unseen], totals[unseen]
+    positive = totals > 0
+    unique, totals = unique[positive], totals[positive]
+    if len(totals) > limit:
+        top = np.argpartition(-totals, limit - 1)[:limit]
+        unique, totals = unique[top], totals[top]
+    order = np.argsort(-totals, kind='stable')
+    return [int(media_id) for media_id in media_ids[unique[order]]]
+
+
+def genre_recommendations(user_id, limit=10):
+    """Unreviewed media sharing a genre with something the user reviewed"""
+    user_genres = Media.objects.filter(reviews__user_id=user_id).values_list('genre', flat=True).distinct()
+    return list(Media.objects.filter(genre__in=user_genres)
+                .exclude(reviews__user_id=user_id)
+                .values_list('id', flat=True)[:limit])
+
+
+def recommendations_for(user_id, rated, artifact, limit=10):
+    """Return (ranked media ids, source) for a user who gave the (media id, rating) pairs in ``rated``"""
+    if not rated:
+        return [], SOURCE_GENRE
+    if artifact is not None:
+        rated_ids, ratings = zip(*rated)
+        ranked = score_candidates(artifact, rated_ids, ratings, limit=limit)
+        if ranked:
+            return ranked, SOURCE_ITEM_ITEM
+    return genre_recommendations(user_id, limit), SOURCE_GENRE
+
+
+def live_recommendations(user, limit=10):
+    """Compute ``user``'s recommendations on the request path"""
+    rated = list(Review.objects.filter(user=user).values_list('media_id', 'rating'))
+    return recommendations_for(user.pk, rated, load_artifact(ARTIFACT_NAME), limit=limit)[0]
+
+
+def recommendations_for_users(user_ids, limit=10):
+    """Return [(user id, media ids, source)] for a batch of users, loading their reviews in one query"""
+    artifact = load_artifact(ARTIFACT_NAME)
+    rated = defaultdict(list)
+    rows = Review.objects.filter(user_id__in=user_ids).order_by().values_list('user_id', 'media_id', 'rating')
+    for user_id, media_id, rating in rows.iterator():
+        rated[user_id].append((media_id, rating))
+    return [(user_id, *recommendations_for(user_id, rated.get(user_id), artifact, limit=limit))
+            for user_id in user_ids]
+
+
+def store_recommendations(results):
+    """Replace the stored recommendations of every user in ``results``"""
+    now = timezone.now()
+    rows = [
+        UserRecommendation(user_id=user_id, media_ids=','.join(map(str, media_ids)), source=source, computed_at=now)
+        for user_id, media_ids, source in results
+    ]
+    with transaction.atomic():
+        UserRecommendation.objects.filter(user_id__in=[row.user_id for row in rows]).delete()
+        UserRecommendation.objects.bulk_create(rows)
+
+
+def stored_recommendations(user):
+    """Return the precomputed media ids of ``user``, or None when the precompute job hasn't covered them"""
+    row = UserRecommendation.objects.filter(user=user).first()
+    return None if row is None else row.ids()
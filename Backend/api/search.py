@@ -0,0 +1,316 @@
+"""
+Pluggable full-text search over the book and movie catalog.
+
+Every Book and Movie is flattened into a SearchDocument row (title plus
+author/director, genre and summary). Where the database has a native
+full-text index over that table it is used directly:
+
+* MySQL: FULLTEXT indexes queried with MATCH ... AGAINST in boolean mode
+* SQLite: an external-content FTS5 table ranked with bm25()
+
+Any other database falls back to an in-process inverted index with BM25
+ranking that is built lazily from the catalog and kept current by signals.
+"""
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from .models import Book, Movie, SearchDocument
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+PERSON_FIELDS = {
+    'book': 'author',
+    'movie': 'director',
+}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def document_for(media):
+    """Return the searchable fields of a Book or Movie instance"""
+    person = getattr(media, PERSON_FIELDS[media.media_type], '')
+    return {
+        'media_type': media.media_type,
+        'title': media.title,
+        'body': '\n'.join([person or '', media.genre or '', media.summary or '']),
+    }
+
+
+def iter_catalog(batch_size=2000):
+    """Yield every Book and Movie with only the searchable columns loaded"""
+    for model, person_field in ((Book, 'author'), (Movie, 'director')):
+        queryset = model.objects.only('title', 'media_type', 'genre', 'summary', person_field)
+        yield from queryset.iterator(chunk_size=batch_size)
+
+
+class SearchBackend:
+    """Interface shared by all search backends"""
+
+    def index(self, media):
+        raise NotImplementedError
+
+    def index_many(self, media_list):
+        """Index media that were just created without a save() per row"""
+        for media in media_list:
+            self.index(media)
+
+    def remove(self, media_id):
+        raise NotImplementedError
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def search(self, query, media_type=None, limit=None):
+        """Return media ids matching ``query``, best match first"""
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """Base for backends that rank SearchDocument rows inside the database"""
+
+    def index(self, media):
+        SearchDocument.objects.update_or_create(media_id=media.pk, defaults=document_for(media))
+
+    def index_many(self, media_list, batch_size=1000):
+        SearchDocument.objects.bulk_create(
+            [SearchDocument(media_id=media.pk, **document_for(media)) for media in media_list],
+            batch_size=batch_size,
+        )
+
+    def remove(self, media_id):
+        SearchDocument.objects.filter(media_id=media_id).delete()
+
+    def rebuild(self, batch_size=1000):
+        with transaction.atomic():
+            SearchDocument.objects.all().delete()
+            batch = []
+            for media in iter_catalog():
+                batch.append(SearchDocument(media_id=media.pk, **document_for(media)))
+                if len(batch) >= batch_size:
+                    SearchDocument.objects.bulk_create(batch)
+                    batch = []
+            SearchDocument.objects.bulk_create(batch)
+
+    def search(self, query, media_type=None, limit=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        sql, params = self.build_query(tokens, media_type, limit or settings.SEARCH_RESULT_LIMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def build_query(self, tokens, media_type, limit):
+        raise NotImplementedError
+
+
+class MySQLFullTextBackend(DatabaseSearchBackend):
+    """MATCH ... AGAINST over FULLTEXT indexes, with title hits weighted up"""
+    title_weight = 2.0
+
+    def build_query(self, tokens, media_type, limit):
+        # Every term is required and the last one is a prefix, for search-as-you-type
+        terms = [f'+{token}' for token in tokens]
+        terms[-1] += '*'
+        expression = ' '.join(terms)
+
+        sql = (
+            "SELECT media_id FROM api_searchdocument "
+            "WHERE MATCH(title, body) AGAINST (%s IN BOOLEAN MODE)"
+        )
+        params = [expression]
+        if media_type:
+            sql += " AND media_type = %s"
+            params.append(media_type)
+        sql += (
+            " ORDER BY MATCH(title) AGAINST (%s IN BOOLEAN MODE) * %s"
+            " + MATCH(title, body) AGAINST (%s IN BOOLEAN MODE) DESC, media_id"
+            " LIMIT %s"
+        )
+        params += [expression, self.title_weight, expression, limit]
+        return sql, params
+
+
+class SQLiteFTS5Backend(DatabaseSearchBackend):
+    """External-content FTS5 table kept in sync by triggers, ranked by bm25()"""
+    title_weight = 10.0
+
+    def build_query(self, tokens, media_type, limit):
+        expression = ' '.join(f'"{token}"' for token in tokens) + '*'
+        sql = (
+            "SELECT d.media_id FROM api_searchdocument_fts f "
+            "JOIN api_searchdocument d ON d.media_id = f.rowid "
+            "WHERE api_searchdocument_fts MATCH %s"
+        )
+        params = [expression]
+        if media_type:
+            sql += " AND d.media_type = %s"
+            params.append(media_type)
+        sql += " ORDER BY bm25(api_searchdocument_fts, %s, 1.0), d.media_id LIMIT %s"
+        params += [self.title_weight, limit]
+        return sql, params
+
+    def rebuild(self, batch_size=1000):
+        super().rebuild(batch_size=batch_size)
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO api_searchdocument_fts(api_searchdocument_fts) VALUES ('rebuild')")
+
+
+class InMemorySearchBackend(SearchBackend):
+    """
+    Process-local inverted index with BM25 ranking.
+
+    The index is built from the database on the first search and then
+    patched by the Book/Movie signals, so each worker holds its own copy.
+    """
+    k1 = 1.2
+    b = 0.75
+    title_weight = 3
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._built = False
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}
+        self._vocabulary = []
+        self._lengths = {}
+        self._types = {}
+        self._total_length = 0
+
+    def _terms(self, document):
+        counts = Counter(tokenize(document['body']))
+        for token in tokenize(document['title']):
+            counts[token] += self.title_weight
+        return counts
+
+    def _add(self, media_id, document):
+        counts = self._terms(document)
+        for token, count in counts.items():
+            postings = self._postings[token]
+            if not postings and self._built:
+                self._vocabulary.insert(bisect_left(self._vocabulary, token), token)
+            postings[media_id] = count
+        length = sum(counts.values())
+        self._doc_terms[media_id] = tuple(counts)
+        self._lengths[media_id] = length
+        self._types[media_id] = document['media_type']
+        self._total_length += length
+
+    def _discard(self, media_id):
+        if media_id not in self._lengths:
+            return
+        for token in self._doc_terms.pop(media_id):
+            postings = self._postings[token]
+            del postings[media_id]
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+        self._total_length -= self._lengths.pop(media_id)
+        del self._types[media_id]
+
+    def _ensure_built(self):
+        if not self._built:
+            self.rebuild()
+
+    def index(self, media):
+        with self._lock:
+            if not self._built:
+                return
+            self._discard(media.pk)
+            self._add(media.pk, document_for(media))
+
+    def remove(self, media_id):
+        with self._lock:
+            if self._built:
+                self._discard(media_id)
+
+    def rebuild(self):
+        with self._lock:
+            self._reset()
+            for media in iter_catalog():
+                self._add(media.pk, document_for(media))
+            self._vocabulary = sorted(self._postings)
+            self._built = True
+
+    def _expand(self, token, is_prefix):
+        if not is_prefix:
+            return [token] if token in self._postings else []
+        start = bisect_left(self._vocabulary, token)
+        matches = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query, media_type=None, limit=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            self._ensure_built()
+            documents = len(self._lengths)
+            if not documents:
+                return []
+            average_length = self._total_length / documents
+
+            scores = None
+            for position, token in enumerate(tokens):
+                token_scores = defaultdict(float)
+                for term in self._expand(token, position == len(tokens) - 1):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for media_id, frequency in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._lengths[media_id] / average_length)
+                        token_scores[media_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    # Every term is required
+                    scores = {media_id: score + token_scores[media_id]
+                              for media_id, score in scores.items() if media_id in token_scores}
+                if not scores:
+                    return []
+
+            if media_type:
+                scores = {media_id: score for media_id, score in scores.items()
+                          if self._types[media_id] == media_type}
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [media_id for media_id, _ in ranked[:limit or settings.SEARCH_RESULT_LIMIT]]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _detect_backend():
+    if connection.vendor == 'mysql':
+        return MySQLFullTextBackend()
+    if connection.vendor == 'sqlite' and 'api_searchdocument_fts' in connection.introspection.table_names():
+        return SQLiteFTS5Backend()
+    return InMemorySearchBackend()
+
+
+def get_search_backend():
+    """Return the process-wide search backend selected by settings.SEARCH_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = settings.SEARCH_BACKEND
+                _backend = _detect_backend() if name == 'auto' else import_string(name)()
+    return _backend
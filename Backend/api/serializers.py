@@ -1,14 +1,53 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from django.urls import reverse
 from django.contrib.auth.models import User
-from .models import Media, Book, Movie, Review, Favorite, UserProfile
+from .models import Genre, Media, Book, Movie, Review, Favorite, UserProfile
 
-class UserSerializer(serializers.ModelSerializer):
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+def parse_field_list(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+def requested_fieldset(request):
+    """Return the (fields, omit) lists a read request asked for, or (None, None)"""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, None
+    params = request.query_params
+    fields = parse_field_list(params[FIELDS_PARAM]) if FIELDS_PARAM in params else None
+    omit = parse_field_list(params[OMIT_PARAM]) if OMIT_PARAM in params else None
+    return fields, omit
+
+class SparseFieldsetMixin:
+    """
+    Lets read requests trim the representation with ?fields=a,b or ?omit=c.
+
+    Views may also pass ``fields``/``omit`` explicitly, which is how the
+    catalog list endpoints default to their compact shape.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        omit = kwargs.pop('omit', None)
+        super().__init__(*args, **kwargs)
+
+        requested_fields, requested_omit = requested_fieldset(self.context.get('request'))
+        if requested_fields is not None or requested_omit is not None:
+            fields, omit = requested_fields, requested_omit
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in omit or ():
+            self.fields.pop(name, None)
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'date_joined']
         read_only_fields = ['date_joined']
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
 
     username   = serializers.CharField(source='user.username', read_only=True)
@@ -46,42 +85,55 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
         return super().update(instance, validated_data)
 
-class MediaSerializer(serializers.ModelSerializer):
+class MediaSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Base serializer for Media model"""
     class Meta:
         model = Media
         fields = ['id', 'title', 'genre', 'summary', 'media_type', 'created_at']
         read_only_fields = ['media_type', 'created_at']
 
-class BookSerializer(serializers.ModelSerializer):
+class ImageProxyField(serializers.Field):
+    """Path of the media's image on our own image proxy, or None when it has none"""
+    def __init__(self, **kwargs):
+        # Sourced from image_url so narrowed list querysets still load the column
+        super().__init__(source='image_url', read_only=True, **kwargs)
+
+    def get_attribute(self, instance):
+        return instance if instance.image_url else None
+
+    def to_representation(self, media):
+        # Relative, so cached catalog responses don't carry one request's host
+        return reverse('media-image', args=[media.pk])
+
+class GenreSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Serializer for Genre model"""
+    class Meta:
+        model = Genre
+        fields = ['name', 'slug']
+
+class BookSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Book model"""
-    avg_rating = serializers.SerializerMethodField(read_only=True)
+    genres = GenreSerializer(many=True, read_only=True)
+    image = ImageProxyField()
     
     class Meta:
         model = Book
-        fields = ['id', 'title', 'author', 'genre', 'publication_year', 'summary', 'avg_rating']
-    
-    def get_avg_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return None
+        fields = ['id', 'title', 'author', 'genre', 'genres', 'publication_year', 'summary', 'image', 'avg_rating',
+                  'review_count']
+        read_only_fields = ['avg_rating', 'review_count']
 
-class MovieSerializer(serializers.ModelSerializer):
+class MovieSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Movie model"""
-    avg_rating = serializers.SerializerMethodField(read_only=True)
+    genres = GenreSerializer(many=True, read_only=True)
+    image = ImageProxyField()
     
     class Meta:
         model = Movie
-        fields = ['id', 'title', 'director', 'genre', 'release_year', 'summary', 'avg_rating']
-    
-    def get_avg_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return None
+        fields = ['id', 'title', 'director', 'genre', 'genres', 'release_year', 'summary', 'image', 'avg_rating',
+                  'review_count']
+        read_only_fields = ['avg_rating', 'review_count']
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Review model"""
     username = serializers.CharField(source='user.username', read_only=True)
     
@@ -94,7 +146,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Favorite model"""
     title = serializers.CharField(source='media.title', read_only=True)
     media_type = serializers.CharField(source='media.media_type', read_only=True)
@@ -108,7 +160,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for user registration"""
     password = serializers.CharField(write_only=True)
     password_confirm = serializers.CharField(write_only=True)
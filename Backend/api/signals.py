@@ -0,0 +1,71 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Book, Favorite, Movie, Review, UserRecommendation
+from . import autocomplete, cache, popularity, ratings, trending
+from .bulk import media_bulk_created
+from .genres import link_genres, sync_media_genres
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Review)
+def update_rating_aggregates_on_save(sender, instance, created, **kwargs):
+    old_media_id = getattr(instance, '_loaded_media_id', None)
+    ratings.review_saved(instance, created)
+    popularity.refresh_media(instance.media_id)
+    if old_media_id is not None and old_media_id != instance.media_id:
+        popularity.refresh_media(old_media_id, create=False)
+        autocomplete.refresh_popularity(instance.media_id, old_media_id)
+    else:
+        autocomplete.refresh_popularity(instance.media_id)
+    if created:
+        trending.record_event(instance.media_id, 'review')
+        # The stored list may now include what was just reviewed; serve live until the next precompute
+        UserRecommendation.objects.filter(user_id=instance.user_id).delete()
+    cache.invalidate_for('review')
+    instance._loaded_rating = instance.rating
+    instance._loaded_media_id = instance.media_id
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_aggregates_on_delete(sender, instance, **kwargs):
+    ratings.review_deleted(instance)
+    media_id = getattr(instance, '_loaded_media_id', None) or instance.media_id
+    popularity.refresh_media(media_id, create=False)
+    autocomplete.refresh_popularity(media_id)
+    cache.invalidate_for('review')
+
+
+@receiver(post_save, sender=Favorite)
+def record_trending_favorite(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        trending.record_event(instance.media_id, 'favorite')
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Movie)
+def index_media_on_save(sender, instance, raw=False, **kwargs):
+    cache.invalidate_for(instance.media_type)
+    if not raw:
+        sync_media_genres(instance)
+        popularity.resync_media(instance)
+        get_search_backend().index(instance)
+        autocomplete.index_media(instance)
+
+
+@receiver(media_bulk_created)
+def index_media_on_bulk_create(sender, instances, **kwargs):
+    cache.invalidate_for(sender._meta.model_name)
+    link_genres((media.pk, media.genre) for media in instances)
+    # New media have no reviews yet, so there are no popularity rows to create
+    get_search_backend().index_many(instances)
+    for media in instances:
+        autocomplete.index_media(media)
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Movie)
+def unindex_media_on_delete(sender, instance, **kwargs):
+    cache.invalidate_for(instance.media_type)
+    get_search_backend().remove(instance.pk)
+    autocomplete.unindex_media(instance.pk)
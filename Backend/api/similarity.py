@@ -0,0 +1,260 @@
+"""
+Content-based "more like this" over titles, genres and summaries.
+
+Every media is turned into a hashed TF-IDF vector: each feature (a title or
+summary word, or a whole genre) is hashed once to pick an IDF bucket, an
+output dimension and a sign. This is a signed random projection of the full
+TF-IDF space straight into ``dimensions`` floats, so the whole vocabulary
+never has to be materialized. The artifact holds:
+
+* ``media_ids``: sorted media ids, one per embedding row
+* ``embeddings``: float32 [items, dimensions], L2-normalized
+* ``neighbors``: int64 [items, k] media ids of the nearest items, -1 padded
+* ``scores``: float32 [items, k] cosine similarities matching ``neighbors``
+* ``document_frequency``: int32 per IDF bucket, plus ``documents``
+
+Neighbours are precomputed, so serving a request is one array lookup.
+"""
+import hashlib
+from collections import Counter
+
+import numpy as np
+
+from .artifacts import load_artifact, save_artifact
+from .genres import split_genres
+from .models import Media
+from .search import tokenize
+
+ARTIFACT_NAME = 'content_similarity'
+DIMENSIONS = 256
+IDF_BUCKETS = 1 << 20
+
+FIELD_WEIGHTS = {
+    'title': 2.0,
+    'genre': 3.0,
+    'summary': 1.0,
+}
+
+_feature_hashes = {}
+
+
+def features_for(title, genre, summary):
+    """Return the weighted feature counts of one media"""
+    features = Counter()
+    for token in tokenize(title or ''):
+        features[f't:{token}'] += FIELD_WEIGHTS['title']
+    for slug in split_genres(genre):
+        features[f'g:{slug}'] += FIELD_WEIGHTS['genre']
+    for token in tokenize(summary or ''):
+        if len(token) > 2:
+            features[f's:{token}'] += FIELD_WEIGHTS['summary']
+    return features
+
+
+def feature_hash(feature):
+    """Return (idf bucket, dimension, sign) for a feature, stable across processes"""
+    hashed = _feature_hashes.get(feature)
+    if hashed is None:
+        value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+        hashed = (value % IDF_BUCKETS, (value >> 20) % DIMENSIONS, 1.0 if value >> 63 else -1.0)
+        if len(_feature_hashes) < 1_000_000:
+            _feature_hashes[feature] = hashed
+    return hashed
+
+
+def hash_documents(documents):
+    """Flatten feature Counters into parallel (row, bucket, dimension, weight) arrays"""
+    rows, buckets, dims, weights = [], [], [], []
+    for row, features in enumerate(documents):
+        for feature, weight in features.items():
+            bucket, dim, sign = feature_hash(feature)
+            rows.append(row)
+            buckets.append(bucket)
+            dims.append(dim)
+            weights.append(sign * (1.0 + np.log(weight)))
+    return (np.asarray(rows, dtype=np.int64), np.asarray(buckets, dtype=np.int64),
+            np.asarray(dims, dtype=np.int64), np.asarray(weights, dtype=np.float32))
+
+
+def document_frequency(hashed):
+    """Count, per IDF bucket, how many documents contain a feature hashed there"""
+    return np.bincount(hashed[1], minlength=IDF_BUCKETS).astype(np.int32)
+
+
+def embed(hashed, count, frequency, total_documents):
+    """Project ``count`` hashed documents into L2-normalized float32 rows"""
+    rows, buckets, dims, weights = hashed
+    idf = np.log((1.0 + total_documents) / (1.0 + frequency[buckets])) + 1.0
+    cells = np.bincount(rows * DIMENSIONS + dims, weights=weights * idf, minlength=count * DIMENSIONS)
+    embeddings = cells.reshape(count, DIMENSIONS).astype(np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def nearest(queries, embeddings, ids, k, exclude=None, batch_size=512):
+    """Return (neighbor ids, scores) of the top-k rows of ``embeddings`` for every query row"""
+    k = min(k, len(ids))
+    neighbors = np.full((len(queries), k), -1, dtype=np.int64)
+    scores = np.zeros((len(queries), k), dtype=np.float32)
+    if not k:
+        return neighbors, scores
+    for start in range(0, len(queries), batch_size):
+        block = queries[start:start + batch_size] @ embeddings.T
+        if exclude is not None:
+            # A media is never listed as similar to itself
+            own = exclude[start:start + batch_size]
+            mask = own >= 0
+            block[np.nonzero(mask)[0], own[mask]] = -np.inf
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        valid = np.isfinite(top_scores) & (top_scores > 0)
+        neighbors[start:start + len(block)] = np.where(valid, ids[top], -1)
+        scores[start:start + len(block)] = np.where(valid, top_scores, 0)
+    return neighbors, scores
+
+
+def catalog_documents(queryset=None):
+    """Yield (media id, features) for every media in ``queryset`` (default: the whole catalog)"""
+    if queryset is None:
+        queryset = Media.objects.all()
+    rows = queryset.order_by('pk').values_list('pk', 'title', 'genre', 'summary')
+    for media_id, title, genre, summary in rows.iterator(chunk_size=5000):
+        yield media_id, features_for(title, genre, summary)
+
+
+def build_index(documents, k=20):
+    """Build artifact arrays from (media id, features) pairs"""
+    pairs = sorted(documents, key=lambda pair: pair[0])
+    media_ids = np.asarray([media_id for media_id, _ in pairs], dtype=np.int64)
+    features = [feature for _, feature in pairs]
+
+    hashed = hash_documents(features)
+    frequency = document_frequency(hashed)
+    embeddings = embed(hashed, len(features), frequency, len(features))
+    neighbors, scores = nearest(embeddings, embeddings, media_ids, k + 1,
+                                exclude=np.arange(len(media_ids)))
+    return {
+        'media_ids': media_ids,
+        'embeddings': embeddings,
+        'neighbors': _pad(neighbors[:, :k], k, -1),
+        'scores': _pad(scores[:, :k], k, 0),
+        'document_frequency': frequency,
+        'documents': np.asarray(len(features), dtype=np.int64),
+    }
+
+
+def build_similarity_index(k=20):
+    """Build and save the artifact from the whole catalog; returns the number of media indexed"""
+    artifact = build_index(catalog_documents(), k=k)
+    save_artifact(ARTIFACT_NAME, **artifact)
+    return len(artifact['media_ids'])
+
+
+def update_similarity_index(media_ids, batch_size=4096, chunk_size=1024):
+    """
+    Fold new or changed media into an existing artifact without a rebuild.
+
+    New rows get their own neighbour lists and may displace entries in the
+    lists of existing rows; IDF weights of existing rows are not recomputed.
+    Existing rows are scored ``batch_size`` at a time against ``chunk_size``
+    new rows at a time, so memory stays flat however many media changed.
+    Returns the number of media updated, or None when no artifact exists.
+    """
+    artifact = load_artifact(ARTIFACT_NAME)
+    if artifact is None:
+        return None
+    media_ids = list(media_ids)
+    pairs = []
+    for start in range(0, len(media_ids), 1000):
+        pairs.extend(catalog_documents(Media.objects.filter(pk__in=media_ids[start:start + 1000])))
+    if not pairs:
+        return 0
+
+    new_ids = np.asarray([media_id for media_id, _ in pairs], dtype=np.int64)
+    features = [feature for _, feature in pairs]
+    k = artifact['neighbors'].shape[1]
+
+    # Changed media are dropped and re-added
+    keep = ~np.isin(artifact['media_ids'], new_ids)
+    old_ids = artifact['media_ids'][keep]
+    old_embeddings = artifact['embeddings'][keep]
+    old_neighbors = artifact['neighbors'][keep]
+    old_scores = artifact['scores'][keep]
+    stale = np.isin(old_neighbors, new_ids)
+    old_neighbors = np.where(stale, -1, old_neighbors)
+    old_scores = np.where(stale, 0, old_scores)
+
+    hashed = hash_documents(features)
+    frequency = artifact['document_frequency'] + document_frequency(hashed)
+    total = int(artifact['documents']) + len(features)
+    new_embeddings = embed(hashed, len(features), frequency, total)
+
+    media_ids = np.concatenate([old_ids, new_ids])
+    embeddings = np.concatenate([old_embeddings, new_embeddings])
+    new_neighbors, new_scores = nearest(new_embeddings, embeddings, media_ids, k + 1,
+                                        exclude=np.arange(len(old_ids), len(media_ids)), batch_size=batch_size)
+
+    # Let the new media compete for a place in the existing neighbour lists
+    for start in range(0, len(old_ids), batch_size):
+        stop = start + batch_size
+        top_ids = old_neighbors[start:stop]
+        top_scores = np.where(top_ids >= 0, old_scores[start:stop], -np.inf)
+        for chunk in range(0, len(new_ids), chunk_size):
+            candidate_scores = old_embeddings[start:stop] @ new_embeddings[chunk:chunk + chunk_size].T
+            merged_ids = np.concatenate(
+                [top_ids, np.broadcast_to(new_ids[chunk:chunk + chunk_size], candidate_scores.shape)], axis=1
+            )
+            merged_scores = np.concatenate([top_scores, candidate_scores], axis=1)
+            order = np.argsort(-merged_scores, axis=1, kind='stable')[:, :k]
+            top_ids = np.take_along_axis(merged_ids, order, axis=1)
+            top_scores = np.take_along_axis(merged_scores, order, axis=1)
+        valid = np.isfinite(top_scores) & (top_scores > 0)
+        old_neighbors[start:stop] = np.where(valid, top_ids, -1)
+        old_scores[start:stop] = np.where(valid, top_scores, 0)
+
+    neighbors = np.concatenate([old_neighbors, _pad(new_neighbors[:, :k], k, -1)])
+    scores = np.concatenate([old_scores, _pad(new_scores[:, :k], k, 0)])
+    order = np.argsort(media_ids, kind='stable')
+    save_artifact(
+        ARTIFACT_NAME,
+        media_ids=media_ids[order],
+        embeddings=embeddings[order],
+        neighbors=neighbors[order],
+        scores=scores[order].astype(np.float32),
+        document_frequency=frequency,
+        documents=np.asarray(total, dtype=np.int64),
+    )
+    return len(new_ids)
+
+
+def _pad(array, width, fill):
+    if array.shape[1] >= width:
+        return array
+    padding = np.full((array.shape[0], width - array.shape[1]), fill, dtype=array.dtype)
+    return np.concatenate([array, padding], axis=1)
+
+
+def similar_media(media, limit=10):
+    """
+    Return [(media id, score)] most similar to ``media``, or None when no
+    artifact has been built. Media added since the last build are embedded
+    on the fly and compared against the whole index.
+    """
+    artifact = load_artifact(ARTIFACT_NAME)
+    if artifact is None:
+        return None
+    media_ids = artifact['media_ids']
+    position = int(np.searchsorted(media_ids, media.pk))
+    if position < len(media_ids) and media_ids[position] == media.pk:
+        neighbors = artifact['neighbors'][position]
+        scores = artifact['scores'][position]
+    else:
+        hashed = hash_documents([features_for(media.title, media.genre, media.summary)])
+        query = embed(hashed, 1, artifact['document_frequency'], int(artifact['documents']))
+        neighbors, scores = nearest(query, artifact['embeddings'], media_ids, limit)
+        neighbors, scores = neighbors[0], scores[0]
+    return [(int(media_id), float(score)) for media_id, score in zip(neighbors, scores) if media_id >= 0][:limit]
@@ -0,0 +1,51 @@
+"""Run scripts/stub_server.py in a subprocess for tests that need a real origin"""
+import json
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from django.conf import settings
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """``with StubServer('images', '--latency', '200') as stub: stub.url``"""
+
+    def __init__(self, api, *args):
+        self.port = free_port()
+        self.command = [sys.executable, '-m', 'scripts.stub_server', api, '--port', str(self.port), *args]
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.process = None
+        self.stats_calls = 0
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=settings.BASE_DIR,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=0.2).close()
+                return self
+            except OSError:
+                if self.process.poll() is not None:
+                    break
+                time.sleep(0.05)
+        self.__exit__()
+        raise RuntimeError(f'Stub server did not start: {" ".join(self.command)}')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+    def requests_served(self):
+        """Requests answered so far, not counting the /_stats calls themselves (images mode only)"""
+        self.stats_calls += 1
+        with urllib.request.urlopen(f'{self.url}/_stats') as response:
+            return json.load(response)['requests'] - self.stats_calls
@@ -0,0 +1,127 @@
+import random
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import autocomplete
+from api.autocomplete import PrefixIndex, normalize, terms_for
+from api.models import Book, Media, Review
+
+
+class SmallIndex(PrefixIndex):
+    # Small enough that a few hundred titles get partial hot lists several levels deep
+    scan_limit = 8
+    max_k = 5
+    slack = 3
+
+
+class PrefixIndexTests(TestCase):
+    words = ['star', 'stone', 'storm', 'sea', 'salt', 'night', 'north', 'nine']
+
+    def expected(self, media, query, k):
+        prefix = normalize(query)
+        matches = [
+            (popularity, -media_id) for media_id, (title, person, popularity) in media.items()
+            if any(term.startswith(prefix) for term in terms_for(title, person))
+        ]
+        return [-negated for _, negated in sorted(matches, reverse=True)[:k]]
+
+    def test_hot_lists_stay_exact_under_updates(self):
+        rng = random.Random(7)
+        media = {}
+        for media_id in range(1, 301):
+            title = ' '.join(rng.choice(self.words) for _ in range(rng.randint(1, 3)))
+            media[media_id] = (title, '', rng.randint(0, 40))
+        index = SmallIndex()
+        index.build((media_id, title, 'book', person, popularity)
+                    for media_id, (title, person, popularity) in media.items())
+        self.assertTrue(index._partial)
+
+        queries = ['s', 'st', 'sto', 'n', 'ni', 'night s', 'salt']
+        for step in range(2000):
+            media_id = rng.randint(1, 320)
+            action = rng.random()
+            if action < 0.6 and media_id in media:
+                title, person, _ = media[media_id]
+                popularity = rng.randint(0, 40)
+                media[media_id] = (title, person, popularity)
+                index.set_popularity(media_id, popularity)
+            elif action < 0.8:
+                media.pop(media_id, None)
+                index.remove(media_id)
+            else:
+                title = ' '.join(rng.choice(self.words) for _ in range(rng.randint(1, 3)))
+                media[media_id] = (title, '', rng.randint(0, 40))
+                index.add(media_id, title, 'book', '', media[media_id][2])
+            if step % 50 == 0:
+                for query in queries:
+                    found = [result['id'] for result in index.lookup(query, k=5)]
+                    self.assertEqual(found, self.expected(media, query, 5), (step, query))
+
+    def test_removal_keeps_hot_lists(self):
+        index = SmallIndex()
+        index.build((media_id, f'star {media_id}', 'book', '', media_id) for media_id in range(1, 50))
+        ranked = index._hot['s']
+        index.remove(49)
+        self.assertIs(index._hot['s'], ranked)
+        self.assertEqual([result['id'] for result in index.lookup('s', k=3)], [48, 47, 46])
+
+
+class ReviewPopularityTests(TestCase):
+    def setUp(self):
+        self.books = [
+            Book.objects.create(title=f'Dune {index}', author='Frank Herbert', publication_year=1965,
+                                genre='Science Fiction', summary='Spice.')
+            for index in range(2)
+        ]
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+        self.index = autocomplete.get_autocomplete_index()
+
+    def test_reviews_rerank_on_commit(self):
+        user = User.objects.create_user('reader')
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(user=user, media=self.books[1], rating=5, review_text='Great')
+        self.assertEqual([result['id'] for result in self.index.lookup('dune')],
+                         [self.books[1].pk, self.books[0].pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        self.assertEqual([result['popularity'] for result in self.index.lookup('dune')], [0, 0])
+
+
+@override_settings(AUTOCOMPLETE_SYNC_INTERVAL=0)
+class CrossProcessSyncTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', publication_year=1965,
+                                        genre='Science Fiction', summary='Spice.')
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+        self.index = autocomplete.get_autocomplete_index()
+
+    @contextmanager
+    def elsewhere(self):
+        """Writes made meanwhile reach no index, as in another worker"""
+        autocomplete._index = None
+        try:
+            yield
+        finally:
+            autocomplete._index = self.index
+
+    def ids(self, query):
+        return [result['id'] for result in autocomplete.get_autocomplete_index().lookup(query)]
+
+    def test_media_written_elsewhere_are_caught_up(self):
+        with self.elsewhere():
+            other = Book.objects.create(title='Dune Messiah', author='Frank Herbert', publication_year=1969,
+                                        genre='Science Fiction', summary='Spice.')
+            Media.objects.filter(pk=other.pk).update(review_count=3, updated_at=timezone.now())
+        self.assertEqual(self.ids('dune'), [other.pk, self.book.pk])
+        self.assertIs(autocomplete.get_autocomplete_index(), self.index)
+
+    def test_deletions_elsewhere_rebuild_the_index(self):
+        with self.elsewhere():
+            self.book.delete()
+        self.assertEqual(self.ids('dune'), [])
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from api import cache
+from api.models import Book, Review
+from api.ratings import rebuild_rating_aggregates
+
+
+def make_book(**fields):
+    return Book.objects.create(**{
+        'title': 'Dune', 'author': 'Frank Herbert', 'publication_year': 1965,
+        'genre': 'Science Fiction', 'summary': 'Spice.', **fields,
+    })
+
+
+class InvalidationTests(TransactionTestCase):
+    def setUp(self):
+        django_cache.clear()
+
+    def test_version_is_bumped_only_after_commit(self):
+        self.assertEqual(cache.cached(cache.LATEST_BOOKS, lambda: 'old'), 'old')
+        with transaction.atomic():
+            make_book()
+            # A reader during the write still sees the entry it may have cached from the old rows
+            self.assertEqual(cache.cached(cache.LATEST_BOOKS, lambda: 'during'), 'old')
+        self.assertEqual(cache.cached(cache.LATEST_BOOKS, lambda: 'new'), 'new')
+
+    def test_rolled_back_write_invalidates_nothing(self):
+        cache.cached(cache.LATEST_BOOKS, lambda: 'old')
+        with transaction.atomic():
+            make_book()
+            transaction.set_rollback(True)
+        self.assertEqual(cache.cached(cache.LATEST_BOOKS, lambda: 'new'), 'old')
+
+    def test_global_rating_outlives_review_writes(self):
+        user = User.objects.create_user('reader')
+        book = make_book()
+        self.assertEqual(cache.cached(cache.GLOBAL_RATING, lambda: 4.0), 4.0)
+        Review.objects.create(user=user, media=book, rating=1, review_text='No.')
+        self.assertEqual(cache.cached(cache.GLOBAL_RATING, lambda: 1.0), 4.0)
+        rebuild_rating_aggregates()
+        self.assertEqual(cache.cached(cache.GLOBAL_RATING, lambda: 1.0), 1.0)
+
+
+    def test_rating_rebuild_invalidates_catalog_entries(self):
+        cache.cached(cache.LATEST_BOOKS, lambda: 'old')
+        rebuild_rating_aggregates()
+        self.assertEqual(cache.cached(cache.LATEST_BOOKS, lambda: 'new'), 'new')
+
+class TimeoutTests(TestCase):
+    def test_entries_use_the_configured_timeout(self):
+        django_cache.clear()
+        with self.settings(CATALOG_CACHE_TIMEOUT=0):
+            cache.cached(cache.FACETS, lambda: 'first')
+            self.assertEqual(cache.cached(cache.FACETS, lambda: 'second'), 'second')
+
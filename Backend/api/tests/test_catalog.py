@@ -0,0 +1,21 @@
+from django.test import TestCase
+
+from api.catalog import CatalogLoader
+from api.models import Book, Media
+
+
+class InsertFailedTests(TestCase):
+    def test_conflicting_insert_updates_every_record_field(self):
+        row = Book.objects.create(external_id='gbooks:1', title='Dune', author='Frank Herbert',
+                                  publication_year=1965, genre='Fiction', summary='Spice.')
+        Media.objects.filter(pk=row.pk).update(rating_sum=9, review_count=2)
+        loader = CatalogLoader('book')
+        loader.insert_failed(Book(external_id='gbooks:1', title='Dune', author='Frank Herbert',
+                                  publication_year=1966, genre='Science Fiction', summary='Spice.',
+                                  image_url='http://books.example/dune.jpg'))
+
+        row = Book.objects.get(pk=row.pk)
+        self.assertEqual(loader.outcomes['updated'], 1)
+        self.assertEqual(row.image_url, 'http://books.example/dune.jpg')
+        self.assertEqual((row.publication_year, row.genre), (1966, 'Science Fiction'))
+        self.assertEqual((row.rating_sum, row.review_count), (9, 2))
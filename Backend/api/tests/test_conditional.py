@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.test import TestCase
+from django.utils.http import http_date
+
+from api.models import Book, Review
+from api.ratings import rebuild_rating_aggregates
+
+
+class ConditionalCollectionTests(TestCase):
+    url = '/api/books/?page_size=5'
+
+    def setUp(self):
+        django_cache.clear()
+        self.books = [
+            Book.objects.create(title=f'Book {index}', author='Author', publication_year=2000,
+                                genre='Fiction', summary='Summary')
+            for index in range(3)
+        ]
+
+    def test_collections_send_no_last_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_delete_then_conditional_get_returns_the_new_collection(self):
+        etag = self.client.get(self.url)['ETag']
+        # Not the latest row, so MAX(updated_at) stays where it was
+        self.books[0].delete()
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_update_within_the_same_second_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.books[1].title = 'Renamed'
+        self.books[1].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_rating_rebuild_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        # Loaded without signals, as generate_load_data does, so only a rebuild counts it
+        user = User.objects.create_user('reader')
+        Review.objects.bulk_create([Review(user=user, media=self.books[0], rating=5, review_text='Great')])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        rebuild_rating_aggregates()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
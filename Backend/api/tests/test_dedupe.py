@@ -0,0 +1,47 @@
+from django.test import SimpleTestCase
+
+from api.dedupe import find_duplicates, normalize_title
+from scripts.fetch_books import collect_books
+
+
+def volume(volume_id, title, author='Ann Author'):
+    return {'id': volume_id, 'volumeInfo': {'title': title, 'authors': [author]}}
+
+
+class NormalizeTitleTests(SimpleTestCase):
+    def test_edition_qualifiers_are_dropped(self):
+        self.assertEqual(normalize_title('The Hobbit (75th Anniversary Edition)'), 'hobbit')
+        self.assertEqual(normalize_title('Hobbit, The'), 'hobbit')
+        self.assertEqual(normalize_title("Blade Runner Director's Cut"), 'blade runner')
+        self.assertEqual(normalize_title('Dune 2nd ed'), 'dune')
+
+    def test_edition_words_inside_titles_are_kept(self):
+        self.assertEqual(normalize_title('Ed Wood'), 'ed wood')
+        self.assertEqual(normalize_title('The Cut'), 'cut')
+        self.assertEqual(normalize_title('Final Cut'), 'final cut')
+        self.assertEqual(normalize_title('The Edition'), 'edition')
+
+    def test_titles_never_normalize_to_nothing(self):
+        self.assertEqual(normalize_title("The Director's Cut"), 'director s cut')
+        self.assertEqual(normalize_title('(Untitled)'), 'untitled')
+        self.assertEqual(normalize_title('The'), 'the')
+
+
+class FalsePositiveTests(SimpleTestCase):
+    def test_distinct_titles_are_not_duplicates(self):
+        entries = [
+            (1, 'Ed Wood', 'Tim Burton', 1994, 10),
+            (2, 'Wood', 'Tim Burton', 1994, 5),
+            (3, 'The Cut', 'Ann Author', 2001, 3),
+            (4, 'Final Cut', 'Ann Author', 2003, 3),
+        ]
+        self.assertEqual(find_duplicates(entries), [])
+
+    def test_fetch_keeps_books_whose_titles_only_share_edition_words(self):
+        items = [volume('a', 'The Cut'), volume('b', 'Final Cut'), volume('c', 'Special Edition'),
+                 volume('d', 'Ed Wood'), volume('e', 'Wood')]
+        self.assertEqual([book['google_books_id'] for book in collect_books(items, set())], ['a', 'b', 'c', 'd', 'e'])
+
+    def test_fetch_still_merges_editions(self):
+        items = [volume('a', 'The Hobbit'), volume('b', 'The Hobbit (75th Anniversary Edition)')]
+        self.assertEqual([book['google_books_id'] for book in collect_books(items, set())], ['a'])
@@ -0,0 +1,85 @@
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from scripts.http_client import AsyncFetcher, Checkpoint, ResponseCache
+
+from .stub import StubServer
+
+
+def crawl(url, pages, **options):
+    """Fetch ``pages`` listing pages from a TMDB stub; returns (bodies, stats)"""
+    async def run():
+        async with AsyncFetcher(rate=0, backoff=0.01, max_backoff=0.05, **options) as fetcher:
+            bodies = await asyncio.gather(*(
+                fetcher.get_json(f'{url}/3/movie/popular', {'page': page}) for page in range(1, pages + 1)
+            ))
+            return bodies, fetcher.stats
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(run())
+
+
+class AsyncFetcherTests(SimpleTestCase):
+    def test_retries_throttled_and_unavailable_responses(self):
+        with StubServer('tmdb', '--size', '200', '--failure-rate', '0.3') as stub:
+            bodies, stats = crawl(stub.url, 5, max_retries=10)
+        self.assertEqual([body['page'] for body in bodies], [1, 2, 3, 4, 5])
+        self.assertGreater(stats.retries, 0)
+        self.assertEqual(stats.failures, 0)
+
+    def test_retries_truncated_json(self):
+        with StubServer('tmdb', '--size', '200', '--garbled-rate', '0.5') as stub:
+            bodies, stats = crawl(stub.url, 5, max_retries=10)
+        self.assertEqual([body['page'] for body in bodies], [1, 2, 3, 4, 5])
+        self.assertGreater(stats.retries, 0)
+        self.assertEqual(stats.failures, 0)
+
+    def test_gives_up_on_persistently_invalid_json(self):
+        with StubServer('tmdb', '--size', '200', '--garbled-rate', '1') as stub:
+            bodies, stats = crawl(stub.url, 3, max_retries=2)
+        self.assertEqual(bodies, [None, None, None])
+        self.assertEqual(stats.requests, 9)
+        self.assertEqual(stats.retries, 6)
+        self.assertEqual(stats.failures, 3)
+
+
+class CheckpointedPageTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def fetch(self, url, checkpoint, complete=None):
+        async def run():
+            # Every cached response is stale, so only checkpointed pages are served from the cache
+            cache = ResponseCache(self.directory, max_age=0)
+            async with AsyncFetcher(rate=0, cache=cache) as fetcher:
+                await asyncio.gather(*(
+                    fetcher.get_page(f'{url}/3/movie/popular', {'page': page}, checkpoint, 'popular', page,
+                                     complete=complete)
+                    for page in range(1, 4)
+                ))
+                return fetcher.stats
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            return asyncio.run(run())
+
+    def test_finished_pages_resume_from_the_cache(self):
+        checkpoint = Checkpoint(os.path.join(self.directory, 'checkpoint.json'))
+
+        async def complete(data, max_age):
+            return data['page'] != 2
+
+        with StubServer('tmdb', '--size', '200') as stub:
+            self.assertEqual(self.fetch(stub.url, checkpoint, complete).requests, 3)
+            self.assertEqual(len(checkpoint), 2)
+            self.assertNotIn(('popular', 2), checkpoint)
+
+            stats = self.fetch(stub.url, checkpoint)
+        self.assertEqual((stats.requests, stats.cache_hits), (1, 2))
+        self.assertEqual(len(checkpoint), 3)
@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+import threading
+
+from django.core.cache import cache as django_cache
+from django.test import TestCase, override_settings
+
+from api import images
+from api.models import Movie
+from api.tests.stub import StubServer, free_port
+
+
+class ImageProxyTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The latency keeps the first fetch in flight while the other requests arrive
+        cls.stub = StubServer('images', '--latency', '300', '--image-size', '200x300').__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.__exit__()
+        super().tearDownClass()
+
+    def setUp(self):
+        django_cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = override_settings(IMAGE_CACHE_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        images._cache = None
+        self.addCleanup(setattr, images, '_cache', None)
+        self.movie = self.movie_with_poster(1)
+
+    def movie_with_poster(self, number, image_url=None):
+        return Movie.objects.create(
+            title=f'Movie {number}', director='Director', release_year=2000, genre='Drama', summary='Summary',
+            image_url=image_url or f'{self.stub.url}/t/p/original/poster{number}.jpg',
+        )
+
+    def url(self, media, size=None):
+        return f'/api/media/{media.pk}/image/' + (f'?size={size}' if size else '')
+
+    def test_concurrent_misses_share_one_origin_fetch(self):
+        before = self.stub.requests_served()
+        responses = []
+
+        def fetch():
+            responses.append(images.get_image(self.movie.image_url, 'original'))
+
+        threads = [threading.Thread(target=fetch) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.stub.requests_served() - before, 1)
+        self.assertEqual(len(responses), 10)
+        self.assertEqual({content_type for _, content_type in responses}, {'image/png'})
+        self.assertEqual(len({data for data, _ in responses}), 1)
+
+    def test_cache_is_evicted_below_the_size_limit(self):
+        data, _ = images.get_image(self.movie.image_url, 'original')
+        limit = len(data) * 3
+        cache = images.DiskLRUCache(images.get_image_cache().directory, limit)
+        images._cache = cache
+        for number in range(2, 10):
+            images.get_image(self.movie_with_poster(number).image_url, 'original')
+        stored = sum(size for _, size, _ in cache._entries())
+        self.assertLessEqual(stored, limit)
+        self.assertGreater(stored, 0)
+
+    def test_recently_read_entries_survive_eviction(self):
+        first, _ = images.get_image(self.movie.image_url, 'original')
+        images._cache = images.DiskLRUCache(images.get_image_cache().directory, len(first) * 3)
+        before = self.stub.requests_served()
+        for number in range(2, 8):
+            images.get_image(self.movie_with_poster(number).image_url, 'original')
+            images.get_image(self.movie.image_url, 'original')
+        # Six new posters fetched once each; the poster read in between was never evicted
+        self.assertEqual(self.stub.requests_served() - before, 6)
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url(self.movie))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age', response['Cache-Control'])
+
+        before = self.stub.requests_served()
+        response = self.client.get(self.url(self.movie), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.stub.requests_served(), before)
+
+    def test_unknown_size_is_rejected(self):
+        self.assertEqual(self.client.get(self.url(self.movie, 'huge')).status_code, 400)
+
+    def test_unreachable_origin_is_a_bad_gateway(self):
+        movie = self.movie_with_poster(99, image_url=f'http://127.0.0.1:{free_port()}/poster.jpg')
+        self.assertEqual(self.client.get(self.url(movie)).status_code, 502)
+
+    def test_media_without_image_is_not_found(self):
+        movie = Movie.objects.create(title='Plain', director='Director', release_year=2000, genre='Drama',
+                                     summary='Summary')
+        self.assertEqual(self.client.get(self.url(movie)).status_code, 404)
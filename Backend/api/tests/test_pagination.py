@@ -0,0 +1,81 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache as django_cache
+from django.test import TestCase
+
+from api.models import Book
+
+
+def cursor_of(url):
+    return parse_qs(urlparse(url).query)['cursor'][0]
+
+
+def tampered(url, **changes):
+    payload = json.loads(urlsafe_b64decode(cursor_of(url).encode()))
+    payload.update(changes)
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.books = [
+            Book.objects.create(title=f'Book {index}', author='Author', publication_year=1990 + index % 3,
+                                genre='Fiction', summary='Summary')
+            for index in range(7)
+        ]
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, body):
+        return [book['id'] for book in body['results']]
+
+    def test_next_and_previous_links_walk_the_pages(self):
+        pks = [book.pk for book in self.books]
+        first = self.get('/api/books/?page_size=3')
+        self.assertEqual(self.ids(first), pks[:3])
+        self.assertIsNone(first['previous'])
+        second = self.get(first['next'])
+        self.assertEqual(self.ids(second), pks[3:6])
+        last = self.get(second['next'])
+        self.assertEqual(self.ids(last), pks[6:])
+        self.assertIsNone(last['next'])
+        self.assertEqual(self.ids(self.get(last['previous'])), pks[3:6])
+        self.assertEqual(self.ids(self.get(self.get(last['previous'])['previous'])), pks[:3])
+
+    def test_pages_follow_an_ordering_with_ties(self):
+        # Descending orderings break ties on -pk too
+        ordered = sorted(self.books, key=lambda book: (book.publication_year, book.pk), reverse=True)
+        expected = [book.pk for book in ordered]
+        url, seen = '/api/books/?page_size=2&ordering=-publication_year', []
+        while url:
+            body = self.get(url)
+            seen += self.ids(body)
+            url = body['next']
+        self.assertEqual(seen, expected)
+
+    def test_tampered_cursors_are_not_found(self):
+        base = '/api/books/?page_size=2&ordering=publication_year'
+        next_url = self.get(base)['next']
+        for cursor in [
+            'not a cursor',
+            tampered(next_url, p='1'),
+            tampered(next_url, p=None),
+            tampered(next_url, v='nineteen ninety'),
+            tampered(next_url, v=None),
+            tampered(next_url, r=2),
+            tampered(next_url, r=True),
+        ]:
+            response = self.client.get(f'{base}&cursor={cursor}')
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.json()['detail'], 'Invalid cursor')
+
+    def test_cursor_from_another_ordering_is_not_found(self):
+        cursor = cursor_of(self.get('/api/books/?page_size=2&ordering=title')['next'])
+        response = self.client.get(f'/api/books/?page_size=2&ordering=-publication_year&cursor={cursor}')
+        self.assertEqual(response.status_code, 404)
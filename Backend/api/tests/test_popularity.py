@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from api.models import Book, PopularityPrior, PopularityScore, Review
+from api.popularity import prior_mean, rebuild_popularity
+from api.ratings import bayesian_average
+
+
+class PopularityPriorTests(TestCase):
+    def setUp(self):
+        self.books = [
+            Book.objects.create(title=f'Book {index}', author='Author', publication_year=2000,
+                                genre='Fiction', summary='Summary')
+            for index in range(2)
+        ]
+
+    def review(self, username, book, rating):
+        return Review.objects.create(user=User.objects.create_user(username), media=book, rating=rating,
+                                     review_text='Text')
+
+    def test_refresh_stores_the_prior(self):
+        self.review('first', self.books[0], 5)
+        self.review('second', self.books[1], 1)
+        rebuild_popularity()
+        self.assertEqual(PopularityPrior.objects.get().mean, 3.0)
+
+    def test_review_writes_rescore_against_the_stored_prior(self):
+        self.review('first', self.books[0], 4)
+        rebuild_popularity()
+        # Moves the catalog mean, but not the prior until the next refresh
+        self.review('second', self.books[1], 1)
+        self.assertEqual(prior_mean(), 4.0)
+
+        # As if another process ran refresh_popularity
+        PopularityPrior.objects.filter(pk=1).update(mean=2.0)
+        self.review('third', self.books[0], 4)
+        score = PopularityScore.objects.get(media=self.books[0], genre=None).score
+        self.assertAlmostEqual(score, bayesian_average(8, 2, 2.0))
+
+
+class PopularityUniquenessTests(TestCase):
+    def test_a_media_has_one_overall_row(self):
+        book = Book.objects.create(title='Dune', author='Frank Herbert', publication_year=1965,
+                                   genre='Science Fiction', summary='Spice.')
+        Review.objects.create(user=User.objects.create_user('reader'), media=book, rating=4, review_text='Text')
+        # A second refresh racing the first finds no row to update and inserts again
+        PopularityScore.objects.bulk_create(
+            [PopularityScore(media=book, media_type='book', genre=None, score=1.0)], ignore_conflicts=True,
+        )
+        self.assertEqual(PopularityScore.objects.filter(media=book, genre=None).count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PopularityScore.objects.create(media=book, media_type='book', genre=None, score=1.0)
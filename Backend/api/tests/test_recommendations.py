@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from api.management.commands.precompute_recommendations import Command
+from api.models import Book, Favorite, Review
+
+
+class ActiveUsersTests(TestCase):
+    def setUp(self):
+        self.books = [
+            Book.objects.create(title=f'Book {index}', author='Author', publication_year=2000,
+                                genre='Fiction', summary='Summary')
+            for index in range(2)
+        ]
+        self.month_ago = timezone.now() - timedelta(days=30)
+
+    def review(self, username, when):
+        user = User.objects.create_user(username)
+        review = Review.objects.create(user=user, media=self.books[0], rating=4, review_text='Fine')
+        Review.objects.filter(pk=review.pk).update(created_at=when, updated_at=when)
+        return user
+
+    def test_every_reviewer_without_active_days(self):
+        users = [self.review('recent', timezone.now()), self.review('idle', self.month_ago)]
+        self.assertEqual(Command().active_users(0), [user.pk for user in users])
+
+    def test_active_days_counts_recent_reviews_and_favorites(self):
+        recent = self.review('recent', timezone.now())
+        idle = self.review('idle', self.month_ago)
+        favoriting = self.review('favoriting', self.month_ago)
+        Favorite.objects.create(user=favoriting, media=self.books[1])
+        Favorite.objects.create(user=idle, media=self.books[1], date_added=self.month_ago)
+
+        self.assertEqual(Command().active_users(7), [recent.pk, favoriting.pk])
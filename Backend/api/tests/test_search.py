@@ -0,0 +1,35 @@
+from django.core.cache import cache as django_cache
+from django.test import TestCase
+
+from api.models import Book
+
+
+class SearchPaginationTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        # Later rows match in the title, earlier ones only in the summary, so
+        # relevance order runs against primary key order
+        for index in range(3):
+            Book.objects.create(title=f'Volume {index}', author='Author', publication_year=2000,
+                                genre='Fantasy', summary='A dragon appears.')
+        for index in range(3):
+            Book.objects.create(title=f'Dragon {index}', author='Author', publication_year=2000,
+                                genre='Fantasy', summary='Nothing here.')
+
+    def titles(self, url):
+        titles = []
+        while url:
+            body = self.client.get(url).json()
+            titles += [book['title'] for book in body['results']]
+            url = body['next']
+        return titles
+
+    def test_keyset_pages_keep_relevance_order(self):
+        ranked = [book['title'] for book in self.client.get('/api/books/?search=dragon').json()]
+        self.assertEqual(len(ranked), 6)
+        self.assertTrue(ranked[0].startswith('Dragon'))
+        self.assertEqual(self.titles('/api/books/?search=dragon&page_size=2'), ranked)
+
+    def test_explicit_ordering_wins_over_relevance(self):
+        titles = self.titles('/api/books/?search=dragon&page_size=4&ordering=-title')
+        self.assertEqual(titles, sorted(titles, reverse=True))
@@ -0,0 +1,74 @@
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import TestCase, override_settings
+
+from api.artifacts import artifact_path
+from api.models import Book
+from api.similarity import ARTIFACT_NAME, build_similarity_index, update_similarity_index
+
+TOPICS = ['dragon', 'galaxy', 'detective', 'kitchen', 'ocean', 'violin']
+
+
+def read_artifact():
+    # Straight from disk: the per-process artifact cache keys on an mtime two quick writes can share
+    with np.load(artifact_path(ARTIFACT_NAME)) as data:
+        return {key: data[key] for key in data.files}
+
+
+def neighbor_sets(artifact):
+    return {
+        int(media_id): {int(neighbor) for neighbor in neighbors if neighbor >= 0}
+        for media_id, neighbors in zip(artifact['media_ids'], artifact['neighbors'])
+    }
+
+
+class IncrementalUpdateTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def create_books(self, per_topic, offset=0):
+        return [
+            Book.objects.create(title=f'{topic} {offset + index}', author='Author', publication_year=2000,
+                                genre=topic.title(), summary=f'A story of {topic}s and more {topic}s.').pk
+            for topic in TOPICS for index in range(per_topic)
+        ]
+
+    def build(self, name):
+        with override_settings(ARTIFACT_DIR=f'{self.directory}/{name}'):
+            build_similarity_index(k=5)
+            return read_artifact()
+
+    def test_update_matches_a_full_rebuild(self):
+        self.create_books(4)
+        first = self.build('incremental')
+        added = self.create_books(2, offset=4)
+        with override_settings(ARTIFACT_DIR=f'{self.directory}/incremental'):
+            self.assertEqual(update_similarity_index(added, batch_size=5, chunk_size=3), len(added))
+            incremental = read_artifact()
+        full = self.build('full')
+
+        self.assertEqual(len(first['media_ids']), 24)
+        np.testing.assert_array_equal(incremental['media_ids'], full['media_ids'])
+        # Every media's neighbours are the rest of its topic, whichever way the index was made
+        self.assertEqual(neighbor_sets(incremental), neighbor_sets(full))
+        self.assertTrue(all(len(neighbors) == 5 for neighbors in neighbor_sets(full).values()))
+
+    def test_chunk_sizes_do_not_change_the_result(self):
+        self.create_books(3)
+        with override_settings(ARTIFACT_DIR=f'{self.directory}/small'):
+            build_similarity_index(k=5)
+        with override_settings(ARTIFACT_DIR=f'{self.directory}/large'):
+            build_similarity_index(k=5)
+        added = self.create_books(2, offset=3)
+
+        with override_settings(ARTIFACT_DIR=f'{self.directory}/small'):
+            update_similarity_index(added, batch_size=4, chunk_size=1)
+            small = read_artifact()
+        with override_settings(ARTIFACT_DIR=f'{self.directory}/large'):
+            update_similarity_index(added)
+            large = read_artifact()
+        np.testing.assert_array_equal(small['neighbors'], large['neighbors'])
+        np.testing.assert_allclose(small['scores'], large['scores'], rtol=1e-6)
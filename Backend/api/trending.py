@@ -0,0 +1,100 @@
+"""
+Time-decayed "trending this week" rankings.
+
+Review and favorite writes add their weight to a per-media, per-day
+TrendingBucket with a single F() update. ``compact()`` (run periodically
+by ``manage.py compact_trending``) folds the buckets inside the window into
+one decayed score per media, drops buckets that fell out of the window
+and rewrites the TrendingScore table the feed is served from.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Book, Favorite, Media, Movie, Review, TrendingBucket, TrendingScore
+
+MODELS = {
+    'book': Book,
+    'movie': Movie,
+}
+
+
+def record_event(media_id, kind):
+    """Count one 'review' or 'favorite' event for today's bucket of a media"""
+    weight = settings.TRENDING_EVENT_WEIGHTS[kind]
+    day = timezone.localdate()
+    updated = TrendingBucket.objects.filter(media_id=media_id, day=day).update(events=F('events') + weight)
+    if not updated:
+        bucket, created = TrendingBucket.objects.get_or_create(media_id=media_id, day=day, defaults={'events': weight})
+        if not created:
+            TrendingBucket.objects.filter(pk=bucket.pk).update(events=F('events') + weight)
+
+
+def rebuild_buckets(window_days=None, batch_size=1000):
+    """Recount the buckets inside the window from the review and favorite tables; returns the buckets written"""
+    window_days = window_days or settings.TRENDING_WINDOW_DAYS
+    since = timezone.localdate() - timedelta(days=window_days - 1)
+    buckets = {}
+    sources = [(Review, 'created_at', 'review'), (Favorite, 'date_added', 'favorite')]
+    for model, field, kind in sources:
+        rows = (model.objects.filter(**{f'{field}__date__gte': since})
+                .annotate(day=TruncDate(field)).order_by()
+                .values_list('media_id', 'day').annotate(count=Count('id')))
+        for media_id, day, count in rows.iterator(chunk_size=5000):
+            buckets[media_id, day] = buckets.get((media_id, day), 0) + count * settings.TRENDING_EVENT_WEIGHTS[kind]
+
+    with transaction.atomic():
+        TrendingBucket.objects.filter(day__gte=since).delete()
+        TrendingBucket.objects.bulk_create(
+            [TrendingBucket(media_id=media_id, day=day, events=events) for (media_id, day), events in buckets.items()],
+            batch_size=batch_size,
+        )
+    return len(buckets)
+
+
+def decayed_scores(buckets, today, half_life_days):
+    """Sum (media id, day, events) buckets into {media id: score}, halving weight every half-life"""
+    scores = {}
+    for media_id, day, events in buckets:
+        age = (today - day).days
+        scores[media_id] = scores.get(media_id, 0.0) + events * 0.5 ** (max(age, 0) / half_life_days)
+    return scores
+
+
+def compact(window_days=None, half_life_days=None, batch_size=1000):
+    """Rewrite the trending scores from the buckets in the window; returns (media scored, buckets pruned)"""
+    window_days = window_days or settings.TRENDING_WINDOW_DAYS
+    half_life_days = half_life_days or settings.TRENDING_HALF_LIFE_DAYS
+    now = timezone.now()
+    today = timezone.localdate(now)
+    start = today - timedelta(days=window_days - 1)
+
+    buckets = TrendingBucket.objects.filter(day__gte=start).values_list('media_id', 'day', 'events')
+    scores = decayed_scores(buckets.iterator(chunk_size=5000), today, half_life_days)
+    media_types = {}
+    ids = list(scores)
+    for offset in range(0, len(ids), batch_size):
+        chunk = ids[offset:offset + batch_size]
+        media_types.update(Media.objects.filter(pk__in=chunk).values_list('pk', 'media_type'))
+
+    with transaction.atomic():
+        pruned, _ = TrendingBucket.objects.filter(day__lt=start).delete()
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(media_id=media_id, media_type=media_types[media_id], score=score, computed_at=now)
+             for media_id, score in scores.items() if media_id in media_types],
+            batch_size=batch_size,
+        )
+    return len(media_types), pruned
+
+
+def top_trending(media_type, limit=10):
+    """Return the ``limit`` highest trending books or movies as of the last compaction"""
+    return (MODELS[media_type].objects
+            .filter(trending_score__media_type=media_type)
+            .annotate(trending=F('trending_score__score'))
+            .order_by('-trending', 'pk')[:limit])
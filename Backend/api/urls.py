@@ -7,7 +7,8 @@ from .views import (
     MovieViewSet, ReviewViewSet, FavoriteViewSet,
     user_favorites, media_recommendations,
     latest_books, latest_movies,
-    password_change,
+    password_change, autocomplete, cache_stats, facets,
+    media_stats, media_similar, media_image, leaderboard, trending,
 )
 
 router = DefaultRouter()
@@ -31,4 +32,13 @@ urlpatterns = [
     path('latest/books/', latest_books, name='latest-books'),
     path('latest/movies/', latest_movies, name='latest-movies'),
 
+    path('autocomplete/', autocomplete, name='autocomplete'),
+    path('facets/', facets, name='facets'),
+    path('leaderboard/', leaderboard, name='leaderboard'),
+    path('trending/', trending, name='trending'),
+    path('media/<int:pk>/stats/', media_stats, name='media-stats'),
+    path('media/<int:pk>/similar/', media_similar, name='media-similar'),
+    path('media/<int:pk>/image/', media_image, name='media-image'),
+    path('cache/stats/', cache_stats, name='cache-stats'),
+
 ]
\ No newline at end of file
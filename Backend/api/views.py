@@ -1,19 +1,87 @@
 from rest_framework import viewsets, permissions, status, generics, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Media, Book, Movie, Review, Favorite, UserProfile
+from . import cache, images
+from .autocomplete import get_autocomplete_index
+from .conditional import ConditionalListMixin, apply_validators, not_modified, validators_for
+from .models import Media, Book, Movie, Review, Favorite, UserProfile, RatingHistogram, Genre
+from .popularity import top_media
+from .ratings import global_mean_rating, histogram_stats
+from .recommender import live_recommendations, stored_recommendations
+from .similarity import similar_media
+from .trending import top_trending
+from .facets import facet_counts
+from .filters import BookFilter, FullTextSearchFilter, MovieFilter
+from .pagination import KeysetPagination
 from .serializers import (
     UserSerializer, UserProfileSerializer, MediaSerializer,
     BookSerializer, MovieSerializer, ReviewSerializer,
-    FavoriteSerializer, UserRegistrationSerializer
+    FavoriteSerializer, UserRegistrationSerializer,
+    requested_fieldset,
 )
 
+class FieldsetQuerysetMixin:
+    """
+    Loads only the columns the serializer is going to render.
+
+    ``list_omit`` names fields dropped from the default list representation;
+    an explicit ?fields= or ?omit= replaces that default.
+    """
+    list_omit = ()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'list' and self.list_omit:
+            fields, omit = requested_fieldset(self.request)
+            if fields is None and omit is None:
+                kwargs.setdefault('omit', self.list_omit)
+        return super().get_serializer(*args, **kwargs)
+
+    def rendered_fields(self, model):
+        """
+        Split the rendered fields into loadable columns and many-to-many
+        relations. ``columns`` is None when some field can't be mapped to a
+        column, in which case the queryset is left unnarrowed.
+        """
+        columns, relations = set(), set()
+        for field in self.get_serializer().fields.values():
+            if field.write_only:
+                continue
+            root = field.source.split('.')[0]
+            try:
+                model_field = model._meta.get_field(root)
+            except FieldDoesNotExist:
+                columns = None
+                continue
+            if model_field.many_to_many:
+                relations.add(root)
+            elif model_field.concrete and columns is not None:
+                columns.add(root)
+            else:
+                columns = None
+        return columns, relations
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in permissions.SAFE_METHODS:
+            return queryset
+        columns, relations = self.rendered_fields(queryset.model)
+        if columns:
+            queryset = queryset.only(*columns)
+        if relations:
+            queryset = queryset.prefetch_related(*relations)
+        return queryset
+
 class UserRegistrationView(generics.CreateAPIView):
     """View for user registration"""
     serializer_class = UserRegistrationSerializer
@@ -31,7 +99,7 @@ class UserRegistrationView(generics.CreateAPIView):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+class UserProfileViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
     """ViewSet for UserProfile model"""
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
@@ -46,32 +114,35 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ConditionalListMixin, FieldsetQuerysetMixin, viewsets.ModelViewSet):
     """ViewSet for the Book model"""
     queryset = Book.objects.all().order_by('id')
     serializer_class = BookSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
+    filterset_class = BookFilter
     search_fields = ['title', 'author', 'genre', 'summary']
     ordering_fields = ['title', 'author', 'publication_year']
-    pagination_class = None
+    pagination_class = KeysetPagination
+    list_omit = ['summary']
     
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             return [permissions.AllowAny()]
         return [permissions.IsAuthenticated()]
 
-class MovieViewSet(viewsets.ModelViewSet):
+class MovieViewSet(ConditionalListMixin, FieldsetQuerysetMixin, viewsets.ModelViewSet):
     """ViewSet for Movie model"""
     queryset = Movie.objects.all().order_by('id')
     serializer_class = MovieSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['genre', 'release_year']
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
+    filterset_class = MovieFilter
     search_fields = ['title', 'director', 'summary', 'genre']
     ordering_fields = ['title', 'release_year']
-    pagination_class = None
+    pagination_class = KeysetPagination
+    list_omit = ['summary']
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ConditionalListMixin, FieldsetQuerysetMixin, viewsets.ModelViewSet):
     """ViewSet for Review model"""
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
@@ -102,7 +173,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-class FavoriteViewSet(viewsets.ModelViewSet):
+class FavoriteViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
     """ViewSet for Favorite model"""
     serializer_class = FavoriteSerializer
     permission_classes = [IsAuthenticated]
@@ -143,35 +214,179 @@ def password_change(request):
 def media_recommendations(request):
     """Get media recommendations based on user preferences or general popularity"""
     if request.user.is_authenticated:
-        reviewed_media = Media.objects.filter(reviews__user=request.user)
-        user_genres = reviewed_media.values_list('genre', flat=True).distinct()
-        
-        recommendations = Media.objects.filter(genre__in=user_genres).exclude(reviews__user=request.user)[:10]
+        recommendations = stored_recommendations(request.user)
+        if recommendations is None:
+            recommendations = live_recommendations(request.user)
         
         if recommendations:
-            return Response({
-                'personalized': True,
-                'books': BookSerializer(recommendations.filter(media_type='book'), many=True).data,
-                'movies': MovieSerializer(recommendations.filter(media_type='movie'), many=True).data
-            })
+            return Response(personalized_recommendations(recommendations))
     
-    top_books = Book.objects.all().order_by('-reviews__rating')[:5]
-    top_movies = Movie.objects.all().order_by('-reviews__rating')[:5]
-    
-    return Response({
+    return Response(cache.cached(cache.POPULAR_RECOMMENDATIONS, popular_recommendations))
+
+def personalized_recommendations(media_ids):
+    """Serialize ranked media ids, split into books and movies in rank order"""
+    rank = {media_id: position for position, media_id in enumerate(media_ids)}
+    books = sorted(Book.objects.prefetch_related('genres').filter(pk__in=media_ids), key=lambda m: rank[m.pk])
+    movies = sorted(Movie.objects.prefetch_related('genres').filter(pk__in=media_ids), key=lambda m: rank[m.pk])
+    return {
+        'personalized': True,
+        'books': BookSerializer(books, many=True).data,
+        'movies': MovieSerializer(movies, many=True).data
+    }
+
+def popular_recommendations():
+    """Non-personalized recommendations shared by every anonymous or new user"""
+    return {
         'personalized': False,
-        'books': BookSerializer(top_books, many=True).data,
-        'movies': MovieSerializer(top_movies, many=True).data
-    })
+        'books': BookSerializer(top_with_fallback('book', 5), many=True).data,
+        'movies': MovieSerializer(top_with_fallback('movie', 5), many=True).data
+    }
+
+def top_with_fallback(media_type, limit):
+    """Leaderboard top ``limit``, padded with the newest titles while few media are reviewed"""
+    top = list(top_media(media_type, limit=limit).prefetch_related('genres'))
+    if len(top) < limit:
+        model = Book if media_type == 'book' else Movie
+        top += model.objects.prefetch_related('genres').exclude(
+            pk__in=[media.pk for media in top]
+        ).order_by('-pk')[:limit - len(top)]
+    return top
 
 @api_view(['GET'])
 def latest_books(request):
     """Return the 5 newest books"""
-    newest = Book.objects.order_by('-publication_year')[:5]
-    return Response(BookSerializer(newest, many=True).data)
+    validators = validators_for(Book.objects.all(), request)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    data = cache.cached(cache.LATEST_BOOKS, lambda: BookSerializer(
+        Book.objects.prefetch_related('genres').order_by('-publication_year')[:5], many=True
+    ).data)
+    return apply_validators(Response(data), validators)
 
 @api_view(['GET'])
 def latest_movies(request):
     """Return the 5 newest movies"""
-    newest = Movie.objects.order_by('-release_year')[:5]
-    return Response(MovieSerializer(newest, many=True).data)
+    validators = validators_for(Movie.objects.all(), request)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    data = cache.cached(cache.LATEST_MOVIES, lambda: MovieSerializer(
+        Movie.objects.prefetch_related('genres').order_by('-release_year')[:5], many=True
+    ).data)
+    return apply_validators(Response(data), validators)
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def facets(request):
+    """Genre, decade and rating-bucket counts, optionally for ?type=book|movie"""
+    media_type = request.query_params.get('type')
+    if media_type not in dict(Media.MEDIA_TYPES):
+        media_type = None
+    entry = {None: cache.FACETS, 'book': cache.BOOK_FACETS, 'movie': cache.MOVIE_FACETS}[media_type]
+    return Response(cache.cached(entry, lambda: facet_counts(media_type)))
+
+def parse_limit(request, default, maximum):
+    """?limit= clamped to 1..maximum, or the default when it isn't a number"""
+    try:
+        return max(1, min(int(request.query_params.get('limit', default)), maximum))
+    except ValueError:
+        return default
+
+def ranked_response(media_type, rank, score):
+    """
+    Books and movies ranked by ``rank(media_type)``, each rendered with its
+    ``score`` attribute; only the ?type= asked for when there is one.
+    """
+    serializers = {'book': ('books', BookSerializer), 'movie': ('movies', MovieSerializer)}
+    if media_type in serializers:
+        serializers = {media_type: serializers[media_type]}
+    return Response({
+        key: [
+            {**serializer_class(media, omit=['summary']).data, score: getattr(media, score)}
+            for media in rank(kind).prefetch_related('genres')
+        ]
+        for kind, (key, serializer_class) in serializers.items()
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def leaderboard(request):
+    """Top rated books and movies by Bayesian average, optionally for ?type= and ?genre=<slug>"""
+    media_type = request.query_params.get('type')
+    limit = parse_limit(request, 10, 50)
+    genre_id = None
+    slug = request.query_params.get('genre')
+    if slug:
+        genre_id = get_object_or_404(Genre.objects.only('id'), slug=slug).pk
+    return ranked_response(media_type, lambda kind: top_media(kind, genre_id=genre_id, limit=limit), 'popularity')
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def trending(request):
+    """Books and movies trending this week, optionally for ?type=book|movie"""
+    media_type = request.query_params.get('type')
+    limit = parse_limit(request, 10, 50)
+    return ranked_response(media_type, lambda kind: top_trending(kind, limit=limit), 'trending')
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def media_stats(request, pk):
+    """Star histogram, count, mean and Bayesian mean of one book or movie"""
+    histogram = RatingHistogram.objects.filter(media_id=pk).first()
+    if histogram is None:
+        get_object_or_404(Media.objects.only('id'), pk=pk)
+    prior_mean = cache.cached(cache.GLOBAL_RATING, global_mean_rating, timeout=cache.GLOBAL_RATING_TIMEOUT)
+    return Response({'media': int(pk), **histogram_stats(histogram, prior_mean)})
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def media_similar(request, pk):
+    """Books and movies whose title, genres and summary are closest to this one"""
+    media = get_object_or_404(Media.objects.only('title', 'genre', 'summary'), pk=pk)
+    limit = parse_limit(request, 10, 20)
+    ranked = similar_media(media, limit=limit) or []
+    scores = dict(ranked)
+    found = Media.objects.only('title', 'genre', 'media_type', 'created_at').in_bulk(list(scores))
+    results = []
+    for media_id, score in ranked:
+        if media_id in found:
+            results.append({**MediaSerializer(found[media_id], omit=['summary']).data, 'score': round(score, 4)})
+    return Response({'media': media.pk, 'results': results})
+
+@require_GET
+def media_image(request, pk):
+    """Cover or poster of one book or movie, resized and served from the local image cache"""
+    # A plain view: the body is an image, so DRF's content negotiation has nothing to pick
+    media = get_object_or_404(Media.objects.only('image_url'), pk=pk)
+    if not media.image_url:
+        return JsonResponse({'detail': 'No image for this media.'}, status=404)
+    size = request.GET.get('size', images.DEFAULT_SIZE)
+    if size not in images.SIZES:
+        return JsonResponse({'detail': f'size must be one of: {", ".join(images.SIZES)}.'}, status=400)
+
+    etag = images.etag_for(media.image_url, size)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            data, content_type = images.get_image(media.image_url, size)
+        except images.ImageUnavailable:
+            return JsonResponse({'detail': 'The image could not be fetched.'}, status=502)
+        response = HttpResponse(data, content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={settings.IMAGE_MAX_AGE}'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Hit/miss counters of the cached catalog views"""
+    return Response(cache.stats())
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def autocomplete(request):
+    """Typeahead suggestions for titles, authors and directors, most reviewed first"""
+    query = request.query_params.get('q', '')
+    limit = parse_limit(request, 10, 50)
+    return Response(get_autocomplete_index().lookup(query, k=limit))
@@ -8,4 +8,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chaptered.settings')
 
-application = get_asgi_application() 
\ No newline at end of file
+application = get_asgi_application()
+
+from api.autocomplete import warm_autocomplete_index  # noqa: E402
+
+warm_autocomplete_index() 
\ No newline at end of file
@@ -69,6 +69,27 @@ DATABASES = {
         'PORT': '3306',
     }
 }
+# The catalog view cache is invalidated by signals, so multi-worker deployments
+# should point REDIS_URL at a shared cache. The local-memory default is per
+# process and never sees invalidations from other workers or management
+# commands, so its entries only live for a minute.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+    CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'chaptered',
+        }
+    }
+    CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '60'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,6 +126,39 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10
 }
 
+# 'auto' picks MySQL FULLTEXT, SQLite FTS5 or the in-process index based on
+# the database; a dotted path selects a specific api.search backend class.
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+# ?search= returns at most this many of the best matches, before any pagination
+SEARCH_RESULT_LIMIT = 500
+
+# Seconds between checks that fold other processes' catalog writes into the typeahead index
+AUTOCOMPLETE_SYNC_INTERVAL = int(os.getenv('AUTOCOMPLETE_SYNC_INTERVAL', '30'))
+
+# Offline-built artifacts (recommendation and similarity indexes)
+ARTIFACT_DIR = os.getenv('ARTIFACT_DIR', os.path.join(BASE_DIR, 'var', 'artifacts'))
+
+# Cover/poster proxy: originals and resized variants are kept on disk, least
+# recently used first out once the cache grows past IMAGE_CACHE_MAX_BYTES
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'var', 'images'))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_MB', '512')) * 1024 * 1024
+IMAGE_FETCH_TIMEOUT = 10
+IMAGE_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_AGE = 7 * 24 * 3600
+# TMDB poster_path values are relative to this
+TMDB_IMAGE_URL = os.getenv('TMDB_IMAGE_URL', 'https://image.tmdb.org/t/p/original')
+
+# Number of "virtual" catalog-average reviews blended into Bayesian means
+RATING_PRIOR_WEIGHT = 5
+
+# Trending feed: daily event buckets kept for the window, decayed by the half-life
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_DAYS = 2
+TRENDING_EVENT_WEIGHTS = {
+    'review': 2,
+    'favorite': 1,
+}
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://localhost:3000",
@@ -8,4 +8,8 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chaptered.settings')
 
-application = get_wsgi_application() 
\ No newline at end of file
+application = get_wsgi_application()
+
+from api.autocomplete import warm_autocomplete_index  # noqa: E402
+
+warm_autocomplete_index() 
\ No newline at end of file
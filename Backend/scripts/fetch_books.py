@@ -1,154 +1,240 @@
 """
 Script to fetch books from Google Books API and save as JSON.
+
+Queries are paged concurrently through one pooled session within the
+--concurrency, --rate and --max-requests budget. Each query's first page
+tells how many results exist (totalItems), so pages past the end are never
+requested. Point GOOGLE_BOOKS_API_URL at ``python -m scripts.stub_server
+gbooks`` to try it offline.
+
+Responses are cached under --cache-dir for --max-age hours, and finished
+pages are checkpointed, so an interrupted run resumes where it stopped and a
+rerun with a warm cache makes no network calls at all.
+
+Books are streamed to newline-delimited JSON (scripts/data/books.ndjson by
+default; an --output ending in .gz is gzip-compressed) as queries finish.
 """
 import os
-import json
-import requests
 import time
+import asyncio
+import argparse
 from dotenv import load_dotenv
+from api.dedupe import normalize_person, normalize_title
+from api.ingest import RecordWriter
+from scripts.http_client import run_checkpointed
 
 load_dotenv()
 
-GOOGLE_BOOKS_API_URL = "https://www.googleapis.com/books/v1/volumes"
-
-def fetch_books(max_results_per_query=40):
-    queries = [
-        "subject:fiction bestseller",
-        "subject:science fiction",
-        "subject:fantasy",
-        "subject:mystery",
-        "subject:thriller",
-        "subject:horror",
-        "subject:romance",
-        "subject:historical fiction",
-        "subject:adventure",
-        "subject:classics",
-        "subject:literary fiction",
-        "subject:short stories",
-        "subject:young adult",
-        "subject:dystopian",
-
-        "subject:biography",
-        "subject:autobiography",
-        "subject:history",
-        "subject:science",
-        "subject:philosophy",
-        "subject:psychology",
-        "subject:business",
-        "subject:self-help",
-        "subject:travel",
-        "subject:cooking",
-        "subject:art",
-        "subject:health",
-        "subject:politics",
-        "subject:computers",
-
-        "inauthor:stephen king",
-        "inauthor:j.k. rowling",
-        "inauthor:dan brown",
-        "inauthor:james patterson",
-        "inauthor:john grisham",
-        "inauthor:nora roberts",
-        "inauthor:agatha christie",
-        "inauthor:george r.r. martin",
-        "inauthor:haruki murakami",
-        "inauthor:neil gaiman",
-
-        "pulitzer prize winner",
-        "booker prize winner",
-        "hugo award",
-        "national book award",
-        "newbery medal"
-    ]
-
-    all_books = []
-    books_set = set()
-
-    for query in queries:
-        for start_index in range(0, 200, 40): 
-            params = {
-                "q": query,
-                "maxResults": 40, 
-                "startIndex": start_index,
-                "langRestrict": "en",
-                "orderBy": "relevance"
-            }
-
+GOOGLE_BOOKS_API_URL = os.getenv("GOOGLE_BOOKS_API_URL", "https://www.googleapis.com/books/v1/volumes")
+
+QUERIES = [
+    "subject:fiction bestseller",
+    "subject:science fiction",
+    "subject:fantasy",
+    "subject:mystery",
+    "subject:thriller",
+    "subject:horror",
+    "subject:romance",
+    "subject:historical fiction",
+    "subject:adventure",
+    "subject:classics",
+    "subject:literary fiction",
+    "subject:short stories",
+    "subject:young adult",
+    "subject:dystopian",
+
+    "subject:biography",
+    "subject:autobiography",
+    "subject:history",
+    "subject:science",
+    "subject:philosophy",
+    "subject:psychology",
+    "subject:business",
+    "subject:self-help",
+    "subject:travel",
+    "subject:cooking",
+    "subject:art",
+    "subject:health",
+    "subject:politics",
+    "subject:computers",
+
+    "inauthor:stephen king",
+    "inauthor:j.k. rowling",
+    "inauthor:dan brown",
+    "inauthor:james patterson",
+    "inauthor:john grisham",
+    "inauthor:nora roberts",
+    "inauthor:agatha christie",
+    "inauthor:george r.r. martin",
+    "inauthor:haruki murakami",
+    "inauthor:neil gaiman",
+
+    "pulitzer prize winner",
+    "booker prize winner",
+    "hugo award",
+    "national book award",
+    "newbery medal"
+]
+
+PAGE_SIZE = 40
+MAX_START_INDEX = 200
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "data", "cache")
+
+
+class BookFetcher:
+    """
+    Pages every query concurrently and streams unique books to ``writer``.
+
+    Books are written query by query, in page order, as soon as a query's
+    pages are in, so the file comes out in the same order every run while
+    only unwritten queries are held in memory.
+
+    Volumes whose ids are in ``known_ids`` are left out, so an incremental
+    sync only writes books that aren't stored yet. Google Books has no
+    change feed, so the search pages themselves are still fetched.
+    """
+
+    def __init__(self, fetcher, writer, base_url=GOOGLE_BOOKS_API_URL, page_size=PAGE_SIZE,
+                 max_start_index=MAX_START_INDEX, checkpoint=None, known_ids=()):
+        self.fetcher = fetcher
+        self.writer = writer
+        self.known_ids = set(known_ids)
+        self.checkpoint = checkpoint
+        self.base_url = base_url
+        self.page_size = page_size
+        self.max_start_index = max_start_index
+        self.books_seen = set()
+        self.pages_fetched = 0
+        self.pages_skipped = 0
+
+    async def fetch_page(self, query, start_index):
+        params = {
+            "q": query,
+            "maxResults": self.page_size,
+            "startIndex": start_index,
+            "langRestrict": "en",
+            "orderBy": "relevance"
+        }
+        data = await self.fetcher.get_page(self.base_url, params, self.checkpoint, query, start_index)
+        if data is None:
+            return None
+        self.pages_fetched += 1
+        print(f"Fetched {len(data.get('items', []))} books for query: '{query}' (startIndex: {start_index})")
+        return data
+
+    async def fetch_query(self, query):
+        """Return the items of every page fetched for a query, in page order"""
+        first = await self.fetch_page(query, 0)
+        if first is None:
+            return []
+        items = first.get("items", [])
+        if len(items) < self.page_size:
+            self.pages_skipped += self.max_start_index // self.page_size - 1
+            return items
+        # Stop at the reported result count instead of discovering the end one empty page at a time
+        total_items = min(first.get("totalItems", 0), self.max_start_index)
+        starts = list(range(self.page_size, total_items, self.page_size))
+        self.pages_skipped += self.max_start_index // self.page_size - 1 - len(starts)
+        pages = await asyncio.gather(*(self.fetch_page(query, start) for start in starts))
+        return items + [item for page in pages if page for item in page.get("items", [])]
+
+    async def run(self, queries=QUERIES):
+        fetches = [asyncio.ensure_future(self.fetch_query(query)) for query in queries]
+        try:
+            for fetch in fetches:
+                for book in collect_books(await fetch, self.books_seen, self.known_ids):
+                    self.writer.write(book)
+        finally:
+            for fetch in fetches:
+                fetch.cancel()
+        return self.writer.count
+
+
+def collect_books(items, books_set, known_ids=()):
+    """Yield a book record for each Google Books volume not already in ``books_set``, first occurrence winning"""
+    for item in items:
+        volume_info = item.get("volumeInfo", {})
+
+        if not all(key in volume_info for key in ["title", "authors"]):
+            continue
+
+        # Normalized, so "The Hobbit" and "Hobbit, The (Anniversary Edition)" by the same authors count once
+        authors = normalize_person(",".join(volume_info.get("authors", [])))
+        book_id = f"{normalize_title(volume_info.get('title'))}|{authors}"
+
+        if book_id in books_set:
+            continue
+        books_set.add(book_id)
+        if item.get("id") in known_ids:
+            continue
+
+        published_date = volume_info.get("publishedDate", "")
+        publication_year = None
+        if published_date and len(published_date) >= 4:
             try:
-                response = requests.get(GOOGLE_BOOKS_API_URL, params=params)
-
-                if response.status_code == 200:
-                    data = response.json()
-                    total_items = data.get("totalItems", 0)
-                    items = data.get("items", [])
-
-                    if not items:
-                        break
-
-                    for item in items:
-                        volume_info = item.get("volumeInfo", {})
-
-                        if not all(key in volume_info for key in ["title", "authors"]):
-                            continue
-
-                        book_id = f"{volume_info.get('title')}|{','.join(volume_info.get('authors', []))}"
-
-                        if book_id in books_set:
-                            continue
-                        books_set.add(book_id)
-
-                        published_date = volume_info.get("publishedDate", "")
-                        publication_year = None
-                        if published_date and len(published_date) >= 4:
-                            try:
-                                publication_year = int(published_date[:4])
-                            except ValueError:
-                                pass
-
-                        book_obj = {
-                            "google_books_id": item.get("id"),
-                            "title": volume_info.get("title"),
-                            "author": ", ".join(volume_info.get("authors", ["Unknown"])),
-                            "publication_year": publication_year,
-                            "genre": ", ".join(volume_info.get("categories", ["Fiction"])),
-                            "summary": volume_info.get("description", "No description available."),
-                            "page_count": volume_info.get("pageCount"),
-                            "image_links": volume_info.get("imageLinks", {})
-                        }
-
-                        all_books.append(book_obj)
-
-                    print(f"Fetched {len(items)} books for query: '{query}' (startIndex: {start_index})")
-
-                    if len(items) < 40:
-                        break
-
-                else:
-                    print(f"Error fetching books for query '{query}': {response.status_code}")
-                    break
-
-                time.sleep(0.5)
-
-            except Exception as e:
-                print(f"Exception fetching books for query '{query}': {str(e)}")
-                time.sleep(2)
-                continue
-
-        time.sleep(1)
-
-    print(f"Total unique books found: {len(all_books)}")
-
-    # Ensure the data directory exists
-    os.makedirs(os.path.join(os.path.dirname(__file__), "data"), exist_ok=True)
-
+                publication_year = int(published_date[:4])
+            except ValueError:
+                pass
+
+        yield {
+            "google_books_id": item.get("id"),
+            "title": volume_info.get("title"),
+            "author": ", ".join(volume_info.get("authors", ["Unknown"])),
+            "publication_year": publication_year,
+            "genre": ", ".join(volume_info.get("categories", ["Fiction"])),
+            "summary": volume_info.get("description", "No description available."),
+            "page_count": volume_info.get("pageCount"),
+            "image_links": volume_info.get("imageLinks", {})
+        }
+
+
+async def fetch_books_async(writer, concurrency=8, rate=10, max_requests=None, base_url=GOOGLE_BOOKS_API_URL,
+                            cache_dir=CACHE_DIR, max_age_hours=24, known_ids=()):
+    async def run(fetcher, checkpoint):
+        book_fetcher = BookFetcher(fetcher, writer, base_url=base_url, checkpoint=checkpoint, known_ids=known_ids)
+        count = await book_fetcher.run()
+        elapsed = time.monotonic() - fetcher.stats.started
+        print(f"{book_fetcher.pages_fetched} pages fetched, {book_fetcher.pages_skipped} skipped from totalItems, "
+              f"{count / elapsed if elapsed else 0:.1f} books/s")
+        return count
+
+    return await run_checkpointed(run, cache_dir, "books.checkpoint.json", max_age_hours=max_age_hours,
+                                  concurrency=concurrency, rate=rate, max_requests=max_requests)
+
+
+def fetch_books(concurrency=8, rate=10, max_requests=None, base_url=GOOGLE_BOOKS_API_URL, books_path=None,
+                cache_dir=CACHE_DIR, max_age_hours=24, known_ids=()):
+    """
+    Fetch books into an NDJSON file; returns (books written, FetchStats).
+    Pass ``known_ids`` to write only volumes that aren't stored yet.
+    """
     # Use absolute path for saving the file
-    books_json_path = os.path.join(os.path.dirname(__file__), "data", "books.json")
-    with open(books_json_path, "w") as f:
-        json.dump(all_books, f, indent=2)
+    books_path = books_path or os.path.join(os.path.dirname(__file__), "data", "books.ndjson")
+
+    # Records are written as each query completes rather than collected in memory first
+    with RecordWriter(books_path) as writer:
+        count, stats = asyncio.run(fetch_books_async(
+            writer, concurrency=concurrency, rate=rate, max_requests=max_requests, base_url=base_url,
+            cache_dir=cache_dir, max_age_hours=max_age_hours, known_ids=known_ids,
+        ))
 
-    print(f"Saved {len(all_books)} books to {books_json_path}")
-    return all_books
+    print(f"Saved {count} unique books to {books_path}")
+    return count, stats
 
 if __name__ == "__main__":
-    # This is no longer needed as we create the directory in the fetch_books function
-    fetch_books() 
+    parser = argparse.ArgumentParser(description="Fetch books from Google Books into scripts/data/books.ndjson")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--rate", type=float, default=10, help="Requests per second across all queries (0 = unlimited)")
+    parser.add_argument("--max-requests", type=int, help="Stop issuing requests after this many")
+    parser.add_argument("--base-url", default=GOOGLE_BOOKS_API_URL,
+                        help="Volumes endpoint (default: $GOOGLE_BOOKS_API_URL)")
+    parser.add_argument("--output", help="Where to write the NDJSON, gzipped if it ends in .gz "
+                                         "(default: scripts/data/books.ndjson)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Response cache and checkpoint directory")
+    parser.add_argument("--max-age", type=float, default=24, help="Hours a cached response stays fresh")
+    parser.add_argument("--no-cache", action="store_true", help="Always hit the network and keep no checkpoint")
+    args = parser.parse_args()
+    fetch_books(concurrency=args.concurrency, rate=args.rate, max_requests=args.max_requests,
+                base_url=args.base_url, books_path=args.output,
+                cache_dir=None if args.no_cache else args.cache_dir, max_age_hours=args.max_age)
@@ -1,194 +1,280 @@
 """
 Script to fetch movies from TMDB API and save as JSON.
+
+Listing pages and per-movie detail calls run concurrently through one pooled
+session, bounded by --concurrency and paced by a shared --rate limit.
+Point TMDB_API_URL at ``python -m scripts.stub_server tmdb`` to try it
+without an API key.
+
+Responses are cached under --cache-dir for --max-age hours, and finished
+pages are checkpointed, so an interrupted run resumes where it stopped and a
+rerun with a warm cache makes no network calls at all.
+
+Movies are streamed to newline-delimited JSON (scripts/data/movies.ndjson by
+default; an --output ending in .gz is gzip-compressed) as listings finish.
 """
 import os
 import json
-import requests
-import time
+import asyncio
+import argparse
+from datetime import date, timedelta
 from dotenv import load_dotenv
 from api.settings import TMDB_API_KEY
+from api.ingest import RecordWriter
+from scripts.http_client import run_checkpointed
 
 load_dotenv()
 
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-TMDB_API_URL = "https://api.themoviedb.org/3"
-
-def fetch_movies():
-    all_movies = []
-    movie_ids = set()
-
-    endpoints = [
-        {"path": "/movie/popular", "pages": 20, "desc": "popular movies"},
-        {"path": "/movie/top_rated", "pages": 20, "desc": "top rated movies"},
-        {"path": "/movie/now_playing", "pages": 10, "desc": "now playing movies"},
-        {"path": "/movie/upcoming", "pages": 10, "desc": "upcoming movies"},
-    ]
-
-    genres = [
-        {"id": 28, "name": "Action"},
-        {"id": 12, "name": "Adventure"},
-        {"id": 16, "name": "Animation"},
-        {"id": 35, "name": "Comedy"},
-        {"id": 80, "name": "Crime"},
-        {"id": 99, "name": "Documentary"},
-        {"id": 18, "name": "Drama"},
-        {"id": 10751, "name": "Family"},
-        {"id": 14, "name": "Fantasy"},
-        {"id": 36, "name": "History"},
-        {"id": 27, "name": "Horror"},
-        {"id": 10402, "name": "Music"},
-        {"id": 9648, "name": "Mystery"},
-        {"id": 10749, "name": "Romance"},
-        {"id": 878, "name": "Science Fiction"},
-        {"id": 53, "name": "Thriller"},
-        {"id": 10752, "name": "War"},
-        {"id": 37, "name": "Western"}
-    ]
-
-    for endpoint in endpoints:
-        for page in range(1, endpoint["pages"] + 1):
-            url = f"{TMDB_API_URL}{endpoint['path']}"
-            params = {
-                "api_key": TMDB_API_KEY,
-                "language": "en-US",
-                "page": page
-            }
-
-            try:
-                response = requests.get(url, params=params)
-
-                if response.status_code == 200:
-                    movies = response.json().get("results", [])
-
-                    if not movies:
-                        break
-
-                    for movie in movies:
-                        if movie["id"] in movie_ids:
-                            continue
-
-                        movie_ids.add(movie["id"])
-                        processed_movie = process_movie(movie)
-                        if processed_movie:
-                            all_movies.append(processed_movie)
-
-                    print(f"Fetched page {page}/{endpoint['pages']} of {endpoint['desc']} with {len(movies)} movies")
-
-                else:
-                    print(f"Error fetching page {page} from {endpoint['path']}: {response.status_code}")
-                    break
-
-                time.sleep(0.25)
-
-            except Exception as e:
-                print(f"Exception fetching from {endpoint['path']}: {str(e)}")
-                time.sleep(2)
-    for genre in genres:
-        for page in range(1, 6):
-            url = f"{TMDB_API_URL}/discover/movie"
-            params = {
-                "api_key": TMDB_API_KEY,
-                "language": "en-US",
-                "with_genres": genre["id"],
-                "sort_by": "popularity.desc",
-                "page": page
-            }
-
-            try:
-                response = requests.get(url, params=params)
-
-                if response.status_code == 200:
-                    movies = response.json().get("results", [])
-
-                    if not movies:
-                        break
-
-                    new_movies = 0
-                    for movie in movies:
-                        if movie["id"] in movie_ids:
-                            continue
-
-                        movie_ids.add(movie["id"])
-                        processed_movie = process_movie(movie)
-                        if processed_movie:
-                            all_movies.append(processed_movie)
-                            new_movies += 1
-
-                    print(f"Fetched page {page}/5 of {genre['name']} genre with {new_movies} new movies")
-
-                    if new_movies == 0:
-                        break
-
-                else:
-                    print(f"Error fetching {genre['name']} movies page {page}: {response.status_code}")
-                    break
-
-                time.sleep(0.25)
-
-            except Exception as e:
-                print(f"Exception fetching {genre['name']} movies: {str(e)}")
-                time.sleep(2)
-
-    print(f"Total unique movies found: {len(all_movies)}")
-
-    # Ensure the data directory exists
-    os.makedirs(os.path.join(os.path.dirname(__file__), "data"), exist_ok=True)
-
-    # Use absolute path for saving the file
-    movies_json_path = os.path.join(os.path.dirname(__file__), "data", "movies.json")
-    with open(movies_json_path, "w") as f:
-        json.dump(all_movies, f, indent=2)
-
-    print(f"Saved {len(all_movies)} movies to {movies_json_path}")
-    return all_movies
-
-def process_movie(movie):
-    movie_id = movie["id"]
-
-    try:
-        details_url = f"{TMDB_API_URL}/movie/{movie_id}"
-        details_params = {
-            "api_key": TMDB_API_KEY,
-            "language": "en-US",
-            "append_to_response": "credits,keywords"
-        }
-
-        details_response = requests.get(details_url, params=details_params)
-
-        if details_response.status_code == 200:
-            details = details_response.json()
-
-            director = next((crew["name"] for crew in details.get("credits", {}).get("crew", []) 
-                            if crew["job"] == "Director"), "Unknown")
-
-            if not movie.get("release_date"):
-                return None
-
-            movie_obj = {
-                "tmdb_id": movie["id"],
-                "title": movie["title"],
-                "director": director,
-                "release_year": int(movie["release_date"][:4]) if movie["release_date"] else None,
-                "genre": ", ".join([genre["name"] for genre in details.get("genres", [])]),
-                "summary": movie["overview"],
-                "poster_path": movie["poster_path"],
-                "backdrop_path": movie["backdrop_path"],
-                "vote_average": movie["vote_average"],
-                "runtime": details.get("runtime")
-            }
-
-            time.sleep(0.25)
-
-            return movie_obj
-
-        else:
-            print(f"Error fetching details for movie {movie_id}: {details_response.status_code}")
+TMDB_API_URL = os.getenv("TMDB_API_URL", "https://api.themoviedb.org/3")
+
+ENDPOINTS = [
+    {"path": "/movie/popular", "pages": 20, "desc": "popular movies"},
+    {"path": "/movie/top_rated", "pages": 20, "desc": "top rated movies"},
+    {"path": "/movie/now_playing", "pages": 10, "desc": "now playing movies"},
+    {"path": "/movie/upcoming", "pages": 10, "desc": "upcoming movies"},
+]
+
+GENRES = [
+    {"id": 28, "name": "Action"},
+    {"id": 12, "name": "Adventure"},
+    {"id": 16, "name": "Animation"},
+    {"id": 35, "name": "Comedy"},
+    {"id": 80, "name": "Crime"},
+    {"id": 99, "name": "Documentary"},
+    {"id": 18, "name": "Drama"},
+    {"id": 10751, "name": "Family"},
+    {"id": 14, "name": "Fantasy"},
+    {"id": 36, "name": "History"},
+    {"id": 27, "name": "Horror"},
+    {"id": 10402, "name": "Music"},
+    {"id": 9648, "name": "Mystery"},
+    {"id": 10749, "name": "Romance"},
+    {"id": 878, "name": "Science Fiction"},
+    {"id": 53, "name": "Thriller"},
+    {"id": 10752, "name": "War"},
+    {"id": 37, "name": "Western"}
+]
+
+GENRE_PAGES = 5
+
+# TMDB's /movie/changes accepts at most 14 days per request
+CHANGES_WINDOW_DAYS = 14
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "data", "cache")
+
+
+def listings():
+    """Return every (path, extra params, page limit, description) to walk"""
+    listings = [(endpoint["path"], {}, endpoint["pages"], endpoint["desc"]) for endpoint in ENDPOINTS]
+    for genre in GENRES:
+        params = {"with_genres": genre["id"], "sort_by": "popularity.desc"}
+        listings.append(("/discover/movie", params, GENRE_PAGES, f"{genre['name']} genre"))
+    return listings
+
+
+class MovieFetcher:
+    """
+    Walks every listing concurrently and streams processed movies to ``writer``.
+
+    Movies are written listing by listing, in page order, as soon as a listing
+    and all of its detail calls are done, so the file comes out in the same
+    order every run while only unwritten listings are held in memory.
+
+    For an incremental sync, ``known_ids`` are the TMDB ids already stored
+    and ``changed_since`` the previous sync's date: known movies are skipped
+    unless TMDB reports them changed since then, and changed ones that no
+    listing mentions anymore are fetched directly.
+    """
+
+    def __init__(self, fetcher, writer, base_url=TMDB_API_URL, api_key=TMDB_API_KEY, checkpoint=None,
+                 known_ids=(), changed_since=None):
+        self.fetcher = fetcher
+        self.writer = writer
+        self.base_url = base_url
+        self.api_key = api_key
+        self.checkpoint = checkpoint
+        self.known_ids = {str(movie_id) for movie_id in known_ids}
+        self.changed_since = changed_since
+        self.changed_ids = set()
+        self.seen = set()
+        self.details = {}
+        self.written = set()
+
+    def params(self, **extra):
+        params = {"language": "en-US", **extra}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        return params
+
+    async def fetch_page(self, path, extra, page, pages, desc):
+        """Fetch one listing page and its new movies' details; return the page's movie ids, or None"""
+
+        async def fetch_new_details(data, max_age):
+            details = []
+            for movie in data.get("results", []):
+                if movie["id"] in self.seen:
+                    continue
+                self.seen.add(movie["id"])
+                if not movie.get("release_date"):
+                    # Would be dropped by process_movie anyway; don't spend a details call on it
+                    continue
+                changed = str(movie["id"]) in self.changed_ids
+                if str(movie["id"]) in self.known_ids and not changed:
+                    continue
+                # A changed movie's cached details are out of date by definition
+                task = asyncio.ensure_future(self.fetch_details(movie, 0 if changed else max_age))
+                self.details[movie["id"]] = task
+                details.append(task)
+            print(f"Fetched page {page}/{pages} of {desc} with {len(details)} new movies")
+            # The page only counts as finished once every one of its movies is in
+            return all(ok for ok, _ in await asyncio.gather(*details))
+
+        data = await self.fetcher.get_page(
+            f"{self.base_url}{path}", self.params(page=page, **extra), self.checkpoint,
+            path, json.dumps(extra, sort_keys=True), page, complete=fetch_new_details,
+        )
+        if data is None:
             return None
+        return [movie["id"] for movie in data.get("results", [])], data
+
+    async def walk_listing(self, path, extra, pages, desc):
+        """Return the movie ids of every page of a listing, in page order"""
+        first = await self.fetch_page(path, extra, 1, pages, desc)
+        if not first or not first[0]:
+            return []
+        ids, data = first
+        last_page = min(pages, data.get("total_pages") or pages)
+        rest = await asyncio.gather(*(
+            self.fetch_page(path, extra, page, pages, desc)
+            for page in range(2, last_page + 1)
+        ))
+        return ids + [movie_id for result in rest if result for movie_id in result[0]]
+
+    async def fetch_details(self, movie, max_age=None):
+        """Return (succeeded, processed movie or None)"""
+        details = await self.fetcher.get_json(
+            f"{self.base_url}/movie/{movie['id']}",
+            self.params(append_to_response="credits,keywords"),
+            max_age=max_age,
+        )
+        if details is None:
+            return False, None
+        return True, process_movie(movie, details)
+
+    async def fetch_changes(self):
+        """Collect the ids TMDB reports changed since the ``changed_since`` date"""
+        start, today = self.changed_since, date.today()
+        while start <= today:
+            end = min(start + timedelta(days=CHANGES_WINDOW_DAYS - 1), today)
+            page = total_pages = 1
+            while page <= total_pages:
+                params = self.params(start_date=start.isoformat(), end_date=end.isoformat(), page=page)
+                data = await self.fetcher.get_json(f"{self.base_url}/movie/changes", params, max_age=0)
+                if data is None:
+                    # Counted as a failure, so the caller won't move its watermark past this window
+                    return
+                self.changed_ids.update(str(change["id"]) for change in data.get("results", []))
+                total_pages = data.get("total_pages") or 1
+                page += 1
+            start = end + timedelta(days=1)
+        print(f"{len(self.changed_ids & self.known_ids)} stored movies changed since {self.changed_since}")
+
+    async def fetch_changed(self, movie_id):
+        """Fetch a changed movie straight from its details, which carry everything a listing entry does"""
+        details = await self.fetcher.get_json(
+            f"{self.base_url}/movie/{movie_id}",
+            self.params(append_to_response="credits,keywords"),
+            max_age=0,
+        )
+        return process_movie(details, details) if details else None
+
+    async def run(self):
+        if self.changed_since is not None:
+            await self.fetch_changes()
+        walks = [
+            asyncio.ensure_future(self.walk_listing(path, extra, pages, desc))
+            for path, extra, pages, desc in listings()
+        ]
+        try:
+            for walk in walks:
+                for movie_id in await walk:
+                    if movie_id in self.written or movie_id not in self.details:
+                        continue
+                    self.written.add(movie_id)
+                    _, movie_obj = await self.details.pop(movie_id)
+                    if movie_obj:
+                        self.writer.write(movie_obj)
+            leftovers = sorted(self.changed_ids & self.known_ids - {str(movie_id) for movie_id in self.seen}, key=int)
+            for movie_obj in await asyncio.gather(*(self.fetch_changed(movie_id) for movie_id in leftovers)):
+                if movie_obj:
+                    self.writer.write(movie_obj)
+        finally:
+            for walk in walks:
+                walk.cancel()
+        return self.writer.count
+
+
+async def fetch_movies_async(writer, concurrency=16, rate=40, base_url=TMDB_API_URL, cache_dir=CACHE_DIR,
+                             max_age_hours=24, known_ids=(), changed_since=None):
+    async def run(fetcher, checkpoint):
+        movie_fetcher = MovieFetcher(fetcher, writer, base_url=base_url, checkpoint=checkpoint,
+                                     known_ids=known_ids, changed_since=changed_since)
+        return await movie_fetcher.run()
+
+    return await run_checkpointed(run, cache_dir, "movies.checkpoint.json", max_age_hours=max_age_hours,
+                                  concurrency=concurrency, rate=rate)
+
+
+def fetch_movies(concurrency=16, rate=40, base_url=TMDB_API_URL, movies_path=None, cache_dir=CACHE_DIR,
+                 max_age_hours=24, known_ids=(), changed_since=None):
+    """
+    Fetch movies into an NDJSON file; returns (movies written, FetchStats).
+    Pass ``known_ids``/``changed_since`` to fetch only new and changed movies.
+    """
+    # Use absolute path for saving the file
+    movies_path = movies_path or os.path.join(os.path.dirname(__file__), "data", "movies.ndjson")
+
+    # Records are written as each listing completes rather than collected in memory first
+    with RecordWriter(movies_path) as writer:
+        count, stats = asyncio.run(fetch_movies_async(
+            writer, concurrency=concurrency, rate=rate, base_url=base_url, cache_dir=cache_dir,
+            max_age_hours=max_age_hours, known_ids=known_ids, changed_since=changed_since,
+        ))
 
-    except Exception as e:
-        print(f"Exception processing movie {movie_id}: {str(e)}")
+    print(f"Saved {count} unique movies to {movies_path}")
+    return count, stats
+
+def process_movie(movie, details):
+    if not movie.get("release_date"):
         return None
 
+    director = next((crew["name"] for crew in details.get("credits", {}).get("crew", [])
+                    if crew["job"] == "Director"), "Unknown")
+
+    return {
+        "tmdb_id": movie["id"],
+        "title": movie["title"],
+        "director": director,
+        "release_year": int(movie["release_date"][:4]) if movie["release_date"] else None,
+        "genre": ", ".join([genre["name"] for genre in details.get("genres", [])]),
+        "summary": movie["overview"],
+        "poster_path": movie["poster_path"],
+        "backdrop_path": movie["backdrop_path"],
+        "vote_average": movie["vote_average"],
+        "runtime": details.get("runtime")
+    }
+
 if __name__ == "__main__":
-    # This is no longer needed as we create the directory in the fetch_movies function
-    fetch_movies() 
+    parser = argparse.ArgumentParser(description="Fetch movies from TMDB into scripts/data/movies.ndjson")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--rate", type=float, default=40, help="Requests per second across all tasks (0 = unlimited)")
+    parser.add_argument("--base-url", default=TMDB_API_URL, help="TMDB API root (default: $TMDB_API_URL)")
+    parser.add_argument("--output", help="Where to write the NDJSON, gzipped if it ends in .gz "
+                                         "(default: scripts/data/movies.ndjson)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Response cache and checkpoint directory")
+    parser.add_argument("--max-age", type=float, default=24, help="Hours a cached response stays fresh")
+    parser.add_argument("--no-cache", action="store_true", help="Always hit the network and keep no checkpoint")
+    args = parser.parse_args()
+    fetch_movies(concurrency=args.concurrency, rate=args.rate, base_url=args.base_url, movies_path=args.output,
+                 cache_dir=None if args.no_cache else args.cache_dir, max_age_hours=args.max_age)
@@ -0,0 +1,315 @@
+"""
+Shared asyncio HTTP client for the fetch scripts.
+
+One pooled aiohttp session is reused for every request. Requests are bounded
+by a concurrency limit, paced by a token bucket shared across all tasks and
+optionally capped by a total request budget.
+
+Responses can be kept in a ResponseCache on disk, so reruns only fetch what
+is missing or stale, and a Checkpoint records which pages a run finished so
+an interrupted run can resume without refetching them; run_checkpointed
+wires the three together for a whole fetch run.
+429 and 5xx responses and connection errors are retried with jittered
+exponential backoff, honouring Retry-After when the server sends one.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from urllib.parse import urlencode
+
+import aiohttp
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allow ``rate`` acquisitions per second on average, with bursts of up to ``burst``"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def write_json_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class ResponseCache:
+    """
+    JSON responses on disk, addressed by a hash of the request URL and
+    parameters (minus credentials). Entries older than ``max_age`` seconds
+    are stale and refetched.
+    """
+    ignored_params = {"api_key", "key"}
+
+    def __init__(self, directory, max_age=24 * 60 * 60):
+        self.directory = directory
+        self.max_age = max_age
+
+    def key(self, url, params=None):
+        params = sorted((k, str(v)) for k, v in (params or {}).items() if k not in self.ignored_params)
+        return hashlib.sha256(f"{url}?{urlencode(params)}".encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, url, params=None, max_age=None):
+        """Return the cached body, or None when it is missing or older than ``max_age``"""
+        max_age = self.max_age if max_age is None else max_age
+        try:
+            with open(self.path(self.key(url, params))) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["fetched_at"] > max_age:
+            return None
+        return entry["body"]
+
+    def put(self, url, params, body):
+        write_json_atomic(self.path(self.key(url, params)), {"fetched_at": time.time(), "url": url, "body": body})
+
+
+class Checkpoint:
+    """
+    Manifest of the pages an in-progress run has finished. Pages recorded
+    here are served from the cache whatever their age, so resuming a long
+    run never refetches completed work; ``finish()`` removes the manifest
+    once the run completes.
+    """
+
+    def __init__(self, path, save_every=20):
+        self.path = path
+        self.save_every = save_every
+        self.unsaved = 0
+        try:
+            with open(path) as f:
+                self.completed = set(json.load(f)["completed"])
+        except (OSError, ValueError, KeyError):
+            self.completed = set()
+
+    @staticmethod
+    def name(*parts):
+        return "|".join(str(part) for part in parts)
+
+    def __contains__(self, parts):
+        return self.name(*parts) in self.completed
+
+    def __len__(self):
+        return len(self.completed)
+
+    def mark(self, *parts):
+        self.completed.add(self.name(*parts))
+        self.unsaved += 1
+        if self.unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        write_json_atomic(self.path, {"completed": sorted(self.completed)})
+        self.unsaved = 0
+
+    def finish(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self.completed = set()
+
+
+class FetchStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.over_budget = 0
+        self.cache_hits = 0
+        self.bytes = 0
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.requests / elapsed if elapsed else 0
+        summary = (f"{self.requests} requests in {elapsed:.1f}s ({rate:.1f} req/s), "
+                   f"{self.retries} retries, {self.failures} failures, {self.bytes / 1024:.0f} KiB")
+        if self.cache_hits:
+            summary += f", {self.cache_hits} served from cache"
+        if self.over_budget:
+            summary += f", {self.over_budget} skipped over budget"
+        return summary
+
+
+class AsyncFetcher:
+    """
+    Usage::
+
+        async with AsyncFetcher(concurrency=16, rate=40) as fetcher:
+            data = await fetcher.get_json(url, params)
+    """
+
+    def __init__(self, concurrency=16, rate=40, max_requests=None, max_retries=5, backoff=0.5, max_backoff=30,
+                 timeout=30, cache=None):
+        self.concurrency = concurrency
+        self.cache = cache
+        self.max_requests = max_requests
+        self.issued = 0
+        self.bucket = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.stats = FetchStats()
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        self.stats = FetchStats()
+        self.issued = 0
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    def retry_delay(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        # Full jitter keeps retrying tasks from stampeding the server in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def get_json(self, url, params=None, max_age=None):
+        """
+        Return the decoded JSON body, or None once the request has failed for
+        good. ``max_age`` overrides the cache's freshness for this request.
+        """
+        if self.cache is not None:
+            body = self.cache.get(url, params, max_age=max_age)
+            if body is not None:
+                self.stats.cache_hits += 1
+                return body
+
+        for attempt in range(self.max_retries + 1):
+            # Counted before any await so concurrent tasks can't overrun the budget together
+            if self.max_requests is not None and self.issued >= self.max_requests:
+                self.stats.over_budget += 1
+                return None
+            self.issued += 1
+            await self.bucket.acquire()
+            retry_after = None
+            try:
+                async with self.semaphore:
+                    self.stats.requests += 1
+                    async with self.session.get(url, params=params) as response:
+                        body = await response.read()
+                        self.stats.bytes += len(body)
+                        if response.status == 200:
+                            try:
+                                data = json.loads(body)
+                            except ValueError:
+                                # A truncated or garbled body is retried like a 503 rather
+                                # than allowed to abort the whole crawl
+                                reason = "invalid JSON"
+                            else:
+                                if self.cache is not None:
+                                    self.cache.put(url, params, data)
+                                return data
+                        elif response.status not in RETRY_STATUSES:
+                            print(f"Error fetching {url}: {response.status}")
+                            self.stats.failures += 1
+                            return None
+                        else:
+                            retry_after = response.headers.get('Retry-After')
+                            reason = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = type(e).__name__
+
+            if attempt == self.max_retries:
+                break
+            self.stats.retries += 1
+            delay = self.retry_delay(attempt, retry_after)
+            print(f"Retrying {url} in {delay:.1f}s ({reason})")
+            await asyncio.sleep(delay)
+
+        print(f"Giving up on {url} after {self.max_retries + 1} attempts")
+        self.stats.failures += 1
+        return None
+
+    async def get_page(self, url, params, checkpoint, *key, complete=None):
+        """
+        get_json for the page ``key`` of a checkpointed run. A page finished
+        by an interrupted run is reused from the cache however old it is.
+
+        The page is marked finished once fetched, or, for a page with more
+        work behind it, once ``await complete(data, max_age)`` returns true.
+        """
+        max_age = math.inf if checkpoint is not None and key in checkpoint else None
+        data = await self.get_json(url, params, max_age=max_age)
+        if data is None:
+            return None
+        done = await complete(data, max_age) if complete is not None else True
+        if checkpoint is not None and done:
+            checkpoint.mark(*key)
+        return data
+
+
+async def run_checkpointed(run, cache_dir, checkpoint_name, max_age_hours=24, **options):
+    """
+    Await ``run(fetcher, checkpoint)`` with a fresh AsyncFetcher; returns
+    (its result, FetchStats).
+
+    With a ``cache_dir``, responses are cached there for ``max_age_hours``
+    and the run resumes from and updates the checkpoint ``checkpoint_name``,
+    which is removed once a run completes without failures. Without one,
+    the checkpoint passed to ``run`` is None. ``options`` go to AsyncFetcher.
+    """
+    cache = checkpoint = None
+    if cache_dir:
+        cache = ResponseCache(cache_dir, max_age=max_age_hours * 60 * 60)
+        checkpoint = Checkpoint(os.path.join(cache_dir, checkpoint_name))
+        if len(checkpoint):
+            print(f"Resuming: {len(checkpoint)} pages already fetched by an interrupted run")
+
+    async with AsyncFetcher(cache=cache, **options) as fetcher:
+        try:
+            result = await run(fetcher, checkpoint)
+        finally:
+            if checkpoint is not None:
+                checkpoint.save()
+        print(fetcher.stats.summary())
+        # Pages lost to failures or the request budget are fetched by the next run
+        if checkpoint is not None and not fetcher.stats.failures and not fetcher.stats.over_budget:
+            checkpoint.finish()
+    return result, fetcher.stats
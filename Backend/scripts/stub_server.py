@@ -0,0 +1,278 @@
+"""
+Local stand-in for the external catalog APIs, for exercising the fetch
+scripts without API keys, quotas or network access.
+
+    python -m scripts.stub_server tmdb --port 8765 --latency 50 --failure-rate 0.05
+    TMDB_API_URL=http://127.0.0.1:8765/3 python -m scripts.fetch_movies
+
+    python -m scripts.stub_server gbooks --port 8765
+    GOOGLE_BOOKS_API_URL=http://127.0.0.1:8765/books/v1/volumes python -m scripts.fetch_books
+
+    python -m scripts.stub_server images --port 8767
+    TMDB_IMAGE_URL=http://127.0.0.1:8767/t/p/original python manage.py runserver
+
+The images mode is an origin for the image proxy: any path ending in .jpg or
+.png is answered with a deterministic PNG poster, and /_stats reports how
+many requests it has served. gbooks --image-url points thumbnails at it.
+
+Data is generated deterministically from --seed. --latency adds a delay to
+every response, --failure-rate answers that fraction of requests with a
+429 or 503 and --garbled-rate with a 200 whose JSON is cut off midway, so
+retry and backoff paths get exercised too.
+"""
+import argparse
+import asyncio
+import random
+import struct
+import zlib
+
+from aiohttp import web
+
+TMDB_GENRES = {
+    28: "Action", 12: "Adventure", 16: "Animation", 35: "Comedy", 80: "Crime",
+    99: "Documentary", 18: "Drama", 10751: "Family", 14: "Fantasy", 36: "History",
+    27: "Horror", 10402: "Music", 9648: "Mystery", 10749: "Romance",
+    878: "Science Fiction", 53: "Thriller", 10752: "War", 37: "Western",
+}
+TMDB_LISTINGS = ["popular", "top_rated", "now_playing", "upcoming"]
+TMDB_PAGE_SIZE = 20
+
+GBOOKS_CATEGORIES = ["Fiction", "Science Fiction", "Fantasy", "Mystery", "History", "Biography",
+                     "Science", "Philosophy", "Business", "Travel", "Cooking", "Art"]
+GBOOKS_RESULT_COUNTS = [0, 12, 35, 80, 150, 400, 1000]
+
+WORDS = ("night city river shadow dream empire storm garden light echo winter house "
+         "stranger last road fire silent glass broken star ocean crown wolf iron").split()
+
+
+class StubCounters:
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+
+
+def title(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+
+
+def build_tmdb(size, seed):
+    rng = random.Random(seed)
+    movies = {}
+    for movie_id in range(1, size + 1):
+        genre_ids = rng.sample(sorted(TMDB_GENRES), rng.randint(1, 3))
+        movies[movie_id] = {
+            "id": movie_id,
+            "title": title(rng),
+            "overview": " ".join(rng.choice(WORDS) for _ in range(30)),
+            "release_date": "" if rng.random() < 0.02 else f"{rng.randint(1950, 2024)}-01-01",
+            "poster_path": f"/poster{movie_id}.jpg",
+            "backdrop_path": f"/backdrop{movie_id}.jpg",
+            "vote_average": round(rng.uniform(1, 10), 1),
+            "genre_ids": genre_ids,
+            "runtime": rng.randint(70, 180),
+            "director": f"Director {rng.randint(1, size // 5 + 1)}",
+        }
+    listings = {}
+    ids = sorted(movies)
+    for name in TMDB_LISTINGS:
+        shuffled = ids[:]
+        rng.shuffle(shuffled)
+        listings[name] = shuffled[:rng.randint(len(ids) // 4, len(ids) // 2)]
+    return movies, listings
+
+
+def page_of(items, page, page_size):
+    total_pages = max(1, -(-len(items) // page_size))
+    start = (page - 1) * page_size
+    return items[start:start + page_size], total_pages
+
+
+def tmdb_summary(movie):
+    return {key: movie[key] for key in
+            ("id", "title", "overview", "release_date", "poster_path", "backdrop_path", "vote_average", "genre_ids")}
+
+
+def tmdb_routes(movies, listings):
+    def listing_response(items, request):
+        try:
+            page = max(1, int(request.query.get("page", 1)))
+        except ValueError:
+            page = 1
+        results, total_pages = page_of(items, page, TMDB_PAGE_SIZE)
+        return web.json_response({
+            "page": page,
+            "results": [tmdb_summary(movies[movie_id]) for movie_id in results],
+            "total_pages": total_pages,
+            "total_results": len(items),
+        })
+
+    async def listing(request):
+        name = request.match_info["name"]
+        if name == "changes":
+            return await changes(request)
+        if name not in listings:
+            return await details(request)
+        return listing_response(listings[name], request)
+
+    async def changes(request):
+        # A stable ~2% of the catalog "changes" on any given start date
+        start_date = request.query.get("start_date", "")
+        changed = [movie_id for movie_id in sorted(movies) if zlib.crc32(f"{movie_id}:{start_date}".encode()) % 50 == 0]
+        return listing_response(changed, request)
+
+    async def discover(request):
+        items = sorted(movies)
+        if "with_genres" in request.query:
+            genre_id = int(request.query["with_genres"])
+            items = [movie_id for movie_id in items if genre_id in movies[movie_id]["genre_ids"]]
+        items.sort(key=lambda movie_id: -movies[movie_id]["vote_average"])
+        return listing_response(items, request)
+
+    async def details(request):
+        try:
+            movie = movies[int(request.match_info["name"])]
+        except (KeyError, ValueError):
+            return web.json_response({"status_message": "The resource you requested could not be found."}, status=404)
+        body = {
+            **tmdb_summary(movie),
+            "runtime": movie["runtime"],
+            "genres": [{"id": genre_id, "name": TMDB_GENRES[genre_id]} for genre_id in movie["genre_ids"]],
+        }
+        if "credits" in request.query.get("append_to_response", ""):
+            body["credits"] = {"crew": [{"job": "Director", "name": movie["director"]}]}
+        return web.json_response(body)
+
+    return [
+        web.get("/3/movie/{name}", listing),
+        web.get("/3/discover/movie", discover),
+    ]
+
+
+def build_gbooks(size, seed, image_url="http://books.example"):
+    rng = random.Random(seed)
+    volumes = []
+    for index in range(size):
+        volume_info = {
+            "title": title(rng),
+            "authors": [f"Author {rng.randint(1, size // 4 + 1)}"],
+            "publishedDate": f"{rng.randint(1850, 2024)}-{rng.randint(1, 12):02d}",
+            "categories": [rng.choice(GBOOKS_CATEGORIES)],
+            "description": " ".join(rng.choice(WORDS) for _ in range(40)),
+            "pageCount": rng.randint(80, 900),
+            "imageLinks": {"thumbnail": f"{image_url}/covers/{index}.jpg"},
+        }
+        if rng.random() < 0.03:
+            del volume_info["authors"]
+        volumes.append({"id": f"vol{index:06d}", "volumeInfo": volume_info})
+    return volumes
+
+
+def gbooks_routes(volumes, seed):
+    async def search(request):
+        query = request.query.get("q", "")
+        # Each query gets a stable slice of the shared pool, so queries overlap like the real API
+        rng = random.Random(zlib.crc32(query.encode()) ^ seed)
+        total_items = rng.choice(GBOOKS_RESULT_COUNTS)
+        matches = rng.sample(volumes, min(total_items, len(volumes)))
+        try:
+            start = max(0, int(request.query.get("startIndex", 0)))
+            count = min(40, max(1, int(request.query.get("maxResults", 10))))
+        except ValueError:
+            return web.json_response({"error": {"code": 400, "message": "Invalid value"}}, status=400)
+        body = {"kind": "books#volumes", "totalItems": total_items}
+        items = matches[start:start + count]
+        if items:
+            body["items"] = items
+        return web.json_response(body)
+
+    return [web.get("/books/v1/volumes", search)]
+
+
+def png(width, height, rgb):
+    """A solid-colour RGB PNG, built with the standard library alone"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = (b"\x00" + bytes(rgb) * width) * height
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows))
+            + chunk(b"IEND", b""))
+
+
+def image_routes(width, height):
+    async def image(request):
+        path = request.match_info["path"]
+        if not path.endswith((".jpg", ".png")):
+            return web.Response(status=404)
+        # The colour comes from the path, so the same URL always gets the same bytes
+        digest = zlib.crc32(path.encode())
+        body = png(width, height, (digest & 0xFF, (digest >> 8) & 0xFF, (digest >> 16) & 0xFF))
+        return web.Response(body=body, content_type="image/png")
+
+    async def stats(request):
+        counters = request.app["counters"]
+        return web.json_response({"requests": counters.requests, "failures": counters.failures})
+
+    return [web.get("/_stats", stats), web.get("/{path:.+}", image)]
+
+
+def make_app(routes, latency=0.0, failure_rate=0.0, garbled_rate=0.0, seed=0):
+    rng = random.Random(seed)
+    counters = StubCounters()
+
+    @web.middleware
+    async def simulate(request, handler):
+        counters.requests += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if failure_rate and rng.random() < failure_rate:
+            counters.failures += 1
+            if rng.random() < 0.5:
+                return web.json_response({"status_message": "Too many requests"}, status=429,
+                                         headers={"Retry-After": "0.2"})
+            return web.json_response({"status_message": "Unavailable"}, status=503)
+        response = await handler(request)
+        if garbled_rate and response.status == 200 and rng.random() < garbled_rate:
+            counters.failures += 1
+            return web.Response(body=response.body[:len(response.body) // 2], content_type=response.content_type)
+        return response
+
+    app = web.Application(middlewares=[simulate])
+    app.add_routes(routes)
+    app["counters"] = counters
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake catalog API responses")
+    parser.add_argument("api", choices=["tmdb", "gbooks", "images"], help="Which API to imitate")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--size", type=int, default=2000, help="Records to generate")
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds added to every response")
+    parser.add_argument("--failure-rate", type=float, default=0, help="Fraction of requests answered with 429/503")
+    parser.add_argument("--garbled-rate", type=float, default=0,
+                        help="Fraction of successful responses whose body is truncated")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--image-url", default="http://books.example",
+                        help="gbooks: base URL of the thumbnails (e.g. an images stub)")
+    parser.add_argument("--image-size", default="500x750", help="images: WIDTHxHEIGHT of the served posters")
+    args = parser.parse_args()
+
+    if args.api == "tmdb":
+        routes, root = tmdb_routes(*build_tmdb(args.size, args.seed)), "/3"
+    elif args.api == "gbooks":
+        volumes = build_gbooks(args.size, args.seed, args.image_url.rstrip("/"))
+        routes, root = gbooks_routes(volumes, args.seed), "/books/v1/volumes"
+    else:
+        width, height = (int(value) for value in args.image_size.split("x"))
+        routes, root = image_routes(width, height), "/"
+    app = make_app(routes, latency=args.latency / 1000, failure_rate=args.failure_rate,
+                   garbled_rate=args.garbled_rate, seed=args.seed)
+    print(f"Serving fake {args.api} API on http://{args.host}:{args.port}{root}")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()